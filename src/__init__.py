@@ -5,7 +5,8 @@ A comprehensive Python library for the PZEM-004T AC Power and Energy meter.
 Supports all PZEM-004T models with full Modbus-RTU protocol implementation.
 """
 
-from .pzem import PZEM004T, PZEM004Tv30
+from .pzem import PZEM004T, PZEM004Tv30, PZEMBus, PZEMSession, PZEMSessionManager
+from .pzem_async import AsyncPZEM004T, AsyncSerialPort
 
 __version__ = "2.0.0"
 __author__ = "AC Management Team"
@@ -13,5 +14,10 @@ __email__ = "support@acmanagement.com"
 
 __all__ = [
     "PZEM004T",
-    "PZEM004Tv30"
+    "PZEM004Tv30",
+    "PZEMBus",
+    "PZEMSession",
+    "PZEMSessionManager",
+    "AsyncPZEM004T",
+    "AsyncSerialPort"
 ] 
\ No newline at end of file
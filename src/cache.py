@@ -0,0 +1,117 @@
+"""
+In-process response cache for the PZEM-004T web server
+Keeps computed results (database stats, sensor summary, dashboard payloads)
+for a few seconds, shares one computation between concurrent requests and
+is cleared as soon as new measurements are written
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+class TTLCache:
+    """
+    Asyncio TTL cache with single-flight computation
+    
+    get() returns a cached value while it is younger than its TTL. On a miss
+    the first caller starts compute() as a separate task and every concurrent
+    caller for the same key awaits that task, so N dashboards asking at once
+    cost one query. A caller that is cancelled does not cancel the computation
+    of the others. Errors are not cached.
+    
+    invalidate() drops every entry; a computation that was already running
+    still answers its callers but its (possibly stale) result is not stored.
+    Use from the event loop thread only.
+    """
+    
+    def __init__(self, default_ttl: float = 5.0, max_entries: int = 256):
+        """
+        Args:
+            default_ttl: Seconds a value stays valid when get() has no ttl
+            max_entries: Least recently used entries are evicted above this
+        """
+        self.default_ttl = default_ttl
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Hashable, tuple]' = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    async def get(self, key: Hashable, compute: Callable[[], Awaitable[Any]],
+                  ttl: Optional[float] = None) -> Any:
+        """
+        Return the cached value of key, computing it if missing or expired
+        
+        Args:
+            key: Hashable cache key
+            compute: Coroutine function producing the value
+            ttl: Seconds to keep the value (default: default_ttl, 0 = do not store)
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, value = entry
+            if time.monotonic() < expires:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        
+        task = self._inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            ttl = self.default_ttl if ttl is None else ttl
+            generation = self._generation
+            task.add_done_callback(lambda done: self._store(key, done, generation, ttl))
+        return await asyncio.shield(task)
+    
+    def _store(self, key: Hashable, task: asyncio.Future, generation: int, ttl: float):
+        """Done callback of a computation: cache its result unless invalidated meanwhile"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            self.errors += 1
+            return
+        if generation != self._generation or ttl <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl, task.result())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def invalidate(self):
+        """Drop every cached value (called when measurements or sensors change)"""
+        self._generation += 1
+        self._entries.clear()
+        # Later callers must not join a computation that may read old data
+        self._inflight.clear()
+        self.invalidations += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for monitoring"""
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            'entries': len(self._entries),
+            'inflight': len(self._inflight),
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'errors': self.errors,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+            'hit_ratio': round((self.hits + self.coalesced) / lookups, 4) if lookups else None,
+            'default_ttl': self.default_ttl,
+            'max_entries': self.max_entries
+        }
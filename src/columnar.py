@@ -0,0 +1,179 @@
+"""
+Columnar export helpers for PZEM-004T measurements
+Write measurements as compressed Parquet or Arrow IPC (Feather v2) files,
+one row group / record batch at a time, so exports of any size use flat memory
+"""
+
+from typing import Dict, Iterable, Iterator, List, Optional
+
+try:
+    import pyarrow as pa  # type: ignore
+    import pyarrow.parquet as pq  # type: ignore
+except Exception:
+    pa = None  # Will check at runtime
+    pq = None
+
+COLUMNAR_FORMATS = ('parquet', 'arrow')
+
+# File extension and HTTP media type of each format
+COLUMNAR_EXTENSIONS = {'parquet': 'parquet', 'arrow': 'arrow'}
+COLUMNAR_MEDIA_TYPES = {
+    'parquet': 'application/vnd.apache.parquet',
+    'arrow': 'application/vnd.apache.arrow.file'
+}
+
+# Measurement fields read from the database, in column order
+COLUMNAR_FIELDS = ['port', 'timestamp_ms', 'voltage', 'current', 'power', 'energy',
+                   'frequency', 'power_factor', 'alarm_status']
+
+# Rows per Parquet row group / Arrow record batch
+ROW_GROUP_SIZE = 32768
+
+def require_pyarrow():
+    """Raise RuntimeError if pyarrow is not installed"""
+    if pa is None:
+        raise RuntimeError("Thiếu thư viện 'pyarrow'. Vui lòng cài đặt: pip install pyarrow")
+
+def measurement_schema():
+    """
+    Arrow schema of exported measurements
+    
+    The timestamp is a real UTC timestamp column, so pandas reads it as
+    datetime64 directly. Repeated port names cost little: Parquet
+    dictionary-encodes them and the Arrow file is compressed.
+    """
+    require_pyarrow()
+    return pa.schema([
+        ('port', pa.string()),
+        ('timestamp', pa.timestamp('ms', tz='UTC')),
+        ('voltage', pa.float64()),
+        ('current', pa.float64()),
+        ('power', pa.float64()),
+        ('energy', pa.float64()),
+        ('frequency', pa.float64()),
+        ('power_factor', pa.float64()),
+        ('alarm_status', pa.bool_())
+    ])
+
+def default_compression() -> str:
+    """Best codec available in this pyarrow build (zstd, else snappy)"""
+    require_pyarrow()
+    return 'zstd' if pa.Codec.is_available('zstd') else 'snappy'
+
+def measurement_batch(records: List[Dict]):
+    """
+    Convert measurement dictionaries (COLUMNAR_FIELDS) into an Arrow record batch
+    
+    Args:
+        records: Measurements as returned by PZEMDatabase.iter_measurements_range
+    """
+    schema = measurement_schema()
+    columns = [
+        [r['port'] for r in records],
+        [r['timestamp_ms'] for r in records]
+    ]
+    columns.extend([r[name] for r in records] for name in schema.names[2:])
+    return pa.RecordBatch.from_arrays(
+        [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+        schema=schema
+    )
+
+def _chunks(rows: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    """Group rows into lists of at most size"""
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+class _ChunkSink:
+    """Write-only file object that buffers output until drained"""
+    
+    def __init__(self):
+        self.closed = False
+        self._parts = []
+    
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def close(self):
+        self.closed = True
+    
+    def drain(self) -> bytes:
+        """Return and forget everything written so far"""
+        data = b''.join(self._parts)
+        self._parts = []
+        return data
+
+def _open_writer(sink, fmt: str, compression: Optional[str]):
+    """Open a Parquet or Arrow IPC file writer on sink (path or file object)"""
+    if fmt not in COLUMNAR_FORMATS:
+        raise ValueError(f"Unknown columnar format: {fmt}")
+    schema = measurement_schema()
+    compression = compression or default_compression()
+    if fmt == 'parquet':
+        return pq.ParquetWriter(sink, schema, compression=compression)
+    options = pa.ipc.IpcWriteOptions(compression=compression)
+    return pa.ipc.new_file(sink, schema, options=options)
+
+def write_columnar(rows: Iterable[Dict], sink, fmt: str = 'parquet',
+                   compression: Optional[str] = None,
+                   row_group_size: int = ROW_GROUP_SIZE) -> int:
+    """
+    Write measurements to a Parquet or Arrow IPC file
+    
+    Args:
+        rows: Measurement dictionaries with COLUMNAR_FIELDS (any iterable, read once)
+        sink: Output file path or writable binary file object
+        fmt: 'parquet' or 'arrow'
+        compression: Codec name (default: zstd if available, else snappy)
+        row_group_size: Rows per row group / record batch
+    
+    Returns:
+        Number of rows written
+    """
+    writer = _open_writer(sink, fmt, compression)
+    total = 0
+    try:
+        for chunk in _chunks(rows, row_group_size):
+            writer.write_batch(measurement_batch(chunk))
+            total += len(chunk)
+    finally:
+        writer.close()
+    return total
+
+def iter_columnar(rows: Iterable[Dict], fmt: str = 'parquet',
+                  compression: Optional[str] = None,
+                  row_group_size: int = ROW_GROUP_SIZE) -> Iterator[bytes]:
+    """
+    Encode measurements as a Parquet or Arrow IPC file, yielding its bytes
+    one row group at a time (for streaming HTTP responses)
+    
+    Args:
+        rows: Measurement dictionaries with COLUMNAR_FIELDS (any iterable, read once)
+        fmt: 'parquet' or 'arrow'
+        compression: Codec name (default: zstd if available, else snappy)
+        row_group_size: Rows per row group / record batch
+    
+    Yields:
+        Consecutive pieces of the file; the last one holds the footer
+    """
+    sink = _ChunkSink()
+    writer = _open_writer(sink, fmt, compression)
+    try:
+        for chunk in _chunks(rows, row_group_size):
+            writer.write_batch(measurement_batch(chunk))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    yield sink.drain()
+
@@ -4,32 +4,187 @@ Provides SQLite database operations for storing sensor data
 """
 
 import sqlite3
+import json
 import os
-from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 import logging
 
+def to_epoch_ms(value) -> Optional[int]:
+    """
+    Convert a timestamp to integer epoch milliseconds
+    
+    Args:
+        value: datetime (naive = local time), epoch milliseconds (int/float),
+            a string of digits (epoch milliseconds), or a string in ISO format /
+            'YYYY-MM-DD [HH:MM:SS]'
+            
+    Returns:
+        Epoch milliseconds, or None if value is None
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return int(value.timestamp() * 1000)
+    if isinstance(value, (int, float)):
+        return int(value)
+    if isinstance(value, str) and value.isdigit():
+        return int(value)
+    return int(datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp() * 1000)
+
+# Units accepted by bucket_to_ms, in milliseconds
+BUCKET_UNITS = {'s': 1000, 'm': 60000, 'h': 3600000, 'd': 86400000}
+
+def bucket_to_ms(bucket: str) -> int:
+    """
+    Convert a bucket size such as '30s', '5m', '1h' or '1d' to milliseconds
+    
+    Raises:
+        ValueError: If the bucket size is malformed
+    """
+    bucket = str(bucket).strip().lower()
+    try:
+        count = int(bucket[:-1])
+        unit = BUCKET_UNITS[bucket[-1:]]
+    except (KeyError, ValueError):
+        raise ValueError(f"Invalid bucket size: {bucket!r} (use e.g. 30s, 5m, 1h, 1d)")
+    if count <= 0:
+        raise ValueError(f"Invalid bucket size: {bucket!r}")
+    return count * unit
+
 class PZEMDatabase:
     """SQLite database manager for PZEM-004T sensor data"""
     
-    def __init__(self, db_path: str = "data/pzem_data.db"):
+    # Pragmas applied to every connection opened in persistent mode
+    DEFAULT_PRAGMAS = {
+        'journal_mode': 'WAL',        # readers no longer block the logger
+        'synchronous': 'NORMAL',      # fsync on checkpoint only (safe with WAL)
+        'cache_size': -8000,          # negative value = KiB, i.e. 8 MB page cache
+        'mmap_size': 64 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,         # milliseconds
+    }
+    
+    # Schema version stored in PRAGMA user_version (see _migrate)
+    SCHEMA_VERSION = 5
+    MIGRATION_CHUNK_SIZE = 10000
+    
+    # Rollup bucket sizes in milliseconds (buckets are aligned to UTC)
+    ROLLUP_RESOLUTIONS = {'1m': 60000, '1h': 3600000, '1d': 86400000}
+    # Metrics kept as min/max/sum per bucket (energy is a counter: first/last instead)
+    ROLLUP_METRICS = ('voltage', 'current', 'power', 'frequency', 'power_factor')
+    
+    def __init__(self, db_path: str = "data/pzem_data.db", persistent: bool = False,
+                 pragmas: Optional[Dict] = None, cached_statements: int = 128,
+                 sensor_flush_interval: float = 30.0):
         """
         Initialize database connection
         
         Args:
             db_path: Path to SQLite database file
+            persistent: Keep one long-lived connection per thread instead of
+                opening a new connection for every call
+            pragmas: Overrides for DEFAULT_PRAGMAS (persistent mode only)
+            cached_statements: Size of the per-connection prepared statement cache
+            sensor_flush_interval: Seconds between writes of the buffered
+                sensors.last_seen/total_readings bookkeeping
         """
         self.db_path = db_path
+        self.persistent = persistent
+        self.pragmas = dict(self.DEFAULT_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+        self.cached_statements = cached_statements
+        
+        # Persistent connection bookkeeping (one connection per thread)
+        self._local = threading.local()
+        self._connections: List[Tuple[threading.Thread, sqlite3.Connection]] = []
+        self._connections_lock = threading.Lock()
+        
+        # Port -> sensor ID cache and buffered sensors table bookkeeping
+        self.sensor_flush_interval = sensor_flush_interval
+        self._sensor_ids: Dict[str, int] = {}
+        self._pending_sensor_stats: Dict[int, List] = {}
+        self._sensor_lock = threading.Lock()
+        self._last_sensor_flush = time.monotonic()
+        
         self._ensure_db_directory()
         self._create_tables()
     
+    def _open_connection(self) -> sqlite3.Connection:
+        """Open a new SQLite connection configured with the instance pragmas"""
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        for name, value in self.pragmas.items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+    
+    def _get_thread_connection(self) -> sqlite3.Connection:
+        """Return the persistent connection owned by the calling thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open_connection()
+            self._local.conn = conn
+            with self._connections_lock:
+                # Drop connections left behind by threads that have exited
+                alive = []
+                for thread, thread_conn in self._connections:
+                    if thread.is_alive():
+                        alive.append((thread, thread_conn))
+                    else:
+                        thread_conn.close()
+                alive.append((threading.current_thread(), conn))
+                self._connections = alive
+        return conn
+    
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Yield a connection wrapped in a transaction
+        
+        In persistent mode the calling thread's connection is reused, otherwise
+        a fresh connection is opened and closed around the block.
+        """
+        if self.persistent:
+            conn = self._get_thread_connection()
+            with conn:
+                yield conn
+        else:
+            conn = sqlite3.connect(self.db_path, cached_statements=self.cached_statements)
+            try:
+                with conn:
+                    yield conn
+            finally:
+                conn.close()
+    
+    def close(self):
+        """
+        Flush buffered sensor bookkeeping and close all persistent connections
+        
+        Must not be called while other threads are still using the database.
+        A later call simply opens new connections.
+        """
+        self.flush_sensor_stats()
+        with self._connections_lock:
+            for _, conn in self._connections:
+                conn.close()
+            self._connections = []
+            self._local = threading.local()
+    
     def _ensure_db_directory(self):
         """Ensure database directory exists"""
         os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
     
     def _create_tables(self):
-        """Create database tables if they don't exist"""
-        with sqlite3.connect(self.db_path) as conn:
+        """Create database tables if they don't exist and migrate older databases"""
+        with self._connection() as conn:
             cursor = conn.cursor()
             
             # Create sensors table to track sensor information
@@ -45,6 +200,7 @@ class PZEMDatabase:
             ''')
             
             # Create measurements table for sensor data
+            # timestamp: local time text (display), timestamp_ms: epoch milliseconds (queries)
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS measurements (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -58,32 +214,357 @@ class PZEMDatabase:
                     power_factor REAL,
                     alarm_status BOOLEAN,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    timestamp_ms INTEGER,
                     FOREIGN KEY (sensor_id) REFERENCES sensors (id)
                 )
             ''')
             
-            # Create indexes for better query performance
             cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_measurements_timestamp 
-                ON measurements(timestamp)
+                CREATE INDEX IF NOT EXISTS idx_sensors_port 
+                ON sensors(port)
             ''')
             
+            # Per-sensor aggregates for 1m/1h/1d buckets, maintained incrementally
+            # by _update_rollups (averages are <metric>_sum / sample_count)
             cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_measurements_sensor_id 
-                ON measurements(sensor_id)
+                CREATE TABLE IF NOT EXISTS measurement_rollups (
+                    resolution TEXT NOT NULL,
+                    sensor_id INTEGER NOT NULL,
+                    bucket_ms INTEGER NOT NULL,
+                    sample_count INTEGER NOT NULL,
+                    voltage_min REAL,
+                    voltage_max REAL,
+                    voltage_sum REAL,
+                    current_min REAL,
+                    current_max REAL,
+                    current_sum REAL,
+                    power_min REAL,
+                    power_max REAL,
+                    power_sum REAL,
+                    frequency_min REAL,
+                    frequency_max REAL,
+                    frequency_sum REAL,
+                    power_factor_min REAL,
+                    power_factor_max REAL,
+                    power_factor_sum REAL,
+                    energy_first REAL,
+                    energy_last REAL,
+                    first_ms INTEGER,
+                    last_ms INTEGER,
+                    PRIMARY KEY (resolution, sensor_id, bucket_ms)
+                ) WITHOUT ROWID
             ''')
             
             cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_sensors_port 
-                ON sensors(port)
+                CREATE INDEX IF NOT EXISTS idx_rollups_time
+                ON measurement_rollups(resolution, bucket_ms)
+            ''')
+            
+            # Highest measurement id already aggregated into the rollups
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS rollup_state (
+                    name TEXT PRIMARY KEY,
+                    last_id INTEGER NOT NULL
+                )
+            ''')
+            
+            # Change counters for get_data_version: 'sensors' is bumped by triggers,
+            # 'instance' is a random id telling a recreated database file apart
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS data_versions (
+                    name TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL
+                ) WITHOUT ROWID
+            ''')
+            cursor.execute('''
+                INSERT OR IGNORE INTO data_versions (name, version)
+                VALUES ('sensors', 0), ('instance', random() & 9223372036854775807)
+            ''')
+            
+            # Per-sensor row count, time range and newest id, kept up to date by
+            # triggers so stats and sensor summary never count measurements
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS sensor_counters (
+                    sensor_id INTEGER PRIMARY KEY,
+                    measurement_count INTEGER NOT NULL DEFAULT 0,
+                    first_ms INTEGER,
+                    last_ms INTEGER,
+                    last_id INTEGER
+                )
+            ''')
+            
+            # Newest measurement of each sensor (by timestamp), kept by triggers:
+            # the current-state view is one lookup per sensor
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS sensor_latest (
+                    sensor_id INTEGER PRIMARY KEY,
+                    measurement_id INTEGER NOT NULL,
+                    timestamp_ms INTEGER
+                )
+            ''')
+        
+        self._migrate()
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            # Create indexes for better query performance
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_measurements_timestamp_ms 
+                ON measurements(timestamp_ms)
+            ''')
+            
+            # Per-sensor latest-N and range queries: SEARCH (sensor_id=? AND timestamp_ms>?)
+            # in index order, no sort step
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_measurements_sensor_time 
+                ON measurements(sensor_id, timestamp_ms)
             ''')
             
-            conn.commit()
+            for event in ('INSERT', 'UPDATE', 'DELETE'):
+                cursor.execute(f'''
+                    CREATE TRIGGER IF NOT EXISTS trg_sensors_version_{event.lower()}
+                    AFTER {event} ON sensors
+                    BEGIN
+                        UPDATE data_versions SET version = version + 1 WHERE name = 'sensors';
+                    END
+                ''')
+            
+            self._create_counter_triggers(cursor)
+            self._create_latest_triggers(cursor)
+            
+            # Fill timestamp_ms for rows inserted by writers that only set the text timestamp
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS trg_measurements_timestamp_ms
+                AFTER INSERT ON measurements
+                WHEN NEW.timestamp_ms IS NULL
+                BEGIN
+                    UPDATE measurements
+                    SET timestamp_ms = CAST(strftime('%s', NEW.timestamp, 'utc') AS INTEGER) * 1000
+                    WHERE id = NEW.id;
+                END
+            ''')
+    
+    def _migrate(self):
+        """
+        Upgrade an existing database to SCHEMA_VERSION
+        
+        The schema version is kept in PRAGMA user_version. Data migrations run
+        in chunks of MIGRATION_CHUNK_SIZE rows, each in its own transaction, so
+        the logger and web server keep working while a large database upgrades.
+        """
+        with self._connection() as conn:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+        
+        if version < 1:
+            self._migrate_epoch_timestamps()
+            self._set_schema_version(1)
+        
+        if version < 2:
+            # Migration 2: (sensor_id) index superseded by (sensor_id, timestamp_ms),
+            # which _create_tables builds right after migrating
+            with self._connection() as conn:
+                conn.execute('DROP INDEX IF EXISTS idx_measurements_sensor_id')
+            self._set_schema_version(2)
+        
+        if version < 3:
+            # Migration 3: backfill the rollup tables from existing measurements
+            self.rebuild_rollups()
+            self._set_schema_version(3)
+        
+        if version < 4:
+            # Migration 4: counter triggers and backfill of sensor_counters
+            self.rebuild_sensor_counters()
+            self._set_schema_version(4)
+        
+        if version < 5:
+            # Migration 5: latest-value triggers and backfill of sensor_latest
+            self.rebuild_sensor_latest()
+            self._set_schema_version(5)
+    
+    @staticmethod
+    def _create_counter_triggers(cursor: sqlite3.Cursor):
+        """
+        Create the triggers maintaining sensor_counters
+        
+        Inserts update the counters in O(1). A delete only looks up the
+        sensor's new first/last timestamp (an index seek) when it removed the
+        oldest or newest row, which is what cleanup_old_data does.
+        """
+        # Same conversion as trg_measurements_timestamp_ms, which may run after this trigger
+        timestamp_ms = "COALESCE(NEW.timestamp_ms, CAST(strftime('%s', NEW.timestamp, 'utc') AS INTEGER) * 1000)"
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_sensor_counters_insert
+            AFTER INSERT ON measurements
+            BEGIN
+                INSERT INTO sensor_counters (sensor_id, measurement_count, first_ms, last_ms, last_id)
+                VALUES (NEW.sensor_id, 1, {timestamp_ms}, {timestamp_ms}, NEW.id)
+                ON CONFLICT (sensor_id) DO UPDATE SET
+                    measurement_count = measurement_count + 1,
+                    first_ms = COALESCE(MIN(first_ms, excluded.first_ms), first_ms, excluded.first_ms),
+                    last_ms = COALESCE(MAX(last_ms, excluded.last_ms), last_ms, excluded.last_ms),
+                    last_id = MAX(COALESCE(last_id, 0), excluded.last_id);
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_sensor_counters_delete
+            AFTER DELETE ON measurements
+            BEGIN
+                UPDATE sensor_counters SET
+                    measurement_count = measurement_count - 1,
+                    first_ms = CASE WHEN OLD.timestamp_ms <= first_ms THEN
+                        (SELECT MIN(timestamp_ms) FROM measurements WHERE sensor_id = OLD.sensor_id)
+                        ELSE first_ms END,
+                    last_ms = CASE WHEN OLD.timestamp_ms >= last_ms THEN
+                        (SELECT MAX(timestamp_ms) FROM measurements WHERE sensor_id = OLD.sensor_id)
+                        ELSE last_ms END,
+                    last_id = CASE WHEN OLD.id >= last_id THEN
+                        (SELECT MAX(id) FROM measurements WHERE sensor_id = OLD.sensor_id)
+                        ELSE last_id END
+                WHERE sensor_id = OLD.sensor_id;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_sensor_counters_sensor_delete
+            AFTER DELETE ON sensors
+            BEGIN
+                DELETE FROM sensor_counters WHERE sensor_id = OLD.id;
+            END
+        ''')
+    
+    def rebuild_sensor_counters(self) -> int:
+        """
+        Recount sensor_counters from the raw measurements (one full scan)
+        
+        Runs in a single write transaction together with the trigger creation,
+        so no measurement written meanwhile is counted twice or missed.
+        
+        Returns:
+            Total number of measurements counted
+        """
+        with self._connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            cursor = conn.cursor()
+            self._create_counter_triggers(cursor)
+            cursor.execute('DELETE FROM sensor_counters')
+            cursor.execute('''
+                INSERT INTO sensor_counters (sensor_id, measurement_count, first_ms, last_ms, last_id)
+                SELECT sensor_id, COUNT(*), MIN(timestamp_ms), MAX(timestamp_ms), MAX(id)
+                FROM measurements
+                GROUP BY sensor_id
+            ''')
+            cursor.execute('SELECT COALESCE(SUM(measurement_count), 0) FROM sensor_counters')
+            return cursor.fetchone()[0]
+    
+    @staticmethod
+    def _create_latest_triggers(cursor: sqlite3.Cursor):
+        """
+        Create the triggers maintaining sensor_latest
+        
+        An insert replaces the sensor's row unless it is older than the
+        current one (late samples re-ingested from a spill file). Deleting the
+        latest measurement points the row at the sensor's newest remaining one.
+        """
+        timestamp_ms = "COALESCE(NEW.timestamp_ms, CAST(strftime('%s', NEW.timestamp, 'utc') AS INTEGER) * 1000)"
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_sensor_latest_insert
+            AFTER INSERT ON measurements
+            BEGIN
+                INSERT INTO sensor_latest (sensor_id, measurement_id, timestamp_ms)
+                VALUES (NEW.sensor_id, NEW.id, {timestamp_ms})
+                ON CONFLICT (sensor_id) DO UPDATE SET
+                    measurement_id = excluded.measurement_id,
+                    timestamp_ms = excluded.timestamp_ms
+                WHERE excluded.timestamp_ms >= sensor_latest.timestamp_ms
+                    OR sensor_latest.timestamp_ms IS NULL;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_sensor_latest_delete
+            AFTER DELETE ON measurements
+            WHEN OLD.id = (SELECT measurement_id FROM sensor_latest WHERE sensor_id = OLD.sensor_id)
+            BEGIN
+                DELETE FROM sensor_latest WHERE sensor_id = OLD.sensor_id;
+                INSERT INTO sensor_latest (sensor_id, measurement_id, timestamp_ms)
+                SELECT sensor_id, id, timestamp_ms
+                FROM measurements
+                WHERE sensor_id = OLD.sensor_id
+                ORDER BY timestamp_ms DESC, id DESC
+                LIMIT 1;
+            END
+        ''')
+        cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_sensor_latest_sensor_delete
+            AFTER DELETE ON sensors
+            BEGIN
+                DELETE FROM sensor_latest WHERE sensor_id = OLD.id;
+            END
+        ''')
+    
+    def rebuild_sensor_latest(self) -> int:
+        """
+        Recompute sensor_latest from the raw measurements (one index seek per sensor)
+        
+        Returns:
+            Number of sensors with a latest measurement
+        """
+        with self._connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            cursor = conn.cursor()
+            self._create_latest_triggers(cursor)
+            cursor.execute('DELETE FROM sensor_latest')
+            cursor.execute('''
+                INSERT INTO sensor_latest (sensor_id, measurement_id, timestamp_ms)
+                SELECT m.sensor_id, m.id, m.timestamp_ms
+                FROM sensors s
+                JOIN measurements m ON m.id = (
+                    SELECT id FROM measurements
+                    WHERE sensor_id = s.id
+                    ORDER BY timestamp_ms DESC, id DESC
+                    LIMIT 1
+                )
+            ''')
+            return cursor.rowcount
+    
+    def _set_schema_version(self, version: int):
+        """Record the schema version in the database file"""
+        with self._connection() as conn:
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+    
+    def _migrate_epoch_timestamps(self):
+        """Migration 1: add measurements.timestamp_ms and backfill it from the text timestamp"""
+        with self._connection() as conn:
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(measurements)')]
+            if 'timestamp_ms' not in columns:
+                try:
+                    conn.execute('ALTER TABLE measurements ADD COLUMN timestamp_ms INTEGER')
+                except sqlite3.OperationalError as e:
+                    # Another process migrating the same file got there first
+                    if 'duplicate column' not in str(e):
+                        raise
+            max_id = conn.execute('SELECT MAX(id) FROM measurements').fetchone()[0] or 0
+        
+        # Text timestamps are local time, the 'utc' modifier converts them to UTC epoch
+        for chunk_start in range(0, max_id, self.MIGRATION_CHUNK_SIZE):
+            with self._connection() as conn:
+                conn.execute('''
+                    UPDATE measurements
+                    SET timestamp_ms = CAST(strftime('%s', timestamp, 'utc') AS INTEGER) * 1000
+                    WHERE id > ? AND id <= ? AND timestamp_ms IS NULL
+                ''', (chunk_start, chunk_start + self.MIGRATION_CHUNK_SIZE))
+        
+        # Text timestamps are no longer used for filtering or ordering
+        with self._connection() as conn:
+            conn.execute('DROP INDEX IF EXISTS idx_measurements_timestamp')
     
     def get_or_create_sensor(self, port: str, device_address: int = 248) -> int:
         """
         Get existing sensor ID or create new sensor record
         
+        Sensor IDs are cached per port, so after the first call this does not
+        touch the database. The last_seen/total_readings bookkeeping is
+        buffered and written by flush_sensor_stats().
+        
         Args:
             port: Serial port name
             device_address: PZEM device address (default 248 = 0xF8)
@@ -91,33 +572,110 @@ class PZEMDatabase:
         Returns:
             Sensor ID
         """
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # Try to get existing sensor
-            cursor.execute(
-                'SELECT id FROM sensors WHERE port = ?',
-                (port,)
-            )
-            result = cursor.fetchone()
-            
-            if result:
-                sensor_id = result[0]
-                # Update last_seen and increment total_readings
-                cursor.execute('''
-                    UPDATE sensors 
-                    SET last_seen = CURRENT_TIMESTAMP, 
-                        total_readings = total_readings + 1
-                    WHERE id = ?
-                ''', (sensor_id,))
-                return sensor_id
-            else:
-                # Create new sensor
+        with self._sensor_lock:
+            sensor_id = self._sensor_ids.get(port)
+        
+        if sensor_id is None:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                
+                # Create the sensor unless another writer already did
                 cursor.execute('''
-                    INSERT INTO sensors (port, device_address, first_seen, last_seen, total_readings)
-                    VALUES (?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, 1)
+                    INSERT OR IGNORE INTO sensors (port, device_address, first_seen, last_seen, total_readings)
+                    VALUES (?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP, 0)
                 ''', (port, device_address))
-                return cursor.lastrowid
+                cursor.execute(
+                    'SELECT id FROM sensors WHERE port = ?',
+                    (port,)
+                )
+                sensor_id = cursor.fetchone()[0]
+            
+            with self._sensor_lock:
+                self._sensor_ids[port] = sensor_id
+        
+        self._record_sensor_readings(sensor_id, port, device_address, 1)
+        return sensor_id
+    
+    def _record_sensor_readings(self, sensor_id: int, port: str, device_address: int, count: int):
+        """Buffer last_seen/total_readings updates for a sensor"""
+        last_seen = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        with self._sensor_lock:
+            pending = self._pending_sensor_stats.get(sensor_id)
+            if pending is None:
+                self._pending_sensor_stats[sensor_id] = [port, device_address, count, last_seen]
+            else:
+                pending[2] += count
+                pending[3] = last_seen
+    
+    def _maybe_flush_sensor_stats(self):
+        """Flush buffered sensor bookkeeping once the flush interval has passed"""
+        if time.monotonic() - self._last_sensor_flush >= self.sensor_flush_interval:
+            self.flush_sensor_stats()
+    
+    def flush_sensor_stats(self) -> int:
+        """
+        Write buffered last_seen/total_readings updates to the sensors table
+        
+        If a sensor row disappeared (database reset by another process), it is
+        recreated with its old ID so already stored measurements stay linked.
+        
+        Returns:
+            Number of sensors updated
+        """
+        with self._sensor_lock:
+            pending = self._pending_sensor_stats
+            self._pending_sensor_stats = {}
+            self._last_sensor_flush = time.monotonic()
+        
+        if not pending:
+            return 0
+        
+        try:
+            with self._connection() as conn:
+                cursor = conn.cursor()
+                for sensor_id, (port, device_address, count, last_seen) in pending.items():
+                    cursor.execute('''
+                        UPDATE sensors
+                        SET last_seen = ?,
+                            total_readings = total_readings + ?
+                        WHERE id = ?
+                    ''', (last_seen, count, sensor_id))
+                    if cursor.rowcount == 0:
+                        cursor.execute('''
+                            INSERT OR IGNORE INTO sensors (id, port, device_address, first_seen, last_seen, total_readings)
+                            VALUES (?, ?, ?, ?, ?, ?)
+                        ''', (sensor_id, port, device_address, last_seen, last_seen, count))
+                        if cursor.rowcount == 0:
+                            # Port now belongs to another sensor ID, resolve it again next time
+                            with self._sensor_lock:
+                                self._sensor_ids.pop(port, None)
+        except Exception as e:
+            logging.error(f"Error flushing sensor statistics: {e}")
+            return 0
+        
+        return len(pending)
+    
+    def invalidate_sensor_cache(self):
+        """Forget cached sensor IDs and drop buffered bookkeeping (after deleting sensors)"""
+        with self._sensor_lock:
+            self._sensor_ids = {}
+            self._pending_sensor_stats = {}
+    
+    @staticmethod
+    def _measurement_row(sensor_id: int, sensor_data: Dict) -> Tuple:
+        """Build the measurements INSERT parameters for one sample"""
+        return (
+            sensor_id,
+            sensor_data['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
+            to_epoch_ms(sensor_data['timestamp']),
+            sensor_data['voltage'],
+            sensor_data['current'],
+            sensor_data['power'],
+            sensor_data['energy'],
+            sensor_data['frequency'],
+            sensor_data['power_factor'],
+            sensor_data['alarm']
+        )
     
     def save_measurement(self, sensor_data: Dict) -> bool:
         """
@@ -129,98 +687,181 @@ class PZEMDatabase:
         Returns:
             True if saved successfully, False otherwise
         """
+        return self.save_measurements_batch([sensor_data]) == 1
+    
+    def save_measurements_batch(self, samples: List[Dict]) -> int:
+        """
+        Save several sensor measurements in a single transaction
+        
+        Use this once per polling cycle instead of calling save_measurement
+        for every port: all rows share one commit (one fsync).
+        
+        Args:
+            samples: List of sensor data dictionaries (same format as save_measurement)
+            
+        Returns:
+            Number of measurements saved (0 on error)
+        """
+        if not samples:
+            return 0
+        
         try:
-            # Get or create sensor record
-            sensor_id = self.get_or_create_sensor(sensor_data['port'])
+            # Get or create sensor records (cached after the first call)
+            rows = [
+                self._measurement_row(self.get_or_create_sensor(sample['port']), sample)
+                for sample in samples
+            ]
             
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                
-                cursor.execute('''
+            with self._connection() as conn:
+                conn.executemany('''
                     INSERT INTO measurements 
-                    (sensor_id, timestamp, voltage, current, power, energy, 
+                    (sensor_id, timestamp, timestamp_ms, voltage, current, power, energy, 
                      frequency, power_factor, alarm_status)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    sensor_id,
-                    sensor_data['timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
-                    sensor_data['voltage'],
-                    sensor_data['current'],
-                    sensor_data['power'],
-                    sensor_data['energy'],
-                    sensor_data['frequency'],
-                    sensor_data['power_factor'],
-                    sensor_data['alarm']
-                ))
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
                 
-                # Update sensor last_seen timestamp when new measurement is added
-                cursor.execute('''
-                    UPDATE sensors 
-                    SET last_seen = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                ''', (sensor_id,))
-                
-                return True
+                # Same transaction: the rollups never miss or double-count a batch.
+                # Loop until the watermark reaches MAX(id), so rows written by a
+                # bulk import or directly in SQL are caught up here as well.
+                cursor = conn.cursor()
+                while self._update_rollups(cursor, self.MIGRATION_CHUNK_SIZE):
+                    pass
+            
+            self._maybe_flush_sensor_stats()
+            return len(rows)
                 
         except Exception as e:
-            logging.error(f"Error saving measurement to database: {e}")
-            return False
+            logging.error(f"Error saving measurements to database: {e}")
+            return 0
+    
+    # Columns selected by the measurement queries, in _row_to_measurement order
+    MEASUREMENT_SELECT = '''
+                    s.port,
+                    m.timestamp,
+                    m.voltage,
+                    m.current,
+                    m.power,
+                    m.energy,
+                    m.frequency,
+                    m.power_factor,
+                    m.alarm_status,
+                    m.timestamp_ms
+    '''
+    
+    @staticmethod
+    def _row_to_measurement(row: Tuple) -> Dict:
+        """Convert a MEASUREMENT_SELECT row into a measurement dictionary"""
+        return {
+            'port': row[0],
+            'timestamp': row[1],
+            'voltage': row[2] if row[2] is not None else 0.0,
+            'current': row[3] if row[3] is not None else 0.0,
+            'power': row[4] if row[4] is not None else 0.0,
+            'energy': row[5] if row[5] is not None else 0.0,
+            'frequency': row[6] if row[6] is not None else 0.0,
+            'power_factor': row[7] if row[7] is not None else 0.0,
+            'alarm_status': bool(row[8]) if row[8] is not None else False,
+            'timestamp_ms': row[9]
+        }
+    
+    # Fields that can be requested with columns=..., mapped to their SQL expression
+    MEASUREMENT_FIELDS = {
+        'port': 's.port',
+        'timestamp': 'm.timestamp',
+        'voltage': 'm.voltage',
+        'current': 'm.current',
+        'power': 'm.power',
+        'energy': 'm.energy',
+        'frequency': 'm.frequency',
+        'power_factor': 'm.power_factor',
+        'alarm_status': 'm.alarm_status',
+        'timestamp_ms': 'm.timestamp_ms',
+        'id': 'm.id',
+        'sensor_id': 'm.sensor_id'
+    }
+    
+    @classmethod
+    def _row_to_fields(cls, row: Tuple, fields: List[str]) -> Dict:
+        """Convert a row selected with _select_fields into a dictionary (same defaults as _row_to_measurement)"""
+        record = {}
+        for field, value in zip(fields, row):
+            if value is None:
+                if field == 'alarm_status':
+                    value = False
+                elif field in ('voltage', 'current', 'power', 'energy', 'frequency', 'power_factor'):
+                    value = 0.0
+            elif field == 'alarm_status':
+                value = bool(value)
+            record[field] = value
+        return record
     
-    def get_latest_measurements(self, limit: int = 100) -> List[Dict]:
+    @classmethod
+    def _select_fields(cls, columns: List[str]) -> str:
+        """Build the SELECT list for the requested measurement fields"""
+        unknown = [c for c in columns if c not in cls.MEASUREMENT_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown measurement columns: {', '.join(unknown)}")
+        return ', '.join(cls.MEASUREMENT_FIELDS[c] for c in columns)
+    
+    def get_latest_measurements(self, limit: int = 100, since: Optional[datetime] = None) -> List[Dict]:
         """
         Get latest measurements from all sensors
         
         Args:
             limit: Maximum number of measurements to return
+            since: Only return measurements at or after this time
             
         Returns:
             List of measurement dictionaries
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             
-            cursor.execute('''
-                SELECT 
-                    s.port,
-                    m.timestamp,
-                    m.voltage,
-                    m.current,
-                    m.power,
-                    m.energy,
-                    m.frequency,
-                    m.power_factor,
-                    m.alarm_status
+            cursor.execute(f'''
+                SELECT {self.MEASUREMENT_SELECT}
                 FROM measurements m
                 JOIN sensors s ON m.sensor_id = s.id
-                ORDER BY m.timestamp DESC
+                WHERE m.timestamp_ms >= ?
+                ORDER BY m.timestamp_ms DESC
                 LIMIT ?
-            ''', (limit,))
+            ''', (to_epoch_ms(since) or 0, limit))
             
-            results = cursor.fetchall()
+            return [self._row_to_measurement(row) for row in cursor.fetchall()]
+    
+    def get_latest_per_sensor(self) -> List[Dict]:
+        """
+        Get the newest measurement of every sensor
+        
+        Read from sensor_latest, so every sensor is included however long ago
+        it last reported, at the cost of one lookup per sensor.
+        
+        Returns:
+            List of measurement dictionaries, one per sensor, ordered by port
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
             
-            return [
-                {
-                    'port': row[0],
-                    'timestamp': row[1],
-                    'voltage': row[2] if row[2] is not None else 0.0,
-                    'current': row[3] if row[3] is not None else 0.0,
-                    'power': row[4] if row[4] is not None else 0.0,
-                    'energy': row[5] if row[5] is not None else 0.0,
-                    'frequency': row[6] if row[6] is not None else 0.0,
-                    'power_factor': row[7] if row[7] is not None else 0.0,
-                    'alarm_status': bool(row[8]) if row[8] is not None else False
-                }
-                for row in results
-            ]
+            cursor.execute(f'''
+                SELECT {self.MEASUREMENT_SELECT}
+                FROM sensor_latest l
+                JOIN sensors s ON s.id = l.sensor_id
+                JOIN measurements m ON m.id = l.measurement_id
+                ORDER BY s.port
+            ''')
+            
+            return [self._row_to_measurement(row) for row in cursor.fetchall()]
     
     def get_sensor_summary(self) -> List[Dict]:
         """
         Get summary statistics for all sensors
         
+        Measurement counts and times come from sensor_counters, so this reads
+        one row per sensor whatever the size of the measurements table.
+        
         Returns:
             List of sensor summary dictionaries
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -230,11 +871,11 @@ class PZEMDatabase:
                     s.first_seen,
                     s.last_seen,
                     s.total_readings,
-                    COUNT(m.id) as total_measurements,
-                    MAX(m.timestamp) as last_measurement
+                    COALESCE(c.measurement_count, 0) as total_measurements,
+                    c.last_ms as last_measurement_ms,
+                    s.id
                 FROM sensors s
-                LEFT JOIN measurements m ON s.id = m.sensor_id
-                GROUP BY s.id
+                LEFT JOIN sensor_counters c ON c.sensor_id = s.id
                 ORDER BY s.last_seen DESC
             ''')
             
@@ -242,65 +883,746 @@ class PZEMDatabase:
             
             return [
                 {
+                    'id': row[7],
                     'port': row[0],
                     'device_address': row[1],
                     'first_seen': row[2],
                     'last_seen': row[3],
                     'total_readings': row[4],
                     'total_measurements': row[5],
-                    'last_measurement': row[6]
+                    'last_measurement': self._format_epoch_ms(row[6]),
+                    'last_measurement_ms': row[6]
                 }
                 for row in results
             ]
     
-    def get_measurements_by_port(self, port: str, limit: int = 100) -> List[Dict]:
+    def get_measurements_by_port(self, port: str, limit: int = 100,
+                                 since: Optional[datetime] = None) -> List[Dict]:
         """
         Get measurements for a specific sensor port
         
         Args:
             port: Serial port name
             limit: Maximum number of measurements to return
+            since: Only return measurements at or after this time
             
         Returns:
             List of measurement dictionaries
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             
-            cursor.execute('''
-                SELECT 
-                    s.port,
-                    m.timestamp,
-                    m.voltage,
-                    m.current,
-                    m.power,
-                    m.energy,
-                    m.frequency,
-                    m.power_factor,
-                    m.alarm_status
+            cursor.execute(f'''
+                SELECT {self.MEASUREMENT_SELECT}
                 FROM measurements m
                 JOIN sensors s ON m.sensor_id = s.id
-                WHERE s.port = ?
-                ORDER BY m.timestamp DESC
+                WHERE m.sensor_id = (SELECT id FROM sensors WHERE port = ?)
+                  AND m.timestamp_ms >= ?
+                ORDER BY m.timestamp_ms DESC
                 LIMIT ?
-            ''', (port, limit))
+            ''', (port, to_epoch_ms(since) or 0, limit))
             
-            results = cursor.fetchall()
+            return [self._row_to_measurement(row) for row in cursor.fetchall()]
+    
+    def get_measurements_range(self, start=None, end=None, port: Optional[str] = None,
+                               sensor_ids: Optional[List[int]] = None,
+                               columns: Optional[List[str]] = None,
+                               limit: Optional[int] = None,
+                               newest_first: bool = True) -> List[Dict]:
+        """
+        Get measurements in a time range, filtered in SQL using the indexes
+        
+        Args:
+            start: Range start, inclusive (datetime, epoch ms or ISO string; None = open)
+            end: Range end, exclusive (datetime, epoch ms or ISO string; None = open)
+            port: Only this sensor port
+            sensor_ids: Only these sensor IDs
+            columns: Fields to return (keys of MEASUREMENT_FIELDS, default: all
+                measurement fields)
+            limit: Maximum number of measurements (None = the whole range)
+            newest_first: Sort newest first (default) or oldest first
             
-            return [
-                {
+        Returns:
+            List of measurement dictionaries
+        """
+        conditions = []
+        params: List = []
+        
+        if port is not None:
+            conditions.append('m.sensor_id = (SELECT id FROM sensors WHERE port = ?)')
+            params.append(port)
+        if sensor_ids is not None:
+            if not sensor_ids:
+                return []
+            conditions.append(f"m.sensor_id IN ({', '.join('?' * len(sensor_ids))})")
+            params.extend(int(sensor_id) for sensor_id in sensor_ids)
+        
+        start_ms = to_epoch_ms(start)
+        end_ms = to_epoch_ms(end)
+        conditions.append('m.timestamp_ms >= ?')
+        params.append(start_ms if start_ms is not None else 0)
+        if end_ms is not None:
+            conditions.append('m.timestamp_ms < ?')
+            params.append(end_ms)
+        
+        select = self._select_fields(columns) if columns else self.MEASUREMENT_SELECT
+        order = 'DESC' if newest_first else 'ASC'
+        sql = f'''
+                SELECT {select}
+                FROM measurements m
+                JOIN sensors s ON m.sensor_id = s.id
+                WHERE {' AND '.join(conditions)}
+                ORDER BY m.timestamp_ms {order}
+        '''
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            
+            if columns:
+                return [self._row_to_fields(row, columns) for row in cursor.fetchall()]
+            return [self._row_to_measurement(row) for row in cursor.fetchall()]
+    
+    def iter_measurements_range(self, start=None, end=None, port: Optional[str] = None,
+                                columns: Optional[List[str]] = None,
+                                limit: Optional[int] = None,
+                                newest_first: bool = True,
+                                chunk_size: int = 1000) -> Iterator[Dict]:
+        """
+        Iterate over measurements in a time range without loading them all
+        
+        Same filters as get_measurements_range, but rows are read with
+        fetchmany from a dedicated connection, so memory stays flat however
+        large the range. The connection is closed when the iterator is
+        exhausted or closed.
+        
+        Args:
+            start: Range start, inclusive (datetime, epoch ms or ISO string; None = open)
+            end: Range end, exclusive (None = open)
+            port: Only this sensor port
+            columns: Fields to return (keys of MEASUREMENT_FIELDS, default: all
+                measurement fields)
+            limit: Maximum number of measurements (None = the whole range)
+            newest_first: Sort newest first (default) or oldest first
+            chunk_size: Rows fetched from SQLite per round trip
+        
+        Yields:
+            Measurement dictionaries
+        """
+        conditions = ['m.timestamp_ms >= ?']
+        params: List = [to_epoch_ms(start) or 0]
+        end_ms = to_epoch_ms(end)
+        if end_ms is not None:
+            conditions.append('m.timestamp_ms < ?')
+            params.append(end_ms)
+        if port is not None:
+            conditions.append('m.sensor_id = (SELECT id FROM sensors WHERE port = ?)')
+            params.append(port)
+        
+        select = self._select_fields(columns) if columns else self.MEASUREMENT_SELECT
+        order = 'DESC' if newest_first else 'ASC'
+        sql = f'''
+                SELECT {select}
+                FROM measurements m
+                JOIN sensors s ON m.sensor_id = s.id
+                WHERE {' AND '.join(conditions)}
+                ORDER BY m.timestamp_ms {order}
+        '''
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        
+        # Not the thread's persistent connection: the caller may resume this
+        # iterator from other threads and run other queries in between
+        conn = self._open_connection()
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for row in rows:
+                    if columns:
+                        yield self._row_to_fields(row, columns)
+                    else:
+                        yield self._row_to_measurement(row)
+        finally:
+            conn.close()
+    
+    @staticmethod
+    def encode_cursor(timestamp_ms: int, measurement_id: int) -> str:
+        """Encode a (timestamp_ms, id) keyset position as a page cursor string"""
+        return f"{timestamp_ms}:{measurement_id}"
+    
+    @staticmethod
+    def decode_cursor(cursor: str) -> Tuple[int, int]:
+        """
+        Decode a page cursor string
+        
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        try:
+            timestamp_ms, measurement_id = cursor.split(':')
+            return int(timestamp_ms), int(measurement_id)
+        except (AttributeError, ValueError):
+            raise ValueError(f"Invalid cursor: {cursor!r}")
+    
+    def get_measurements_page(self, limit: int = 100, before: Optional[str] = None,
+                              after: Optional[str] = None, port: Optional[str] = None,
+                              since: Optional[datetime] = None) -> Dict:
+        """
+        Get one page of measurements using keyset (cursor) pagination
+        
+        Pages are keyed on (timestamp_ms, id) and always returned newest first.
+        Every page is an index range scan, so deep pages cost the same as the
+        first one (no OFFSET).
+        
+        Args:
+            limit: Page size
+            before: Cursor; return measurements older than it (next page)
+            after: Cursor; return measurements newer than it (previous page / new data)
+            port: Only this sensor port
+            since: Only measurements at or after this time
+            
+        Returns:
+            Dictionary with 'data' (measurement dictionaries) and 'next_cursor'
+            (pass it as the same before/after argument to continue; None when
+            there are no more rows)
+        """
+        if before is not None and after is not None:
+            raise ValueError("Use either before or after, not both")
+        
+        conditions = ['m.timestamp_ms >= ?']
+        params: List = [to_epoch_ms(since) or 0]
+        if port is not None:
+            conditions.append('m.sensor_id = (SELECT id FROM sensors WHERE port = ?)')
+            params.append(port)
+        
+        if after is not None:
+            conditions.append('(m.timestamp_ms, m.id) > (?, ?)')
+            params.extend(self.decode_cursor(after))
+            order = 'ASC'
+        else:
+            if before is not None:
+                conditions.append('(m.timestamp_ms, m.id) < (?, ?)')
+                params.extend(self.decode_cursor(before))
+            order = 'DESC'
+        params.append(limit)
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(f'''
+                SELECT {self.MEASUREMENT_SELECT}, m.id
+                FROM measurements m
+                JOIN sensors s ON m.sensor_id = s.id
+                WHERE {' AND '.join(conditions)}
+                ORDER BY m.timestamp_ms {order}, m.id {order}
+                LIMIT ?
+            ''', params)
+            
+            rows = cursor.fetchall()
+        
+        next_cursor = None
+        if len(rows) == limit and rows:
+            # Continue from the last row in scan order (oldest for before, newest for after)
+            next_cursor = self.encode_cursor(rows[-1][9], rows[-1][10])
+        if after is not None:
+            rows.reverse()
+        
+        return {
+            'data': [self._row_to_measurement(row) for row in rows],
+            'next_cursor': next_cursor
+        }
+    
+    def get_last_measurement_id(self) -> int:
+        """Highest measurement id, 0 if there are none (a single rowid lookup)"""
+        with self._connection() as conn:
+            row = conn.execute('SELECT MAX(id) FROM measurements').fetchone()
+        return row[0] or 0
+    
+    def get_data_version(self) -> str:
+        """
+        Token that changes whenever measurements or sensors change
+        
+        Built from the lowest and highest measurement id (new rows, cleanup),
+        the trigger-maintained sensors version and the database instance id,
+        all read without scanning a table. Used for HTTP ETags.
+        """
+        with self._connection() as conn:
+            row = conn.execute('''
+                SELECT
+                    (SELECT MIN(id) FROM measurements),
+                    (SELECT MAX(id) FROM measurements),
+                    (SELECT version FROM data_versions WHERE name = 'sensors'),
+                    (SELECT version FROM data_versions WHERE name = 'instance')
+            ''').fetchone()
+        min_id, max_id, sensors_version, instance = row
+        return f"{instance or 0:x}-{min_id or 0}-{max_id or 0}-{sensors_version or 0}"
+    
+    def get_measurements_since(self, since_id: Optional[int] = None, since_ts=None,
+                               port: Optional[str] = None, limit: int = 1000) -> Dict:
+        """
+        Get only the measurements added after a previous fetch (polling deltas)
+        
+        since_id is exact: rows are returned in insertion order, so samples
+        written late with an older timestamp (e.g. re-ingested spill files) are
+        not missed. since_ts selects by measurement time instead.
+        
+        Args:
+            since_id: Only measurements with a higher id (last_id of a previous response)
+            since_ts: Only measurements newer than this time (epoch ms, datetime or ISO string)
+            port: Only this sensor port
+            limit: Maximum number of measurements; the oldest ones are returned
+                first and has_more is set when the rest needs another call
+            
+        Returns:
+            Dictionary with 'data' (measurement dictionaries, newest first),
+            'last_id' (pass as since_id next time) and 'has_more'
+        """
+        if since_id is None and since_ts is None:
+            raise ValueError("since_id or since_ts is required")
+        
+        conditions = []
+        params: List = []
+        if since_id is not None:
+            conditions.append('m.id > ?')
+            params.append(since_id)
+        if since_ts is not None:
+            conditions.append('m.timestamp_ms > ?')
+            params.append(to_epoch_ms(since_ts))
+        if port is not None:
+            # Unary + keeps SQLite on the id/time range instead of scanning the sensor's whole index range
+            conditions.append('+m.sensor_id = (SELECT id FROM sensors WHERE port = ?)')
+            params.append(port)
+        order = 'm.id' if since_id is not None else 'm.timestamp_ms, m.id'
+        params.append(limit + 1)
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(f'''
+                SELECT {self.MEASUREMENT_SELECT}, m.id
+                FROM measurements m
+                JOIN sensors s ON m.sensor_id = s.id
+                WHERE {' AND '.join(conditions)}
+                ORDER BY {order}
+                LIMIT ?
+            ''', params)
+            
+            rows = cursor.fetchall()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        last_id = max((row[10] for row in rows), default=since_id)
+        rows.reverse()
+        
+        return {
+            'data': [self._row_to_measurement(row) for row in rows],
+            'last_id': last_id,
+            'has_more': has_more
+        }
+    
+    @classmethod
+    def _rollup_upsert_sql(cls) -> str:
+        """Build the INSERT ... ON CONFLICT statement merging new measurements into one resolution"""
+        metrics = cls.ROLLUP_METRICS
+        columns = ', '.join(f'{m}_min, {m}_max, {m}_sum' for m in metrics)
+        aggregates = ', '.join(f'MIN({m}), MAX({m}), TOTAL({m})' for m in metrics)
+        merges = ',\n'.join(
+            f'{m}_min = COALESCE(MIN({m}_min, excluded.{m}_min), {m}_min, excluded.{m}_min), '
+            f'{m}_max = COALESCE(MAX({m}_max, excluded.{m}_max), {m}_max, excluded.{m}_max), '
+            f'{m}_sum = {m}_sum + excluded.{m}_sum'
+            for m in metrics
+        )
+        return f'''
+                INSERT INTO measurement_rollups
+                (resolution, sensor_id, bucket_ms, sample_count, {columns},
+                 energy_first, energy_last, first_ms, last_ms)
+                SELECT :resolution, sensor_id, bucket_ms, COUNT(*), {aggregates},
+                       MAX(energy_first), MAX(energy_last), MIN(timestamp_ms), MAX(timestamp_ms)
+                FROM (
+                    SELECT m.*,
+                           m.timestamp_ms - m.timestamp_ms % :size AS bucket_ms,
+                           FIRST_VALUE(m.energy) OVER w AS energy_first,
+                           LAST_VALUE(m.energy) OVER w AS energy_last
+                    FROM measurements m
+                    WHERE m.id > :low AND m.id <= :high AND m.timestamp_ms IS NOT NULL
+                    WINDOW w AS (
+                        PARTITION BY m.sensor_id, m.timestamp_ms - m.timestamp_ms % :size
+                        ORDER BY m.timestamp_ms, m.id
+                        ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+                    )
+                )
+                GROUP BY sensor_id, bucket_ms
+                ON CONFLICT (resolution, sensor_id, bucket_ms) DO UPDATE SET
+                sample_count = sample_count + excluded.sample_count,
+                {merges},
+                energy_first = CASE WHEN excluded.first_ms < first_ms
+                                    THEN excluded.energy_first ELSE energy_first END,
+                energy_last = CASE WHEN excluded.last_ms >= last_ms
+                                   THEN excluded.energy_last ELSE energy_last END,
+                first_ms = MIN(first_ms, excluded.first_ms),
+                last_ms = MAX(last_ms, excluded.last_ms)
+        '''
+    
+    def _update_rollups(self, cursor: sqlite3.Cursor, max_rows: Optional[int] = None) -> int:
+        """
+        Merge measurements newer than the rollup watermark into every resolution
+        
+        Must run inside a write transaction (after an INSERT or BEGIN IMMEDIATE)
+        so no other writer can move the watermark underneath it.
+        
+        Args:
+            cursor: Cursor of the open transaction
+            max_rows: Aggregate at most this many measurement ids (None = all)
+        
+        Returns:
+            Number of measurement ids the watermark advanced by (0 = up to date)
+        """
+        cursor.execute("SELECT last_id FROM rollup_state WHERE name = 'measurements'")
+        row = cursor.fetchone()
+        low = row[0] if row else 0
+        
+        cursor.execute('SELECT MAX(id) FROM measurements')
+        high = cursor.fetchone()[0] or 0
+        if max_rows is not None:
+            high = min(high, low + max_rows)
+        if high <= low:
+            return 0
+        
+        sql = self._rollup_upsert_sql()
+        for resolution, size in self.ROLLUP_RESOLUTIONS.items():
+            cursor.execute(sql, {'resolution': resolution, 'size': size, 'low': low, 'high': high})
+        
+        cursor.execute('''
+            INSERT INTO rollup_state (name, last_id) VALUES ('measurements', ?)
+            ON CONFLICT (name) DO UPDATE SET last_id = excluded.last_id
+        ''', (high,))
+        return high - low
+    
+    def update_rollups(self) -> int:
+        """
+        Bring the rollups up to date with measurements written outside
+        save_measurements_batch, in chunks of MIGRATION_CHUNK_SIZE ids
+        
+        Returns:
+            Number of measurement ids aggregated
+        """
+        total = 0
+        while True:
+            with self._connection() as conn:
+                conn.execute('BEGIN IMMEDIATE')
+                advanced = self._update_rollups(conn.cursor(), self.MIGRATION_CHUNK_SIZE)
+            if not advanced:
+                return total
+            total += advanced
+    
+    def rebuild_rollups(self) -> int:
+        """
+        Recompute all rollups from the raw measurements (backfill)
+        
+        Rollups of measurements already removed by cleanup_old_data are lost.
+        
+        Returns:
+            Number of measurement ids aggregated
+        """
+        with self._connection() as conn:
+            conn.execute('DELETE FROM measurement_rollups')
+            conn.execute("DELETE FROM rollup_state WHERE name = 'measurements'")
+        
+        return self.update_rollups()
+    
+    def get_rollups(self, resolution: str = '1h', start=None, end=None,
+                    port: Optional[str] = None,
+                    sensor_ids: Optional[List[int]] = None) -> List[Dict]:
+        """
+        Get aggregated buckets from the rollup tables, oldest first
+        
+        Args:
+            resolution: Bucket size, one of ROLLUP_RESOLUTIONS ('1m', '1h', '1d')
+            start: Buckets starting at or after this time (datetime, epoch ms or ISO string)
+            end: Buckets starting before this time
+            port: Only this sensor port
+            sensor_ids: Only these sensor IDs
+        
+        Returns:
+            List of bucket dictionaries with count, <metric>_min/_max/_avg and
+            energy_first/energy_last/energy_delta
+        """
+        if resolution not in self.ROLLUP_RESOLUTIONS:
+            raise ValueError(f"Unknown rollup resolution: {resolution}")
+        
+        conditions = ['r.resolution = ?', 'r.bucket_ms >= ?']
+        params: List = [resolution, to_epoch_ms(start) or 0]
+        end_ms = to_epoch_ms(end)
+        if end_ms is not None:
+            conditions.append('r.bucket_ms < ?')
+            params.append(end_ms)
+        if port is not None:
+            conditions.append('r.sensor_id = (SELECT id FROM sensors WHERE port = ?)')
+            params.append(port)
+        if sensor_ids is not None:
+            if not sensor_ids:
+                return []
+            conditions.append(f"r.sensor_id IN ({', '.join('?' * len(sensor_ids))})")
+            params.extend(int(sensor_id) for sensor_id in sensor_ids)
+        
+        metric_columns = ', '.join(
+            f'r.{m}_min, r.{m}_max, r.{m}_sum / r.sample_count' for m in self.ROLLUP_METRICS
+        )
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(f'''
+                SELECT s.port, r.sensor_id, r.bucket_ms, r.sample_count, {metric_columns},
+                       r.energy_first, r.energy_last
+                FROM measurement_rollups r
+                JOIN sensors s ON r.sensor_id = s.id
+                WHERE {' AND '.join(conditions)}
+                ORDER BY r.bucket_ms, r.sensor_id
+            ''', params)
+            
+            results = []
+            for row in cursor.fetchall():
+                bucket = {
                     'port': row[0],
-                    'timestamp': row[1],
-                    'voltage': row[2] if row[2] is not None else 0.0,
-                    'current': row[3] if row[3] is not None else 0.0,
-                    'power': row[4] if row[4] is not None else 0.0,
-                    'energy': row[5] if row[5] is not None else 0.0,
-                    'frequency': row[6] if row[6] is not None else 0.0,
-                    'power_factor': row[7] if row[7] is not None else 0.0,
-                    'alarm_status': bool(row[8]) if row[8] is not None else False
+                    'sensor_id': row[1],
+                    'bucket_ms': row[2],
+                    'bucket_start': self._format_epoch_ms(row[2]),
+                    'count': row[3]
                 }
-                for row in results
-            ]
+                for i, metric in enumerate(self.ROLLUP_METRICS):
+                    values = row[4 + i * 3:7 + i * 3]
+                    bucket[f'{metric}_min'], bucket[f'{metric}_max'], bucket[f'{metric}_avg'] = values
+                energy_first, energy_last = row[-2:]
+                bucket['energy_first'] = energy_first
+                bucket['energy_last'] = energy_last
+                bucket['energy_delta'] = (
+                    energy_last - energy_first
+                    if energy_first is not None and energy_last is not None else None
+                )
+                results.append(bucket)
+            
+            return results
+    
+    # Metrics accepted by get_aggregates
+    AGGREGATE_METRICS = ROLLUP_METRICS + ('energy',)
+    
+    def get_aggregates(self, bucket_ms: int, start=None, end=None,
+                       port: Optional[str] = None,
+                       sensor_ids: Optional[List[int]] = None,
+                       metrics: Optional[List[str]] = None) -> Dict:
+        """
+        Get bucketed statistics per sensor, computed in SQL
+        
+        Buckets that are a multiple of a rollup resolution are merged from the
+        coarsest such rollup (e.g. 5m from 1m, 1d from 1d); smaller buckets are
+        aggregated from the raw measurements.
+        
+        Args:
+            bucket_ms: Bucket size in milliseconds (see bucket_to_ms)
+            start: Range start, inclusive (datetime, epoch ms or ISO string; None = open)
+            end: Range end, exclusive (None = open)
+            port: Only this sensor port
+            sensor_ids: Only these sensor IDs
+            metrics: Subset of AGGREGATE_METRICS (default: all)
+        
+        Returns:
+            Dictionary with 'source' ('1m', '1h', '1d' or 'raw') and 'series':
+            one entry per sensor with parallel arrays 'timestamps' (bucket
+            start, epoch ms), 'count', '<metric>_min'/'_max'/'_avg' and
+            'energy_first'/'energy_last'/'energy_delta'
+        """
+        metrics = list(metrics) if metrics else list(self.AGGREGATE_METRICS)
+        unknown = [m for m in metrics if m not in self.AGGREGATE_METRICS]
+        if unknown:
+            raise ValueError(f"Unknown metrics: {', '.join(unknown)}")
+        if bucket_ms <= 0:
+            raise ValueError("bucket_ms must be positive")
+        
+        # Coarsest rollup the bucket is a multiple of, else the raw measurements
+        source = 'raw'
+        for resolution, size in sorted(self.ROLLUP_RESOLUTIONS.items(), key=lambda item: item[1]):
+            if bucket_ms % size == 0:
+                source = resolution
+        
+        # Outer aggregates read the columns of the windowed subquery
+        if source == 'raw':
+            table = 'measurements t'
+            time_column = 't.timestamp_ms'
+            order = 't.timestamp_ms, t.id'
+            count = 'COUNT(*)'
+            energy_first, energy_last = 't.energy', 't.energy'
+            conditions = ['t.timestamp_ms >= :start']
+            aggregates = {
+                m: f'MIN({m}), MAX({m}), TOTAL({m}) / COUNT(*)' for m in self.ROLLUP_METRICS
+            }
+        else:
+            table = 'measurement_rollups t'
+            time_column = 't.bucket_ms'
+            order = 't.bucket_ms'
+            count = 'SUM(sample_count)'
+            energy_first, energy_last = 't.energy_first', 't.energy_last'
+            conditions = ['t.resolution = :resolution', 't.bucket_ms >= :start']
+            aggregates = {
+                m: f'MIN({m}_min), MAX({m}_max), SUM({m}_sum) / SUM(sample_count)'
+                for m in self.ROLLUP_METRICS
+            }
+        
+        params = {'resolution': source, 'bucket': bucket_ms, 'start': to_epoch_ms(start) or 0}
+        end_ms = to_epoch_ms(end)
+        if end_ms is not None:
+            conditions.append(f'{time_column} < :end')
+            params['end'] = end_ms
+        if port is not None:
+            conditions.append('t.sensor_id = (SELECT id FROM sensors WHERE port = :port)')
+            params['port'] = port
+        if sensor_ids is not None:
+            if not sensor_ids:
+                return {'source': source, 'series': []}
+            placeholders = []
+            for i, sensor_id in enumerate(sensor_ids):
+                params[f'sensor_{i}'] = int(sensor_id)
+                placeholders.append(f':sensor_{i}')
+            conditions.append(f"t.sensor_id IN ({', '.join(placeholders)})")
+        
+        select = [aggregates[m] for m in metrics if m != 'energy']
+        if 'energy' in metrics:
+            select.append('MAX(e_first), MAX(e_last)')
+        
+        sql = f'''
+                SELECT sensor_id, bucket, {', '.join([count] + select)}
+                FROM (
+                    SELECT t.*,
+                           {time_column} - {time_column} % :bucket AS bucket,
+                           FIRST_VALUE({energy_first}) OVER w AS e_first,
+                           LAST_VALUE({energy_last}) OVER w AS e_last
+                    FROM {table}
+                    WHERE {' AND '.join(conditions)}
+                    WINDOW w AS (
+                        PARTITION BY t.sensor_id, {time_column} - {time_column} % :bucket
+                        ORDER BY {order}
+                        ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING
+                    )
+                )
+                GROUP BY sensor_id, bucket
+                ORDER BY sensor_id, bucket
+        '''
+        
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('SELECT id, port FROM sensors')
+            ports = dict(cursor.fetchall())
+            
+            cursor.execute(sql, params)
+            
+            series: Dict[int, Dict] = {}
+            for row in cursor.fetchall():
+                sensor_id = row[0]
+                entry = series.get(sensor_id)
+                if entry is None:
+                    entry = {'port': ports.get(sensor_id), 'sensor_id': sensor_id,
+                             'timestamps': [], 'count': []}
+                    for metric in metrics:
+                        if metric == 'energy':
+                            entry.update(energy_first=[], energy_last=[], energy_delta=[])
+                        else:
+                            entry.update({f'{metric}_min': [], f'{metric}_max': [], f'{metric}_avg': []})
+                    series[sensor_id] = entry
+                
+                entry['timestamps'].append(row[1])
+                entry['count'].append(row[2])
+                values = iter(row[3:])
+                for metric in metrics:
+                    if metric == 'energy':
+                        first, last = next(values), next(values)
+                        entry['energy_first'].append(first)
+                        entry['energy_last'].append(last)
+                        entry['energy_delta'].append(
+                            last - first if first is not None and last is not None else None
+                        )
+                    else:
+                        for suffix in ('_min', '_max', '_avg'):
+                            entry[metric + suffix].append(next(values))
+            
+            return {'source': source, 'series': list(series.values())}
+    
+    def get_recent_stats(self, port: str, limit: int = 1000) -> Dict:
+        """
+        Get min/max/avg of the latest measurements of one sensor, computed in SQL
+        
+        Zero readings are ignored, as for a disconnected load.
+        
+        Args:
+            port: Sensor port
+            limit: Number of latest measurements to include
+        
+        Returns:
+            Dictionary with voltage/current/power min/max/avg, total_energy and
+            measurement_count
+        """
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                SELECT
+                    MIN(NULLIF(voltage, 0)), MAX(NULLIF(voltage, 0)), AVG(NULLIF(voltage, 0)),
+                    MIN(NULLIF(current, 0)), MAX(NULLIF(current, 0)), AVG(NULLIF(current, 0)),
+                    MIN(NULLIF(power, 0)), MAX(NULLIF(power, 0)), AVG(NULLIF(power, 0)),
+                    TOTAL(energy),
+                    COUNT(*)
+                FROM (
+                    SELECT voltage, current, power, energy
+                    FROM measurements
+                    WHERE sensor_id = (SELECT id FROM sensors WHERE port = ?)
+                    ORDER BY timestamp_ms DESC
+                    LIMIT ?
+                )
+            ''', (port, limit))
+            
+            row = cursor.fetchone()
+            
+            stats = {}
+            for i, metric in enumerate(('voltage', 'current', 'power')):
+                low, high, avg = row[i * 3:i * 3 + 3]
+                stats[metric] = {'min': low or 0, 'max': high or 0, 'avg': avg or 0}
+            stats['total_energy'] = row[9]
+            stats['measurement_count'] = row[10]
+            return stats
+    
+    def recreate_schema(self):
+        """
+        Drop every table (with its indexes and triggers) and create the
+        current schema again, then VACUUM the file back to its minimum size
+        
+        The database file itself is kept: connections held by other
+        processes (the logger's persistent writers) stay attached to the live
+        file instead of writing to a deleted inode. Sensor IDs those writers
+        cached are re-created by their flush_sensor_stats.
+        """
+        with self._connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            objects = conn.execute('''
+                SELECT type, name FROM sqlite_master
+                WHERE type IN ('table', 'view') AND name NOT LIKE 'sqlite_%'
+            ''').fetchall()
+            for object_type, name in objects:
+                conn.execute(f'DROP {object_type.upper()} IF EXISTS "{name}"')
+            # Migrations start from scratch on the empty schema
+            conn.execute('PRAGMA user_version = 0')
+        
+        self.invalidate_sensor_cache()
+        self._create_tables()
+        
+        with self._connection() as conn:
+            conn.execute('VACUUM')
     
     def cleanup_old_data(self, days_to_keep: int = 30) -> int:
         """
@@ -311,39 +1633,55 @@ class PZEMDatabase:
             
         Returns:
             Number of records deleted
+        
+        Rollups are kept, so long-range charts still cover the removed period.
         """
-        with sqlite3.connect(self.db_path) as conn:
+        cutoff_ms = int((time.time() - days_to_keep * 86400) * 1000)
+        
+        with self._connection() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
                 DELETE FROM measurements 
-                WHERE timestamp < datetime('now', '-{} days')
-            '''.format(days_to_keep))
+                WHERE timestamp_ms < ?
+            ''', (cutoff_ms,))
             
-            deleted_count = cursor.rowcount
-            conn.commit()
-            
-            return deleted_count
+            return cursor.rowcount
+    
+    @staticmethod
+    def _format_epoch_ms(value: Optional[int]) -> Optional[str]:
+        """Render epoch milliseconds as the local time text used by the timestamp column"""
+        if value is None:
+            return None
+        return datetime.fromtimestamp(value / 1000).strftime('%Y-%m-%d %H:%M:%S')
     
     def get_database_stats(self) -> Dict:
         """
         Get database statistics
         
+        Measurement count and time range are summed over sensor_counters
+        (one row per sensor) instead of counting the measurements table;
+        rollup progress is read from the rollup_state watermark. The cost
+        depends on the number of sensors only.
+        
         Returns:
             Dictionary with database statistics
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
             
-            # Get total measurements
-            cursor.execute('SELECT COUNT(*) FROM measurements')
-            total_measurements = cursor.fetchone()[0]
+            # Get total measurements and oldest/newest measurement time
+            cursor.execute('''
+                SELECT COALESCE(SUM(measurement_count), 0), MIN(first_ms), MAX(last_ms), MAX(last_id)
+                FROM sensor_counters
+            ''')
+            total_measurements, oldest_ms, newest_ms, newest_id = cursor.fetchone()
             
             # Get total sensors
             cursor.execute('SELECT COUNT(*) FROM sensors')
             total_sensors = cursor.fetchone()[0]
             
-            # Get database size from actual file size
+            # Get database size from actual file size (main file + WAL)
             try:
                 db_size = os.path.getsize(self.db_path)
             except OSError:
@@ -351,17 +1689,341 @@ class PZEMDatabase:
                 cursor.execute('SELECT page_count * page_size as size FROM pragma_page_count(), pragma_page_size()')
                 db_size = cursor.fetchone()[0]
             
-            # Get oldest and newest measurements
-            cursor.execute('''
-                SELECT MIN(timestamp), MAX(timestamp) FROM measurements
-            ''')
-            time_range = cursor.fetchone()
+            # In WAL mode recent commits live in the -wal file until a checkpoint
+            try:
+                wal_size = os.path.getsize(self.db_path + '-wal')
+            except OSError:
+                wal_size = 0
+            db_size += wal_size
+            
+            # Measurement ids not yet aggregated into the rollups
+            cursor.execute("SELECT last_id FROM rollup_state WHERE name = 'measurements'")
+            row = cursor.fetchone()
+            rollup_pending = max((newest_id or 0) - (row[0] if row else 0), 0)
+            
+            # Version actually recorded in the file (lower than SCHEMA_VERSION
+            # while a migration has not run or has failed)
+            schema_version = cursor.execute('PRAGMA user_version').fetchone()[0]
             
             return {
                 'total_measurements': total_measurements,
                 'total_sensors': total_sensors,
                 'database_size_bytes': db_size,
                 'database_size_mb': round(db_size / (1024 * 1024), 2),
-                'oldest_measurement': time_range[0],
-                'newest_measurement': time_range[1]
-            } 
\ No newline at end of file
+                'wal_size_bytes': wal_size,
+                'oldest_measurement': self._format_epoch_ms(oldest_ms),
+                'newest_measurement': self._format_epoch_ms(newest_ms),
+                'oldest_measurement_ms': oldest_ms,
+                'newest_measurement_ms': newest_ms,
+                'rollup_pending': rollup_pending,
+                'schema_version': schema_version
+            }
+
+class MeasurementWriter:
+    """
+    Write-behind queue for PZEMDatabase
+    
+    Producers (the serial polling loop) only append to a bounded in-memory
+    queue; a single background thread drains it with save_measurements_batch
+    whenever batch_size samples are waiting or flush_interval has elapsed.
+    When the queue is full the overflow policy decides what happens:
+    
+    - 'block':       put() waits for free space (optionally with a timeout)
+    - 'drop_oldest': the oldest queued sample is discarded
+    - 'spill':       the oldest queued samples are appended to a JSON-lines
+                     file on disk and re-ingested once the queue has drained
+    
+    The same policy applies when a failed flush puts its batch back at the
+    head of a queue that filled up in the meantime.
+    """
+    
+    OVERFLOW_POLICIES = ('block', 'drop_oldest', 'spill')
+    
+    def __init__(self, database: PZEMDatabase, max_queue: int = 10000, batch_size: int = 200,
+                 flush_interval: float = 2.0, overflow: str = 'drop_oldest',
+                 spill_path: Optional[str] = None,
+                 on_flush: Optional[Callable[[int], None]] = None):
+        """
+        Initialize the write-behind queue (call start() to launch the writer thread)
+        
+        Args:
+            database: Database the samples are written to
+            max_queue: Maximum number of samples held in memory
+            batch_size: Flush as soon as this many samples are queued
+            flush_interval: Flush at least this often (seconds) while samples are queued
+            overflow: Policy when the queue is full, one of OVERFLOW_POLICIES
+            spill_path: Spill file for the 'spill' policy (default: next to the database)
+            on_flush: Called from the writer thread with the number of samples
+                after every committed batch (e.g. MeasurementNotifier.notify)
+        """
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"overflow must be one of {', '.join(self.OVERFLOW_POLICIES)}")
+        
+        self.database = database
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.spill_path = spill_path or database.db_path + '.spill.jsonl'
+        self.on_flush = on_flush
+        
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._spill_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+        self._flush_requested = False
+        self._in_flight = 0
+        
+        # Statistics
+        self._enqueued = 0
+        self._written = 0
+        self._dropped = 0
+        self._spilled = 0
+        self._failed_flushes = 0
+        self._flush_count = 0
+        self._last_batch_size = 0
+        self._last_flush_latency = None
+        self._max_flush_latency = 0.0
+        self._total_flush_latency = 0.0
+    
+    def start(self):
+        """Start the background writer thread"""
+        with self._cond:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name="MeasurementWriter", daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout: Optional[float] = None):
+        """
+        Write everything still queued and stop the writer thread
+        
+        Args:
+            timeout: Maximum seconds to wait for the final flush
+        """
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+    
+    def put(self, sample: Dict, timeout: Optional[float] = None) -> bool:
+        """
+        Queue one measurement for writing
+        
+        Args:
+            sample: Sensor data dictionary (same format as save_measurement)
+            timeout: Maximum seconds to wait for space with the 'block' policy
+            
+        Returns:
+            True if the sample was queued or spilled, False if it was rejected
+        """
+        with self._cond:
+            if self.overflow == 'block' and len(self._queue) >= self.max_queue:
+                if not self._cond.wait_for(lambda: len(self._queue) < self.max_queue, timeout):
+                    self._dropped += 1
+                    return False
+            
+            self._queue.append(sample)
+            self._enqueued += 1
+            self._shed_overflow()
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+            return True
+    
+    def put_many(self, samples: List[Dict], timeout: Optional[float] = None) -> int:
+        """
+        Queue several measurements (e.g. one polling cycle)
+        
+        Returns:
+            Number of samples accepted
+        """
+        return sum(1 for sample in samples if self.put(sample, timeout))
+    
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Ask the writer to flush now and wait until the queue is empty
+        
+        With timeout=0 the flush is only requested (never blocks the caller).
+        
+        Returns:
+            True if everything queued so far has been handed to the database
+        """
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            return self._cond.wait_for(
+                lambda: not self._queue and self._in_flight == 0, timeout
+            )
+    
+    def get_stats(self) -> Dict:
+        """
+        Get queue depth and flush latency statistics
+        
+        Returns:
+            Dictionary with writer statistics (latencies in milliseconds)
+        """
+        with self._cond:
+            avg_latency = (self._total_flush_latency / self._flush_count) if self._flush_count else None
+            return {
+                'running': self._running,
+                'queue_depth': len(self._queue),
+                'max_queue': self.max_queue,
+                'overflow_policy': self.overflow,
+                'enqueued': self._enqueued,
+                'written': self._written,
+                'dropped': self._dropped,
+                'spilled': self._spilled,
+                'failed_flushes': self._failed_flushes,
+                'flush_count': self._flush_count,
+                'last_batch_size': self._last_batch_size,
+                'last_flush_latency_ms': round(self._last_flush_latency * 1000, 2) if self._last_flush_latency is not None else None,
+                'avg_flush_latency_ms': round(avg_latency * 1000, 2) if avg_latency is not None else None,
+                'max_flush_latency_ms': round(self._max_flush_latency * 1000, 2)
+            }
+    
+    def _shed_overflow(self):
+        """
+        Apply the overflow policy to the samples above max_queue, oldest
+        first (caller holds self._cond)
+        
+        'block' sheds nothing: producers wait in put() until the writer has
+        drained the queue below max_queue again.
+        """
+        excess = len(self._queue) - self.max_queue
+        if excess <= 0 or self.overflow == 'block':
+            return
+        oldest = [self._queue.popleft() for _ in range(excess)]
+        if self.overflow == 'drop_oldest':
+            self._dropped += excess
+        else:
+            self._spill(oldest)
+    
+    def _spill(self, samples: List[Dict]) -> bool:
+        """Append samples to the spill file"""
+        try:
+            with self._spill_lock:
+                with open(self.spill_path, 'a', encoding='utf-8') as spill_file:
+                    for sample in samples:
+                        record = dict(sample)
+                        record['timestamp'] = sample['timestamp'].isoformat()
+                        spill_file.write(json.dumps(record) + '\n')
+            self._spilled += len(samples)
+            return True
+        except Exception as e:
+            logging.error(f"Error spilling measurements to {self.spill_path}: {e}")
+            self._dropped += len(samples)
+            return False
+    
+    def _drain_spill(self):
+        """Re-ingest spilled samples once the in-memory queue is empty"""
+        draining_path = self.spill_path + '.draining'
+        with self._spill_lock:
+            if not os.path.exists(draining_path):
+                if not os.path.exists(self.spill_path):
+                    return
+                os.replace(self.spill_path, draining_path)
+        
+        with open(draining_path, 'r', encoding='utf-8') as spill_file:
+            samples = []
+            for line in spill_file:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                record['timestamp'] = datetime.fromisoformat(record['timestamp'])
+                samples.append(record)
+        
+        for i in range(0, len(samples), self.batch_size):
+            chunk = samples[i:i + self.batch_size]
+            if self.database.save_measurements_batch(chunk) != len(chunk):
+                # Keep the remainder on disk and try again after the next flush
+                with self._spill_lock:
+                    self._spilled -= len(samples) - i
+                self._spill(samples[i:])
+                break
+            with self._cond:
+                self._written += len(chunk)
+            self._notify_flush(len(chunk))
+        os.remove(draining_path)
+    
+    def _notify_flush(self, count: int):
+        """Run the on_flush callback; its errors never stop the writer"""
+        if self.on_flush is None or not count:
+            return
+        try:
+            self.on_flush(count)
+        except Exception as e:
+            logging.error(f"Error in measurement writer flush callback: {e}")
+    
+    def _run(self):
+        """Writer thread: drain the queue in batches until stopped"""
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            with self._cond:
+                while (self._running and not self._flush_requested
+                       and len(self._queue) < self.batch_size):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        if self._queue:
+                            break
+                        # Idle: restart the timer so the next sample waits at most one interval
+                        deadline = time.monotonic() + self.flush_interval
+                        remaining = self.flush_interval
+                    self._cond.wait(remaining)
+                
+                if not self._running and not self._queue:
+                    self._cond.notify_all()
+                    break
+                
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                self._in_flight = len(batch)
+                if not self._queue:
+                    self._flush_requested = False
+            
+            started = time.monotonic()
+            saved = self.database.save_measurements_batch(batch) if batch else 0
+            latency = time.monotonic() - started
+            
+            with self._cond:
+                if saved == len(batch):
+                    if batch:
+                        self._written += saved
+                        self._flush_count += 1
+                        self._last_batch_size = saved
+                        self._last_flush_latency = latency
+                        self._max_flush_latency = max(self._max_flush_latency, latency)
+                        self._total_flush_latency += latency
+                else:
+                    # Database busy or failing: put the batch back and retry later
+                    self._failed_flushes += 1
+                    self._queue.extendleft(reversed(batch))
+                    self._shed_overflow()
+                self._in_flight = 0
+                self._cond.notify_all()
+            
+            if saved == len(batch):
+                self._notify_flush(saved)
+            else:
+                if not self._running:
+                    with self._cond:
+                        unsaved = list(self._queue)
+                        if self.overflow == 'spill' and unsaved and self._spill(unsaved):
+                            # Re-ingested by the next writer on this database
+                            self._queue.clear()
+                            unsaved = []
+                        self._cond.notify_all()
+                    if unsaved:
+                        logging.error(f"Measurement writer stopped with {len(unsaved)} unsaved samples")
+                    break
+                time.sleep(self.flush_interval)
+            
+            if self.overflow == 'spill' and not self._queue:
+                try:
+                    self._drain_spill()
+                except Exception as e:
+                    logging.error(f"Error re-ingesting spilled measurements: {e}")
+            
+            deadline = time.monotonic() + self.flush_interval
@@ -0,0 +1,208 @@
+"""
+Downsampling helpers for PZEM-004T chart data
+Reduce time series to a bounded number of points while keeping their visual shape
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+
+def lttb_indices(xs: Sequence[float], ys: Sequence[float], threshold: int) -> List[int]:
+    """
+    Select points with Largest-Triangle-Three-Buckets
+    
+    The first and last points are always kept; every bucket in between
+    contributes the point forming the largest triangle with the previously
+    selected point and the average of the next bucket.
+    
+    Args:
+        xs: X values (e.g. epoch milliseconds), ascending
+        ys: Y values
+        threshold: Number of points to keep
+    
+    Returns:
+        Ascending list of selected indices
+    """
+    n = len(xs)
+    if threshold >= n:
+        return list(range(n))
+    if threshold <= 2:
+        return [0, n - 1][:max(threshold, 0)]
+    
+    selected = [0]
+    bucket_size = (n - 2) / (threshold - 2)
+    a = 0
+    
+    for i in range(threshold - 2):
+        # Average point of the next bucket
+        next_start = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        count = next_end - next_start
+        avg_x = sum(xs[next_start:next_end]) / count
+        avg_y = sum(ys[next_start:next_end]) / count
+        
+        # Point of the current bucket with the largest triangle area
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        ax, ay = xs[a], ys[a]
+        max_area = -1.0
+        chosen = start
+        for j in range(start, end):
+            area = abs((ax - avg_x) * (ys[j] - ay) - (ax - xs[j]) * (avg_y - ay))
+            if area > max_area:
+                max_area = area
+                chosen = j
+        
+        selected.append(chosen)
+        a = chosen
+    
+    selected.append(n - 1)
+    return selected
+
+def minmax_indices(ys: Sequence[float], threshold: int) -> List[int]:
+    """
+    Select the minimum and maximum of each of threshold / 2 equal buckets
+    
+    Keeps every spike and dip, at the cost of a less faithful line shape
+    than LTTB.
+    
+    Args:
+        ys: Y values, in time order
+        threshold: Number of points to keep (at most)
+    
+    Returns:
+        Ascending list of selected indices
+    """
+    n = len(ys)
+    if threshold >= n:
+        return list(range(n))
+    
+    buckets = max(threshold // 2, 1)
+    bucket_size = n / buckets
+    selected = []
+    for i in range(buckets):
+        start = int(i * bucket_size)
+        end = int((i + 1) * bucket_size)
+        if start >= end:
+            continue
+        low = min(range(start, end), key=ys.__getitem__)
+        high = max(range(start, end), key=ys.__getitem__)
+        selected.extend(sorted({low, high}))
+    return selected
+
+def downsample_records(records: List[Dict], max_points: int, value_key: str = 'power',
+                       method: str = 'lttb') -> List[Dict]:
+    """
+    Downsample measurement dictionaries to at most max_points per sensor port
+    
+    Args:
+        records: Measurement dictionaries with 'port', 'timestamp_ms' and value_key,
+            in any time order (e.g. newest first, several ports interleaved)
+        max_points: Maximum number of points kept for each port
+        value_key: Field the shape is computed on
+        method: 'lttb' or 'minmax'
+    
+    Returns:
+        The selected records, in their original order
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unknown downsampling method: {method}")
+    
+    by_port: Dict[str, List[int]] = {}
+    for index, record in enumerate(records):
+        by_port.setdefault(record.get('port'), []).append(index)
+    
+    if all(len(indices) <= max_points for indices in by_port.values()):
+        return records
+    
+    keep = set()
+    for indices in by_port.values():
+        if len(indices) <= max_points:
+            keep.update(indices)
+            continue
+        
+        indices.sort(key=lambda i: records[i]['timestamp_ms'])
+        ys = [records[i].get(value_key) or 0.0 for i in indices]
+        if method == 'lttb':
+            xs = [records[i]['timestamp_ms'] for i in indices]
+            chosen = lttb_indices(xs, ys, max_points)
+        else:
+            chosen = minmax_indices(ys, max_points)
+        keep.update(indices[i] for i in chosen)
+    
+    return [record for index, record in enumerate(records) if index in keep]
+
+# Fields a chart point carries (the dashboard table reads the paginated endpoint)
+CHART_COLUMNS = ['port', 'timestamp', 'timestamp_ms', 'voltage', 'current', 'power', 'energy']
+
+# Raw measurements per sensor streamed for one chart; larger ranges are
+# aggregated in SQL from the rollup tables instead
+CHART_MAX_RAW_ROWS = 20000
+
+# Rollup buckets per chart point fed to the downsampler, so it still has
+# shape to choose from
+CHART_ROLLUP_OVERSAMPLING = 4
+
+def load_chart_rows(database, start, end, port: Optional[str], max_points: int,
+                    method: str = 'lttb') -> Tuple[List[Dict], int]:
+    """
+    Chart points for a time range, downsampled to at most max_points per sensor
+    
+    The hourly rollups of the range tell how many measurements each sensor
+    has and where its data actually starts and ends. Up to
+    CHART_MAX_RAW_ROWS per sensor, CHART_COLUMNS of the raw measurements are
+    streamed into the downsampler. Beyond that the rollups are merged in SQL
+    (get_aggregates) into whole-minute buckets sized to the data's own span,
+    about CHART_ROLLUP_OVERSAMPLING per point, and those bucket averages are
+    downsampled; the raw rows are never loaded and the chart still gets
+    close to max_points points.
+    
+    Args:
+        database: PZEMDatabase
+        start: Range start, inclusive (datetime, epoch ms or ISO string)
+        end: Range end, exclusive
+        port: Only this sensor port
+        max_points: Maximum number of points per sensor
+        method: 'lttb' or 'minmax'
+    
+    Returns:
+        (rows newest first, number of measurements they represent)
+    """
+    hourly = database.get_rollups('1h', start, end, port=port)
+    
+    counts: Dict[str, int] = {}
+    spans: Dict[str, List[int]] = {}
+    for bucket in hourly:
+        counts[bucket['port']] = counts.get(bucket['port'], 0) + bucket['count']
+        span = spans.setdefault(bucket['port'], [bucket['bucket_ms'], bucket['bucket_ms']])
+        span[1] = bucket['bucket_ms']
+    
+    if all(count <= max(CHART_MAX_RAW_ROWS, max_points) for count in counts.values()):
+        # Measurements not rolled up yet are not counted above; the
+        # downsampler still bounds them
+        rows = list(database.iter_measurements_range(start, end, port=port, columns=CHART_COLUMNS))
+        return downsample_records(rows, max_points, method=method), len(rows)
+    
+    minute_ms = database.ROLLUP_RESOLUTIONS['1m']
+    hour_ms = database.ROLLUP_RESOLUTIONS['1h']
+    span_ms = max(last - first + hour_ms for first, last in spans.values())
+    minutes = -(-span_ms // (max_points * CHART_ROLLUP_OVERSAMPLING * minute_ms))
+    aggregates = database.get_aggregates(max(minutes, 1) * minute_ms, start, end, port=port,
+                                         metrics=['voltage', 'current', 'power', 'energy'])
+    
+    rows = []
+    for series in aggregates['series']:
+        for i, timestamp_ms in enumerate(series['timestamps']):
+            rows.append({
+                'port': series['port'],
+                'timestamp': datetime.fromtimestamp(timestamp_ms / 1000).strftime('%Y-%m-%d %H:%M:%S'),
+                'timestamp_ms': timestamp_ms,
+                'voltage': series['voltage_avg'][i],
+                'current': series['current_avg'][i],
+                'power': series['power_avg'][i],
+                'energy': series['energy_last'][i],
+                'count': series['count'][i]
+            })
+    rows.sort(key=lambda row: row['timestamp_ms'], reverse=True)
+    return downsample_records(rows, max_points, method=method), sum(counts.values())
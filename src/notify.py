@@ -0,0 +1,202 @@
+"""
+Change notifications from the PZEM-004T logger to the web server
+The logger sends a tiny datagram on a Unix domain socket after every committed
+batch, so the web server can push new measurements right away instead of
+polling SQLite. PRAGMA data_version covers writers that do not notify.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import socket
+import sqlite3
+import stat
+import time
+from typing import Optional
+
+# Overrides the socket path derived from the database path
+NOTIFY_SOCKET_ENV = 'PZEM_NOTIFY_SOCKET'
+
+def notify_socket_path(db_path: str) -> str:
+    """
+    Socket path shared by the logger and the web server for one database
+    
+    Both processes derive it from the absolute database path (or read
+    $PZEM_NOTIFY_SOCKET), so no extra configuration is needed.
+    """
+    return os.environ.get(NOTIFY_SOCKET_ENV) or os.path.abspath(db_path) + '.notify'
+
+class MeasurementNotifier:
+    """
+    Sending side (logger): fire-and-forget datagrams
+    
+    notify() never blocks and never raises: when the web server is not
+    running, or its receive buffer is full, the notification is simply lost
+    and the web server falls back to PRAGMA data_version.
+    """
+    
+    def __init__(self, path: str):
+        """
+        Args:
+            path: Socket path, see notify_socket_path
+        """
+        self.path = path
+        self.sent = 0
+        self.failed = 0
+        self._sock = None
+        if hasattr(socket, 'AF_UNIX'):
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._sock.setblocking(False)
+    
+    def notify(self, count: int = 1) -> bool:
+        """
+        Announce that count measurements were committed
+        
+        Returns:
+            True if the datagram was delivered to a listener
+        """
+        if self._sock is None:
+            return False
+        message = json.dumps({'type': 'measurements', 'count': count, 'time': time.time()})
+        try:
+            self._sock.sendto(message.encode(), self.path)
+            self.sent += 1
+            return True
+        except OSError:
+            # No listener bound (FileNotFoundError / ConnectionRefusedError) or buffer full
+            self.failed += 1
+            return False
+    
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+class ChangeListener:
+    """
+    Receiving side (web server): wake up on logger notifications
+    
+    wait() returns as soon as a datagram arrives; data_version_changed()
+    reports commits made by any other connection (other tools, the web
+    server's own writes, a logger without notifier) without reading a table.
+    """
+    
+    def __init__(self, db_path: str, socket_path: Optional[str] = None):
+        """
+        Args:
+            db_path: Database file watched with PRAGMA data_version
+            socket_path: Socket to bind (default: notify_socket_path(db_path))
+        """
+        self.db_path = db_path
+        self.socket_path = socket_path or notify_socket_path(db_path)
+        self.received = 0
+        self._sock = None
+        self._loop = None
+        self._event: Optional[asyncio.Event] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._inode = None
+        self._data_version = None
+    
+    def start(self) -> bool:
+        """
+        Bind the notification socket on the running event loop
+        
+        Returns:
+            True if notifications can be received, False if only
+            data_version polling is available
+        """
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+        if not hasattr(socket, 'AF_UNIX'):
+            return False
+        try:
+            # Remove a socket left behind by a previous run
+            if stat.S_ISSOCK(os.stat(self.socket_path).st_mode):
+                os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            sock.bind(self.socket_path)
+            self._loop.add_reader(sock.fileno(), self._on_readable)
+            self._sock = sock
+            return True
+        except (OSError, NotImplementedError) as e:
+            logging.warning(f"Measurement notifications disabled ({self.socket_path}): {e}")
+            return False
+    
+    @property
+    def listening(self) -> bool:
+        return self._sock is not None
+    
+    def _on_readable(self):
+        """Drain every pending datagram and wake up wait()"""
+        while True:
+            try:
+                self._sock.recv(4096)
+            except OSError:
+                # BlockingIOError: nothing left to read
+                break
+            self.received += 1
+        self._event.set()
+    
+    async def wait(self, timeout: float) -> bool:
+        """
+        Wait for a notification
+        
+        Args:
+            timeout: Maximum seconds to wait
+        
+        Returns:
+            True if a notification arrived, False on timeout
+        """
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        notified = self._event.is_set()
+        self._event.clear()
+        return notified
+    
+    def data_version_changed(self) -> bool:
+        """
+        Check whether another connection committed since the last call
+        (blocking; call it from a worker thread)
+        
+        Returns:
+            True on the first call, after a change, or if the check failed
+        """
+        try:
+            # A recreated database file (deep reset) needs a new connection
+            inode = os.stat(self.db_path).st_ino
+            if self._conn is not None and inode != self._inode:
+                self._conn.close()
+                self._conn = None
+            if self._conn is None:
+                self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+                self._inode = inode
+                self._data_version = None
+            version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+        except (OSError, sqlite3.Error):
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = None
+            return True
+        changed = version != self._data_version
+        self._data_version = version
+        return changed
+    
+    def close(self):
+        if self._sock is not None:
+            self._loop.remove_reader(self._sock.fileno())
+            self._sock.close()
+            self._sock = None
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
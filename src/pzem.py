@@ -2,11 +2,87 @@ import serial
 import time
 import struct
 import logging
+import functools
+import threading
 from typing import Optional, Dict, Any, Tuple
 
+try:
+    # Only worth it with crcmod's C extension; its pure Python path is no faster than the table
+    import crcmod._crcfunext  # type: ignore
+    import crcmod.predefined  # type: ignore
+    _crc16_ext = crcmod.predefined.mkPredefinedCrcFun('modbus')
+except Exception:
+    _crc16_ext = None  # Table-driven implementation below
+
+try:
+    import termios
+    # tcflush()/tcsetattr() on an unplugged adapter raise termios.error, not OSError
+    SERIAL_ERRORS: Tuple[type, ...] = (serial.SerialException, OSError, termios.error)
+except ImportError:
+    SERIAL_ERRORS = (serial.SerialException, OSError)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+def _make_crc16_table() -> Tuple[int, ...]:
+    """CRC of every possible byte value for the reflected Modbus polynomial 0xA001"""
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 0x0001 else crc >> 1
+        table.append(crc)
+    return tuple(table)
+
+_CRC16_TABLE = _make_crc16_table()
+
+def _crc16_table(data: bytes) -> int:
+    """Table-driven CRC16: one lookup per byte instead of eight shift/xor steps"""
+    crc = 0xFFFF
+    table = _CRC16_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+def crc16_modbus(data: bytes) -> int:
+    """
+    Modbus-RTU CRC16 of data (initial value 0xFFFF, polynomial 0xA001)
+    
+    Uses crcmod's C implementation when it is installed, the lookup table
+    otherwise.
+    
+    Args:
+        data (bytes): Data to calculate CRC for
+        
+    Returns:
+        int: CRC value; a frame followed by its own CRC gives 0
+    """
+    if _crc16_ext is not None:
+        return _crc16_ext(data)
+    return _crc16_table(data)
+
+# Precompiled layouts of the Modbus-RTU frames
+_CRC = struct.Struct('<H')                      # CRC, low byte first
+_REQUEST = struct.Struct('>BBHH')               # addr + func + register + count/value
+_SHORT_REQUEST = struct.Struct('>BB')           # addr + func (reset energy)
+_REGISTER = struct.Struct('>H')                 # one register value
+_MEASUREMENT_REGISTERS = struct.Struct('>10H')  # voltage .. alarm status
+
+@functools.lru_cache(maxsize=256)
+def _request_frame(address: int, function_code: int, register: int = 0, value: int = 0,
+                   short: bool = False) -> bytes:
+    """
+    Complete request frame including CRC
+    
+    Requests only depend on their arguments, so the frame polled every cycle
+    is built once per device address and then reused.
+    """
+    if short:
+        packet = _SHORT_REQUEST.pack(address, function_code)
+    else:
+        packet = _REQUEST.pack(address, function_code, register, value)
+    return packet + _CRC.pack(crc16_modbus(packet))
+
 class PZEM004T:
     """
     Python library for the PZEM-004T AC Power and Energy meter.
@@ -164,15 +240,7 @@ class PZEM004T:
         Returns:
             bytes: 2-byte CRC (little-endian)
         """
-        crc = 0xFFFF
-        for byte in data:
-            crc ^= byte
-            for _ in range(8):
-                if crc & 0x0001:
-                    crc = (crc >> 1) ^ 0xA001
-                else:
-                    crc >>= 1
-        return struct.pack('<H', crc)
+        return _CRC.pack(crc16_modbus(data))
     
     def _validate_crc(self, data: bytes) -> bool:
         """
@@ -187,11 +255,8 @@ class PZEM004T:
         if len(data) < 2:
             return False
         
-        packet_data = data[:-2]
-        received_crc = data[-2:]
-        calculated_crc = self._crc16(packet_data)
-        
-        return received_crc == calculated_crc
+        # The CRC over data plus its (little-endian) CRC is zero: no slicing needed
+        return crc16_modbus(data) == 0
     
     def _send_command(self, function_code: int, register: int = 0, 
                      value: int = 0, register_count: int = 0) -> Optional[bytes]:
@@ -211,26 +276,23 @@ class PZEM004T:
             logging.error("Serial connection not available")
             return None
         
-        # Build command packet
+        # Build command packet (with CRC, cached per address and arguments)
         if function_code in [self.READ_HOLDING_REGISTERS, self.READ_INPUT_REGISTERS]:
             # Read command: addr + func + reg_high + reg_low + count_high + count_low + crc
-            packet = struct.pack('>BBHH', self.address, function_code, register, register_count)
+            packet = _request_frame(self.address, function_code, register, register_count)
         elif function_code == self.WRITE_SINGLE_REGISTER:
             # Write command: addr + func + reg_high + reg_low + val_high + val_low + crc
-            packet = struct.pack('>BBHH', self.address, function_code, register, value)
+            packet = _request_frame(self.address, function_code, register, value)
         elif function_code == self.RESET_ENERGY:
             # Reset command: addr + func + crc (4 bytes total)
-            packet = struct.pack('>BB', self.address, function_code)
+            packet = _request_frame(self.address, function_code, short=True)
         elif function_code == self.CALIBRATION:
             # Calibration command: addr + func + password_high + password_low + crc
-            packet = struct.pack('>BBHH', self.address, function_code, 0x37, 0x21)
+            packet = _request_frame(self.address, function_code, 0x37, 0x21)
         else:
             logging.error(f"Unsupported function code: {function_code}")
             return None
         
-        # Add CRC
-        packet += self._crc16(packet)
-        
         # Clear input buffer and send command
         self.serial.flushInput()
         self.serial.write(packet)
@@ -297,6 +359,26 @@ class PZEM004T:
         if current_time - self._last_update < self._update_interval:
             return self._measurements.copy()
         
+        measurements = self.poll_measurements()
+        
+        if measurements is None:
+            logging.error("Failed to read measurements")
+            return self._measurements.copy()
+        
+        self._measurements.update(measurements)
+        self._last_update = current_time
+        return self._measurements.copy()
+    
+    def poll_measurements(self) -> Optional[Dict[str, Any]]:
+        """
+        Read all measurement values from the device, bypassing the cache.
+        
+        Unlike read_measurements(), a failed read is reported instead of
+        returning the previous values.
+        
+        Returns:
+            dict or None: Measurement values, None if the device did not answer correctly
+        """
         response = self._send_command(
             self.READ_INPUT_REGISTERS, 
             self.REG_VOLTAGE, 
@@ -304,25 +386,35 @@ class PZEM004T:
         )
         
         if not response or len(response) < 25:
-            logging.error("Failed to read measurements")
-            return self._measurements.copy()
+            return None
         
-        # Parse response data (20 bytes of measurement data)
-        data = response[3:23]
-        values = struct.unpack('>HHHHHHHHHH', data)
+        return self.decode_measurements(response)
+    
+    @classmethod
+    def decode_measurements(cls, response: bytes) -> Dict[str, Any]:
+        """
+        Decode a read-input-registers response (registers 0x0000-0x0009).
         
-        # Convert raw values to physical units
-        self._measurements['voltage'] = values[0] * self.VOLTAGE_RESOLUTION
-        self._measurements['current'] = (values[1] + (values[2] << 16)) * self.CURRENT_RESOLUTION
-        self._measurements['power'] = (values[3] + (values[4] << 16)) * self.POWER_RESOLUTION
-        # Energy: raw value is in Wh, convert to kWh by dividing by 1000
-        self._measurements['energy'] = (values[5] + (values[6] << 16)) / 1000.0
-        self._measurements['frequency'] = values[7] * self.FREQUENCY_RESOLUTION
-        self._measurements['power_factor'] = values[8] * self.PF_RESOLUTION
-        self._measurements['alarm_status'] = values[9] != 0x0000
+        Args:
+            response (bytes): Complete response frame (3-byte header, 20 data bytes, CRC)
+            
+        Returns:
+            dict: Measurement values in physical units
+        """
+        # Parse response data (20 bytes of measurement data after the 3-byte header)
+        values = _MEASUREMENT_REGISTERS.unpack_from(response, 3)
         
-        self._last_update = current_time
-        return self._measurements.copy()
+        # Convert raw values to physical units
+        return {
+            'voltage': values[0] * cls.VOLTAGE_RESOLUTION,
+            'current': (values[1] + (values[2] << 16)) * cls.CURRENT_RESOLUTION,
+            'power': (values[3] + (values[4] << 16)) * cls.POWER_RESOLUTION,
+            # Energy: raw value is in Wh, convert to kWh by dividing by 1000
+            'energy': (values[5] + (values[6] << 16)) / 1000.0,
+            'frequency': values[7] * cls.FREQUENCY_RESOLUTION,
+            'power_factor': values[8] * cls.PF_RESOLUTION,
+            'alarm_status': values[9] != 0x0000
+        }
     
     def get_voltage(self) -> float:
         """Get voltage in Volts."""
@@ -396,7 +488,7 @@ class PZEM004T:
         if not response or len(response) < 7:
             return None
         
-        value = struct.unpack('>H', response[3:5])[0]
+        value = _REGISTER.unpack_from(response, 3)[0]
         return value
     
     def set_address(self, new_address: int) -> bool:
@@ -444,7 +536,7 @@ class PZEM004T:
         if not response or len(response) < 7:
             return None
         
-        value = struct.unpack('>H', response[3:5])[0]
+        value = _REGISTER.unpack_from(response, 3)[0]
         return value
     
         """
@@ -515,8 +607,7 @@ class PZEM004T:
             
             # Build reset command - simple format like PZEM004Tv30.py
             # [addr, 0x42] + CRC
-            packet = struct.pack('>BB', self.address, self.RESET_ENERGY)
-            packet += self._crc16(packet)
+            packet = _request_frame(self.address, self.RESET_ENERGY, short=True)
             
             logging.debug(f"Reset energy command: {packet.hex()}")
             
@@ -673,6 +764,377 @@ class PZEM004T:
             logging.info("Serial connection closed")
 
 
+class PZEMBus:
+    """
+    Several PZEM-004T meters sharing one RS-485 bus (multi-drop).
+    
+    Every meter on the bus needs its own Modbus address (1-247), set once
+    with PZEM004T.set_address() while it is the only meter connected. The bus
+    owns the single serial handle and polls the addresses round-robin, one
+    request at a time, keeping the Modbus-RTU silent interval of 3.5
+    character times between frames. A meter that does not answer only costs
+    its timeout; the other meters are still polled.
+    
+    Not used by the logger: the database keys sensors on the port alone
+    (sensors.port is UNIQUE), so meters sharing a bus cannot be stored apart yet.
+    
+    Example:
+        with PZEMBus('/dev/ttyUSB0', range(1, 31)) as bus:
+            for address, measurements in bus.poll().items():
+                print(address, measurements)
+    """
+    
+    MIN_ADDRESS = 1
+    MAX_ADDRESS = 247
+    
+    # Modbus-RTU characters are 11 bits long on the wire (start, 8 data, parity/stop)
+    BITS_PER_CHAR = 11
+    # Fixed silent interval recommended by the Modbus spec above 19200 baud
+    MIN_FRAME_GAP = 0.00175
+    
+    MEASUREMENT_REGISTERS = 10
+    
+    def __init__(self, port: str, addresses, timeout: float = 0.3, retries: int = 1):
+        """
+        Open the bus.
+        
+        Args:
+            port (str): Serial port of the RS-485 adapter (e.g., '/dev/ttyUSB0')
+            addresses: Modbus addresses of the meters (1-247), polled in this order.
+                       0xF8 is accepted only as the single address of a one-meter bus.
+            timeout (float): Seconds to wait for each response
+            retries (int): Extra attempts for a meter that did not answer correctly
+        """
+        addresses = list(dict.fromkeys(addresses))
+        if not addresses:
+            raise ValueError("At least one address is required")
+        for address in addresses:
+            single_device = address == PZEM004T.DEFAULT_ADDRESS and len(addresses) == 1
+            if not (single_device or self.MIN_ADDRESS <= address <= self.MAX_ADDRESS):
+                raise ValueError(f"Bus addresses must be between {self.MIN_ADDRESS} and {self.MAX_ADDRESS}, got {address}")
+        
+        self.port = port
+        self.addresses = addresses
+        self.timeout = timeout
+        self.retries = retries
+        self.frame_gap = max(3.5 * self.BITS_PER_CHAR / PZEM004T.BAUD_RATE, self.MIN_FRAME_GAP)
+        self.serial = None
+        self._last_frame_end = 0.0
+        self._stats = {
+            address: {'ok': 0, 'errors': 0, 'consecutive_errors': 0, 'last_ok': None}
+            for address in addresses
+        }
+        self._connect()
+    
+    def _connect(self):
+        """Establish serial connection."""
+        try:
+            self.serial = serial.Serial(
+                port=self.port,
+                baudrate=PZEM004T.BAUD_RATE,
+                bytesize=PZEM004T.DATA_BITS,
+                parity=PZEM004T.PARITY,
+                stopbits=PZEM004T.STOP_BITS,
+                timeout=self.timeout
+            )
+            logging.info(f"Connected to PZEM bus on {self.port} ({len(self.addresses)} addresses)")
+        except serial.SerialException as e:
+            logging.error(f"Failed to connect to {self.port}: {e}")
+            raise
+    
+    def _wait_for_silence(self):
+        """Sleep until the inter-frame gap since the last frame on the bus has passed."""
+        remaining = self._last_frame_end + self.frame_gap - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
+    
+    def _transact(self, address: int, function_code: int, register: int, count: int) -> Optional[bytes]:
+        """
+        Send one read request and return the validated response.
+        
+        Serial port errors (adapter unplugged) are raised to the caller;
+        timeouts, CRC errors, replies from another address and Modbus
+        exception responses return None.
+        """
+        self._wait_for_silence()
+        try:
+            self.serial.reset_input_buffer()
+            self.serial.write(_request_frame(address, function_code, register, count))
+            
+            # addr + func + byte count (or exception code)
+            response = self.serial.read(3)
+            if len(response) == 3:
+                # Exception responses carry no data, only the CRC
+                data_length = 0 if response[1] & 0x80 else response[2]
+                response += self.serial.read(data_length + 2)
+        finally:
+            self._last_frame_end = time.monotonic()
+        
+        if len(response) < 5:
+            logging.debug(f"No response from address {address} on {self.port}")
+            return None
+        if crc16_modbus(response) != 0:
+            logging.debug(f"Invalid CRC in response from address {address} on {self.port}")
+            return None
+        if response[0] != address or (response[1] & 0x7F) != function_code:
+            logging.debug(f"Unexpected frame on {self.port} while polling address {address}: {response.hex()}")
+            return None
+        if response[1] & 0x80:
+            logging.error(f"Modbus error {response[2]} from address {address} on {self.port}")
+            return None
+        return response
+    
+    def read_measurements(self, address: int) -> Optional[Dict[str, Any]]:
+        """
+        Read all measurement values of one meter on the bus.
+        
+        Args:
+            address (int): Modbus address of the meter
+            
+        Returns:
+            dict or None: Same keys as PZEM004T.read_measurements, None if the
+            meter did not answer correctly
+        """
+        stats = self._stats.setdefault(address, {'ok': 0, 'errors': 0, 'consecutive_errors': 0, 'last_ok': None})
+        for _ in range(self.retries + 1):
+            response = self._transact(address, PZEM004T.READ_INPUT_REGISTERS,
+                                      PZEM004T.REG_VOLTAGE, self.MEASUREMENT_REGISTERS)
+            if response is not None and len(response) == 5 + 2 * self.MEASUREMENT_REGISTERS:
+                stats['ok'] += 1
+                stats['consecutive_errors'] = 0
+                stats['last_ok'] = time.time()
+                return PZEM004T.decode_measurements(response)
+        
+        stats['errors'] += 1
+        stats['consecutive_errors'] += 1
+        return None
+    
+    def poll(self) -> Dict[int, Optional[Dict[str, Any]]]:
+        """
+        Read every meter on the bus once, in address list order.
+        
+        Returns:
+            dict: Address -> measurements (None for meters that did not answer)
+        """
+        return {address: self.read_measurements(address) for address in self.addresses}
+    
+    def get_stats(self) -> Dict[int, Dict[str, Any]]:
+        """
+        Per-address counters: successful reads, failed reads, consecutive
+        failures and time of the last successful read.
+        """
+        return {address: dict(stats) for address, stats in self._stats.items()}
+    
+    def close(self):
+        """Close serial connection."""
+        if self.serial and self.serial.is_open:
+            self.serial.close()
+            logging.info("Serial connection closed")
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class PZEMSession:
+    """
+    Long-lived connection to one PZEM-004T, reopened transparently.
+    
+    The serial port stays open across polling cycles instead of being opened,
+    configured and flushed for every read. A serial port error (adapter
+    unplugged or re-enumerated) closes the port; it is reopened on a later
+    read, with exponential backoff while it keeps failing. After
+    max_failures consecutive reads without a valid answer the port is
+    reopened as well, in case the adapter is stuck.
+    """
+    
+    def __init__(self, port: str, address: int = PZEM004T.DEFAULT_ADDRESS, timeout: float = 2.0,
+                 max_failures: int = 3, reconnect_delay: float = 1.0, max_reconnect_delay: float = 60.0):
+        """
+        Args:
+            port (str): Serial port (e.g., '/dev/ttyUSB0')
+            address (int): Device address
+            timeout (float): Serial timeout in seconds
+            max_failures (int): Consecutive failed reads before the port is reopened
+            reconnect_delay (float): First wait before reopening a failed port (seconds)
+            max_reconnect_delay (float): Upper bound of the exponential backoff (seconds)
+        """
+        self.port = port
+        self.address = address
+        self.timeout = timeout
+        self.max_failures = max_failures
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.device: Optional[PZEM004T] = None
+        self.consecutive_failures = 0
+        self.reads = 0
+        self.failures = 0
+        self.connects = 0
+        self.last_ok: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._backoff = reconnect_delay
+        self._next_connect = 0.0
+        self._lock = threading.Lock()
+    
+    @property
+    def connected(self) -> bool:
+        return self.device is not None and bool(self.device.serial) and self.device.serial.is_open
+    
+    @property
+    def healthy(self) -> bool:
+        """Connected and the last reads were answered"""
+        return self.connected and self.consecutive_failures == 0
+    
+    def _open(self) -> bool:
+        """Open the port unless still backing off after a failure."""
+        if time.monotonic() < self._next_connect:
+            return False
+        try:
+            self.device = PZEM004T(port=self.port, address=self.address, timeout=self.timeout)
+        except SERIAL_ERRORS as e:
+            self._disconnect(e)
+            return False
+        self.connects += 1
+        self._backoff = self.reconnect_delay
+        return True
+    
+    def _disconnect(self, error: Optional[Exception] = None):
+        """Close the port and schedule the next connection attempt."""
+        if self.device is not None:
+            try:
+                self.device.close()
+            except Exception:
+                pass
+            self.device = None
+        if error is not None:
+            self.last_error = str(error)
+            self._next_connect = time.monotonic() + self._backoff
+            self._backoff = min(self._backoff * 2, self.max_reconnect_delay)
+    
+    def read_measurements(self) -> Optional[Dict[str, Any]]:
+        """
+        Read all measurement values, (re)connecting first if needed.
+        
+        Returns:
+            dict or None: Measurement values, None if the port is unavailable
+            or the device did not answer
+        """
+        with self._lock:
+            self.reads += 1
+            if not self.connected and not self._open():
+                self.failures += 1
+                return None
+            
+            try:
+                measurements = self.device.poll_measurements()
+            except SERIAL_ERRORS as e:
+                logging.warning(f"Serial error on {self.port}, reconnecting: {e}")
+                self.failures += 1
+                self.consecutive_failures += 1
+                self._disconnect(e)
+                return None
+            
+            if measurements is None:
+                self.failures += 1
+                self.consecutive_failures += 1
+                self.last_error = "No valid response"
+                if self.consecutive_failures % self.max_failures == 0:
+                    # Health check failed: start over with a fresh port
+                    logging.warning(f"{self.port}: {self.consecutive_failures} failed reads, reopening port")
+                    self._disconnect()
+                return None
+            
+            self.consecutive_failures = 0
+            self.last_ok = time.time()
+            return measurements
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """Connection state and read counters"""
+        return {
+            'port': self.port,
+            'address': self.address,
+            'connected': self.connected,
+            'healthy': self.healthy,
+            'reads': self.reads,
+            'failures': self.failures,
+            'consecutive_failures': self.consecutive_failures,
+            'connects': self.connects,
+            'last_ok': self.last_ok,
+            'last_error': self.last_error
+        }
+    
+    def close(self):
+        """Close serial connection."""
+        with self._lock:
+            self._disconnect()
+
+
+class PZEMSessionManager:
+    """
+    Long-lived PZEMSession per serial port, shared across polling cycles.
+    
+    Example:
+        with PZEMSessionManager(timeout=2.0) as sessions:
+            while True:
+                for port in ports:
+                    print(port, sessions.read_measurements(port))
+                time.sleep(5)
+    """
+    
+    def __init__(self, **session_options):
+        """
+        Args:
+            session_options: Keyword arguments for every PZEMSession
+                (address, timeout, max_failures, reconnect_delay, max_reconnect_delay)
+        """
+        self.session_options = session_options
+        self._sessions: Dict[str, PZEMSession] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, port: str) -> PZEMSession:
+        """Session of port, created on first use (the port opens on the first read)"""
+        with self._lock:
+            session = self._sessions.get(port)
+            if session is None:
+                session = PZEMSession(port, **self.session_options)
+                self._sessions[port] = session
+            return session
+    
+    def read_measurements(self, port: str) -> Optional[Dict[str, Any]]:
+        """Read all measurement values of the meter on port (see PZEMSession.read_measurements)"""
+        return self.get(port).read_measurements()
+    
+    def sync(self, ports) -> None:
+        """Close the sessions of ports that are no longer in ports"""
+        keep = set(ports)
+        with self._lock:
+            removed = [self._sessions.pop(port) for port in list(self._sessions) if port not in keep]
+        for session in removed:
+            session.close()
+    
+    def get_stats(self) -> Dict[str, Dict[str, Any]]:
+        """PZEMSession.get_stats of every session, keyed by port"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {session.port: session.get_stats() for session in sessions}
+    
+    def close_all(self):
+        """Close every session"""
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions = {}
+        for session in sessions:
+            session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close_all()
+
+
 # Legacy class name for backward compatibility
 PZEM004Tv30 = PZEM004T
 
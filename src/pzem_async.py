@@ -0,0 +1,388 @@
+"""
+asyncio driver for the PZEM-004T
+Same Modbus-RTU frames, register map and decoding as pzem.PZEM004T, but the
+serial port is non-blocking and driven by the event loop, so one loop can
+poll hundreds of ports (and addresses on a shared RS-485 bus) without a
+thread per port. Usable directly from the FastAPI process.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, Optional, Union
+
+import serial
+
+try:
+    from .pzem import PZEM004T, SERIAL_ERRORS, crc16_modbus, _request_frame, _REGISTER
+except ImportError:
+    # Imported as a top-level module with src/ on sys.path (tools, web server)
+    from pzem import PZEM004T, SERIAL_ERRORS, crc16_modbus, _request_frame, _REGISTER
+
+class AsyncSerialPort:
+    """
+    Non-blocking Modbus-RTU serial line on the event loop
+    
+    Incoming bytes are delivered by loop.add_reader(); on event loops
+    without it (Windows proactor) the port is polled every POLL_INTERVAL
+    seconds instead. Requests are serialized with an asyncio.Lock and
+    separated by the 3.5-character silent interval, so several
+    AsyncPZEM004T with different addresses can share one port. On POSIX the
+    bytes are read and written directly on pyserial's non-blocking file
+    descriptor: pyserial's own read()/write() use select(), which fails
+    once descriptors exceed 1024 (a few hundred open ports).
+    
+    The port is opened on the first request. A serial error (adapter
+    unplugged) closes it and is raised to the caller; the next request
+    reopens it. Use from one event loop only.
+    """
+    
+    # Polling period when the event loop cannot watch the file descriptor
+    POLL_INTERVAL = 0.005
+    
+    def __init__(self, port: str, baudrate: int = PZEM004T.BAUD_RATE):
+        """
+        Args:
+            port: Serial port (e.g., '/dev/ttyUSB0')
+            baudrate: Line speed
+        """
+        self.port = port
+        self.baudrate = baudrate
+        # Same silent interval as PZEMBus: 3.5 characters of 11 bits, at least 1.75 ms
+        self.frame_gap = max(3.5 * 11 / baudrate, 0.00175)
+        self.serial = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = asyncio.Lock()
+        self._buffer = bytearray()
+        self._needed = 0
+        self._waiter: Optional[asyncio.Future] = None
+        self._watching = False
+        self._error: Optional[Exception] = None
+        self._last_frame_end = 0.0
+    
+    @property
+    def is_open(self) -> bool:
+        return self.serial is not None and self.serial.is_open
+    
+    def open(self):
+        """Open the port in non-blocking mode and start watching it"""
+        if self.is_open:
+            return
+        self._loop = asyncio.get_running_loop()
+        self.serial = serial.Serial(
+            port=self.port,
+            baudrate=self.baudrate,
+            bytesize=PZEM004T.DATA_BITS,
+            parity=PZEM004T.PARITY,
+            stopbits=PZEM004T.STOP_BITS,
+            timeout=0
+        )
+        self._error = None
+        self._buffer.clear()
+        try:
+            self._loop.add_reader(self.serial.fileno(), self._on_readable)
+            self._watching = True
+        except (NotImplementedError, AttributeError, ValueError):
+            self._watching = False
+        logging.info(f"Connected to PZEM-004T on {self.port} (asyncio)")
+    
+    def _on_readable(self):
+        """Move the available bytes to the buffer and wake the pending read"""
+        try:
+            self._buffer += self._read_available(readable=True)
+        except SERIAL_ERRORS as e:
+            self._error = e
+            self._stop_watching()
+        waiter = self._waiter
+        if waiter is not None and not waiter.done() and (len(self._buffer) >= self._needed or self._error):
+            waiter.set_result(None)
+    
+    def _read_available(self, readable: bool = False) -> bytes:
+        """
+        Bytes already received, without waiting
+        
+        Args:
+            readable: The loop reported the descriptor readable, so no data
+                      means the device is gone (a raw tty otherwise returns
+                      no data when nothing has arrived)
+        """
+        fd = getattr(self.serial, 'fd', None)
+        if fd is None:
+            return self.serial.read(self.serial.in_waiting)
+        try:
+            data = os.read(fd, 256)
+        except BlockingIOError:
+            return b''
+        if not data and readable:
+            raise serial.SerialException("device reports readiness to read but returned no data "
+                                         "(device disconnected?)")
+        return data
+    
+    def _write(self, data: bytes):
+        fd = getattr(self.serial, 'fd', None)
+        if fd is None:
+            self.serial.write(data)
+        elif os.write(fd, data) != len(data):
+            raise serial.SerialException(f"Write to {self.port} was truncated")
+    
+    def _stop_watching(self):
+        if self._watching:
+            try:
+                self._loop.remove_reader(self.serial.fileno())
+            except (OSError, ValueError):
+                pass
+            self._watching = False
+    
+    async def _read(self, size: int, deadline: float) -> bytes:
+        """Read up to size bytes, returning fewer if the deadline (loop time) passes"""
+        while len(self._buffer) < size:
+            if self._error is not None:
+                raise self._error
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            if self._watching:
+                self._needed = size
+                self._waiter = self._loop.create_future()
+                try:
+                    await asyncio.wait_for(self._waiter, remaining)
+                except asyncio.TimeoutError:
+                    break
+                finally:
+                    self._waiter = None
+            else:
+                self._buffer += self._read_available()
+                if len(self._buffer) < size:
+                    await asyncio.sleep(min(self.POLL_INTERVAL, remaining))
+        if self._error is not None:
+            raise self._error
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+    
+    async def transact(self, request: bytes, timeout: float) -> bytes:
+        """
+        Send one request frame and read the raw response
+        
+        The response length follows from the function code, as in
+        PZEM004T._send_command. The response is returned unvalidated and
+        may be short or empty if the device did not answer within timeout.
+        
+        Args:
+            request: Complete frame including CRC (see pzem._request_frame)
+            timeout: Seconds to wait for the complete response
+        
+        Raises:
+            SERIAL_ERRORS: The port failed; it is closed
+        """
+        async with self._lock:
+            self.open()
+            remaining = self._last_frame_end + self.frame_gap - time.monotonic()
+            if remaining > 0:
+                await asyncio.sleep(remaining)
+            try:
+                self._buffer.clear()
+                self.serial.reset_input_buffer()
+                # A request is at most 8 bytes: the OS buffer takes it without blocking
+                self._write(request)
+                deadline = self._loop.time() + timeout
+                
+                # addr + func, then the rest of the frame depending on the function
+                response = await self._read(2, deadline)
+                if len(response) == 2:
+                    function_code = response[1]
+                    if function_code & 0x80:
+                        # Exception response: error code + crc
+                        response += await self._read(3, deadline)
+                    elif function_code in (PZEM004T.READ_HOLDING_REGISTERS, PZEM004T.READ_INPUT_REGISTERS):
+                        response += await self._read(1, deadline)
+                        if len(response) == 3:
+                            response += await self._read(response[2] + 2, deadline)
+                    elif function_code == PZEM004T.RESET_ENERGY:
+                        response += await self._read(2, deadline)
+                    else:
+                        # Write / calibration echo: register + value + crc
+                        response += await self._read(6, deadline)
+                return response
+            except SERIAL_ERRORS:
+                self._close()
+                raise
+            finally:
+                self._last_frame_end = time.monotonic()
+    
+    def _close(self):
+        if self.serial is not None:
+            self._stop_watching()
+            try:
+                self.serial.close()
+            except SERIAL_ERRORS:
+                pass
+            self.serial = None
+    
+    def close(self):
+        """Close serial connection."""
+        if self.is_open:
+            self._close()
+            logging.info("Serial connection closed")
+
+class AsyncPZEM004T:
+    """
+    asyncio variant of PZEM004T
+    
+    Every request has its own timeout and a failed request returns None (or
+    False) instead of cached values, so callers can gather many devices:
+        
+        devices = [AsyncPZEM004T(port) for port in ports]
+        results = await asyncio.gather(*(d.read_measurements(timeout=0.5) for d in devices))
+    
+    Meters sharing an RS-485 bus share one AsyncSerialPort:
+        
+        bus = AsyncSerialPort('/dev/ttyUSB0')
+        meters = [AsyncPZEM004T(bus, address) for address in range(1, 31)]
+    
+    Serial port errors are raised (the port is reopened by the next
+    request); timeouts, CRC errors and Modbus exception responses return
+    None.
+    """
+    
+    def __init__(self, port: Union[str, AsyncSerialPort], address: int = PZEM004T.DEFAULT_ADDRESS,
+                 timeout: float = 1.0, retries: int = 0):
+        """
+        Args:
+            port: Serial port name, or an AsyncSerialPort shared with other meters
+            address: Device address (1-247, or 0xF8 for the only meter on a port)
+            timeout: Default seconds to wait for each response
+            retries: Extra attempts for a request that was not answered correctly
+        """
+        self._owns_port = not isinstance(port, AsyncSerialPort)
+        self.bus = AsyncSerialPort(port) if self._owns_port else port
+        self.port = self.bus.port
+        self.address = address
+        self.timeout = timeout
+        self.retries = retries
+    
+    async def _request(self, function_code: int, register: int = 0, value: int = 0,
+                       timeout: Optional[float] = None, short: bool = False) -> Optional[bytes]:
+        """Send a command and return the validated response, None if it failed"""
+        request = _request_frame(self.address, function_code, register, value, short=short)
+        timeout = self.timeout if timeout is None else timeout
+        for _ in range(self.retries + 1):
+            response = await self.bus.transact(request, timeout)
+            if len(response) < 4:
+                logging.debug(f"No response from address {self.address} on {self.port}")
+            elif crc16_modbus(response) != 0:
+                logging.debug(f"Invalid CRC in response from address {self.address} on {self.port}")
+            elif response[0] != self.address or (response[1] & 0x7F) != function_code:
+                logging.debug(f"Unexpected frame on {self.port} for address {self.address}: {response.hex()}")
+            elif response[1] & 0x80:
+                logging.error(f"Modbus error {response[2]} from address {self.address} on {self.port}")
+                return None
+            else:
+                return response
+        return None
+    
+    async def read_measurements(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Read all measurement values from the device.
+        
+        Args:
+            timeout: Seconds to wait for the response (default: self.timeout)
+        
+        Returns:
+            dict or None: Same keys as PZEM004T.read_measurements, None if
+            the device did not answer correctly
+        """
+        response = await self._request(PZEM004T.READ_INPUT_REGISTERS, PZEM004T.REG_VOLTAGE, 10, timeout)
+        if response is None or len(response) < 25:
+            return None
+        return PZEM004T.decode_measurements(response)
+    
+    async def get_power_alarm_threshold(self, timeout: Optional[float] = None) -> Optional[int]:
+        """
+        Get current power alarm threshold.
+        
+        Returns:
+            int or None: Alarm threshold in Watts
+        """
+        response = await self._request(PZEM004T.READ_HOLDING_REGISTERS, PZEM004T.REG_ALARM_THRESHOLD, 1, timeout)
+        if response is None or len(response) < 7:
+            return None
+        return _REGISTER.unpack_from(response, 3)[0]
+    
+    async def set_power_alarm_threshold(self, watts: int, timeout: Optional[float] = None) -> bool:
+        """
+        Set power alarm threshold.
+        
+        Args:
+            watts: Alarm threshold in Watts (1-25000)
+        
+        Returns:
+            bool: True on success
+        """
+        if not 1 <= watts <= 25000:
+            raise ValueError("Power alarm threshold must be between 1 and 25000 Watts")
+        response = await self._request(PZEM004T.WRITE_SINGLE_REGISTER, PZEM004T.REG_ALARM_THRESHOLD, watts, timeout)
+        return response is not None
+    
+    async def get_address(self, timeout: Optional[float] = None) -> Optional[int]:
+        """
+        Get current device address.
+        
+        Returns:
+            int or None: Device address
+        """
+        response = await self._request(PZEM004T.READ_HOLDING_REGISTERS, PZEM004T.REG_DEVICE_ADDRESS, 1, timeout)
+        if response is None or len(response) < 7:
+            return None
+        return _REGISTER.unpack_from(response, 3)[0]
+    
+    async def reset_energy(self, timeout: Optional[float] = None) -> bool:
+        """
+        Reset energy counter (without the read-back verification of PZEM004T.reset_energy).
+        
+        Returns:
+            bool: True if the device acknowledged the reset
+        """
+        response = await self._request(PZEM004T.RESET_ENERGY, timeout=timeout, short=True)
+        return response is not None
+    
+    def close(self):
+        """Close serial connection (a shared AsyncSerialPort is left to its owner)."""
+        if self._owns_port:
+            self.bus.close()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+async def read_all(devices: Iterable[AsyncPZEM004T],
+                   timeout: Optional[float] = None) -> Dict[tuple, Optional[Dict[str, Any]]]:
+    """
+    Read every device concurrently (ports in parallel, addresses on a shared
+    port one after another)
+    
+    Args:
+        devices: AsyncPZEM004T instances
+        timeout: Per-request timeout (default: each device's own)
+    
+    Returns:
+        dict: (port, address) -> measurements, None for devices that did not
+        answer or whose port failed
+    """
+    devices = list(devices)
+    results = await asyncio.gather(
+        *(device.read_measurements(timeout) for device in devices),
+        return_exceptions=True
+    )
+    readings = {}
+    for device, result in zip(devices, results):
+        if isinstance(result, BaseException):
+            if not isinstance(result, SERIAL_ERRORS):
+                raise result
+            logging.warning(f"Serial error on {device.port}: {result}")
+            result = None
+        readings[(device.port, device.address)] = result
+    return readings
@@ -0,0 +1,91 @@
+"""
+Chart point counts of load_chart_rows (raw and rollup sources)
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+import downsample
+from database import PZEMDatabase
+from downsample import load_chart_rows
+
+DAY = datetime(2024, 1, 1)
+PORTS = ('/dev/ttyUSB0', '/dev/ttyUSB1')
+
+def make_samples(start, count, interval=5):
+    """count samples per port, interval seconds apart"""
+    samples = []
+    for i in range(count):
+        for n, port in enumerate(PORTS):
+            samples.append({
+                'port': port,
+                'voltage': 230.0,
+                'current': 1.0,
+                'power': float((i * 7 + n) % 100),
+                'energy': float(i),
+                'frequency': 50.0,
+                'power_factor': 1.0,
+                'alarm': False,
+                'timestamp': start + timedelta(seconds=i * interval)
+            })
+    return samples
+
+@pytest.fixture(scope='module')
+def day_database(tmp_path_factory):
+    """One full day of 5 s data for two sensors (17,280 rows each)"""
+    database = PZEMDatabase(str(tmp_path_factory.mktemp('db') / 'pzem_data.db'))
+    database.save_measurements_batch(make_samples(DAY, 17280))
+    return database
+
+def points_per_port(rows):
+    counts = {}
+    for row in rows:
+        counts[row['port']] = counts.get(row['port'], 0) + 1
+    return counts
+
+def test_full_day_gets_max_points(day_database):
+    rows, total = load_chart_rows(day_database, DAY, DAY + timedelta(days=1), None, 1000)
+    assert points_per_port(rows) == {port: 1000 for port in PORTS}
+    assert total == 2 * 17280
+
+def test_long_range_with_one_day_of_data_gets_max_points(day_database):
+    for days in (7, 30):
+        rows, total = load_chart_rows(day_database, DAY - timedelta(days=days - 1), DAY + timedelta(days=1),
+                                      PORTS[0], 1500)
+        assert points_per_port(rows) == {PORTS[0]: 1500}
+        assert total == 17280
+
+def test_rows_are_newest_first(day_database):
+    rows, _ = load_chart_rows(day_database, DAY, DAY + timedelta(days=1), PORTS[0], 100)
+    timestamps = [row['timestamp_ms'] for row in rows]
+    assert timestamps == sorted(timestamps, reverse=True)
+
+def test_short_range_gets_max_points(tmp_path):
+    database = PZEMDatabase(str(tmp_path / 'pzem_data.db'))
+    database.save_measurements_batch(make_samples(DAY, 300))  # 25 minutes
+    rows, total = load_chart_rows(database, DAY, DAY + timedelta(days=1), None, 50, method='minmax')
+    assert all(45 <= count <= 50 for count in points_per_port(rows).values())
+    assert total == 600
+
+@pytest.mark.parametrize('max_points', [1000, 100])
+def test_rollup_source_still_gets_max_points(day_database, monkeypatch, max_points):
+    # Too many raw rows: the rollups are merged into buckets sized to the
+    # data's own day, not to the requested 30 days
+    monkeypatch.setattr(downsample, 'CHART_MAX_RAW_ROWS', 2000)
+    rows, total = load_chart_rows(day_database, DAY - timedelta(days=29), DAY + timedelta(days=1), None, max_points)
+    assert points_per_port(rows) == {port: max_points for port in PORTS}
+    assert all(row['count'] > 0 for row in rows)
+    assert total == 2 * 17280
+
+def test_rollup_source_averages_each_bucket(day_database, monkeypatch):
+    monkeypatch.setattr(downsample, 'CHART_MAX_RAW_ROWS', 2000)
+    rows, _ = load_chart_rows(day_database, DAY, DAY + timedelta(days=1), PORTS[0], 2000)
+    # 1 minute buckets of 12 samples each: every bucket is a point
+    assert len(rows) == 1440
+    assert all(row['count'] == 12 for row in rows)
+    assert rows[0]['timestamp_ms'] > rows[-1]['timestamp_ms']
+    assert rows[-1]['voltage'] == 230.0
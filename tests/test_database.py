@@ -0,0 +1,207 @@
+"""
+PZEMDatabase on a temporary file: schema migration, rollups, keyset pages,
+since_id deltas, data version (ETag) and statistics
+"""
+
+import os
+import sqlite3
+import sys
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from database import PZEMDatabase
+
+T0 = datetime(2024, 1, 1)
+
+def make_sample(port, i, interval=5):
+    return {
+        'port': port,
+        'voltage': 230.0 + i % 3,
+        'current': 1.0,
+        'power': float(i % 50),
+        'energy': float(i),
+        'frequency': 50.0,
+        'power_factor': 1.0,
+        'alarm': False,
+        'timestamp': T0 + timedelta(seconds=i * interval)
+    }
+
+@pytest.fixture
+def database(tmp_path):
+    return PZEMDatabase(str(tmp_path / 'pzem_data.db'))
+
+@pytest.fixture
+def filled(database):
+    """Two sensors, 1000 samples each, 5 s apart"""
+    database.save_measurements_batch(
+        [make_sample(port, i) for i in range(1000) for port in ('/dev/ttyUSB0', '/dev/ttyUSB1')]
+    )
+    return database
+
+def create_legacy_database(path, samples):
+    """Schema version 0: text timestamps only, no rollups or counters"""
+    with sqlite3.connect(path) as conn:
+        conn.executescript('''
+            CREATE TABLE sensors (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                port TEXT UNIQUE NOT NULL,
+                device_address INTEGER DEFAULT 248,
+                first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                total_readings INTEGER DEFAULT 0
+            );
+            CREATE TABLE measurements (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sensor_id INTEGER NOT NULL,
+                timestamp TIMESTAMP NOT NULL,
+                voltage REAL,
+                current REAL,
+                power REAL,
+                energy REAL,
+                frequency REAL,
+                power_factor REAL,
+                alarm_status BOOLEAN,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                FOREIGN KEY (sensor_id) REFERENCES sensors (id)
+            );
+            CREATE INDEX idx_measurements_timestamp ON measurements(timestamp);
+            CREATE INDEX idx_measurements_sensor_id ON measurements(sensor_id);
+            INSERT INTO sensors (port) VALUES ('/dev/ttyUSB0');
+        ''')
+        conn.executemany('''
+            INSERT INTO measurements (sensor_id, timestamp, voltage, current, power, energy,
+                                      frequency, power_factor, alarm_status)
+            VALUES (1, ?, ?, ?, ?, ?, ?, ?, 0)
+        ''', [
+            (sample['timestamp'].strftime('%Y-%m-%d %H:%M:%S'), sample['voltage'], sample['current'],
+             sample['power'], sample['energy'], sample['frequency'], sample['power_factor'])
+            for sample in samples
+        ])
+
+def test_migration_upgrades_a_legacy_database(tmp_path):
+    path = str(tmp_path / 'pzem_data.db')
+    samples = [make_sample('/dev/ttyUSB0', i, interval=30) for i in range(500)]
+    create_legacy_database(path, samples)
+
+    database = PZEMDatabase(path)
+
+    with sqlite3.connect(path) as conn:
+        assert conn.execute('PRAGMA user_version').fetchone()[0] == PZEMDatabase.SCHEMA_VERSION
+        timestamps = [row[0] for row in conn.execute('SELECT timestamp_ms FROM measurements ORDER BY id')]
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert timestamps == [int(sample['timestamp'].timestamp() * 1000) for sample in samples]
+    assert 'idx_measurements_sensor_id' not in indexes
+    assert 'idx_measurements_timestamp' not in indexes
+
+    # Backfilled rollups, counters and latest values
+    for resolution in PZEMDatabase.ROLLUP_RESOLUTIONS:
+        assert sum(bucket['count'] for bucket in database.get_rollups(resolution)) == 500
+    stats = database.get_database_stats()
+    assert stats['total_measurements'] == 500
+    assert stats['rollup_pending'] == 0
+    assert stats['newest_measurement_ms'] == timestamps[-1]
+    assert database.get_latest_per_sensor()[0]['energy'] == 499.0
+
+def test_migration_is_a_no_op_on_a_current_database(filled):
+    version = filled.get_data_version()
+    reopened = PZEMDatabase(filled.db_path)
+    assert reopened.get_data_version() == version
+    assert sum(bucket['count'] for bucket in reopened.get_rollups('1h')) == 2000
+
+def test_rollups_aggregate_every_measurement(filled):
+    minutes = filled.get_rollups('1m', port='/dev/ttyUSB0')
+    assert len(minutes) == 84  # 1000 samples x 5 s = 83 min 20 s
+    assert all(bucket['count'] == 12 for bucket in minutes[:-1])
+
+    first = minutes[0]
+    powers = [float(i % 50) for i in range(12)]
+    assert first['bucket_ms'] == int(T0.timestamp() * 1000)
+    assert (first['power_min'], first['power_max']) == (min(powers), max(powers))
+    assert first['power_avg'] == pytest.approx(sum(powers) / 12)
+    assert (first['energy_first'], first['energy_last'], first['energy_delta']) == (0.0, 11.0, 11.0)
+
+    for resolution in PZEMDatabase.ROLLUP_RESOLUTIONS:
+        assert sum(bucket['count'] for bucket in filled.get_rollups(resolution)) == 2000
+
+def test_rebuilt_rollups_match_incremental_ones(filled):
+    incremental = filled.get_rollups('1m')
+    assert filled.rebuild_rollups() == 2000
+    assert filled.get_rollups('1m') == incremental
+
+def test_rollups_filter_by_time_and_port(filled):
+    start = T0 + timedelta(minutes=10)
+    end = T0 + timedelta(minutes=20)
+    buckets = filled.get_rollups('1m', start, end, port='/dev/ttyUSB1')
+    assert len(buckets) == 10
+    assert {bucket['port'] for bucket in buckets} == {'/dev/ttyUSB1'}
+    with pytest.raises(ValueError):
+        filled.get_rollups('5m')
+
+def test_keyset_pages_cover_every_row_once(filled):
+    seen = []
+    cursor = None
+    while True:
+        page = filled.get_measurements_page(limit=64, before=cursor, port='/dev/ttyUSB0')
+        seen.extend(row['timestamp_ms'] for row in page['data'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+    assert len(seen) == 1000
+    assert seen == sorted(set(seen), reverse=True)
+
+def test_keyset_after_pages_towards_newer_rows(filled):
+    oldest = filled.get_measurements_page(limit=1, after='0:0', port='/dev/ttyUSB0')
+    assert oldest['data'][0]['energy'] == 0.0
+    newer = filled.get_measurements_page(limit=5, after=oldest['next_cursor'], port='/dev/ttyUSB0')
+    # Newest first within the page, continuing right after the cursor
+    assert [row['energy'] for row in newer['data']] == [5.0, 4.0, 3.0, 2.0, 1.0]
+    with pytest.raises(ValueError):
+        filled.get_measurements_page(before='bogus')
+
+def test_since_id_returns_only_new_rows(filled):
+    last_id = filled.get_last_measurement_id()
+    assert filled.get_measurements_since(since_id=last_id)['data'] == []
+
+    filled.save_measurements_batch([make_sample('/dev/ttyUSB0', i) for i in range(1000, 1003)])
+    delta = filled.get_measurements_since(since_id=last_id)
+    assert [row['energy'] for row in delta['data']] == [1002.0, 1001.0, 1000.0]
+    assert delta['last_id'] == last_id + 3
+    assert not delta['has_more']
+
+def test_since_id_pages_a_large_backlog(filled):
+    first = filled.get_measurements_since(since_id=0, limit=1500)
+    assert len(first['data']) == 1500 and first['has_more']
+    rest = filled.get_measurements_since(since_id=first['last_id'], limit=1500)
+    assert len(rest['data']) == 500 and not rest['has_more']
+    with pytest.raises(ValueError):
+        filled.get_measurements_since()
+
+def test_data_version_changes_only_with_the_data(filled):
+    version = filled.get_data_version()
+    filled.get_measurements_page(limit=10)
+    assert filled.get_data_version() == version
+
+    filled.save_measurements_batch([make_sample('/dev/ttyUSB0', 1000)])
+    assert filled.get_data_version() != version
+
+def test_stats_report_the_file_schema_version(database):
+    assert database.get_database_stats()['schema_version'] == PZEMDatabase.SCHEMA_VERSION
+
+    with sqlite3.connect(database.db_path) as conn:
+        conn.execute('PRAGMA user_version = 3')
+    assert database.get_database_stats()['schema_version'] == 3
+
+def test_stats_size_includes_the_wal_file(tmp_path):
+    database = PZEMDatabase(str(tmp_path / 'pzem_data.db'), persistent=True)
+    try:
+        database.save_measurements_batch([make_sample('/dev/ttyUSB0', i) for i in range(500)])
+        wal_size = os.path.getsize(database.db_path + '-wal')
+        assert wal_size > 0
+
+        stats = database.get_database_stats()
+        assert stats['wal_size_bytes'] == wal_size
+        assert stats['database_size_bytes'] == os.path.getsize(database.db_path) + wal_size
+    finally:
+        database.close()
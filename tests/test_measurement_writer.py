@@ -0,0 +1,118 @@
+"""
+MeasurementWriter overflow handling when a flush fails
+"""
+
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+from database import MeasurementWriter
+
+class FailingDatabase:
+    """Stand-in for PZEMDatabase whose first save blocks until released, then fails"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.saved = []
+        self.first_call = threading.Event()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def save_measurements_batch(self, samples):
+        self.calls += 1
+        if self.calls == 1:
+            self.first_call.set()
+            self.release.wait(5)
+            return 0
+        self.saved.extend(samples)
+        return len(samples)
+
+class RecordingDatabase:
+    """Stand-in for PZEMDatabase that saves every batch"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.batches = []
+
+    def save_measurements_batch(self, samples):
+        self.batches.append(list(samples))
+        return len(samples)
+
+def make_sample(i):
+    return {
+        'port': '/dev/ttyUSB0',
+        'voltage': 230.0,
+        'current': 1.0,
+        'power': 230.0,
+        'energy': float(i),
+        'frequency': 50.0,
+        'power_factor': 1.0,
+        'alarm': False,
+        'timestamp': datetime(2024, 1, 1) + timedelta(seconds=i)
+    }
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+def fail_first_flush(tmp_path, overflow):
+    """
+    Queue 4 samples, let their flush fail after 4 more were queued (queue
+    full again), then let every later flush succeed
+    """
+    database = FailingDatabase(str(tmp_path / 'pzem_data.db'))
+    writer = MeasurementWriter(database, max_queue=4, batch_size=4, flush_interval=0.05, overflow=overflow)
+    writer.start()
+    try:
+        writer.put_many([make_sample(i) for i in range(4)])
+        assert database.first_call.wait(5)
+        writer.put_many([make_sample(i) for i in range(4, 8)])
+        database.release.set()
+        wait_until(lambda: writer.get_stats()['failed_flushes'] == 1)
+        wait_until(lambda: len(database.saved) + writer.get_stats()['dropped'] == 8)
+    finally:
+        writer.stop(5)
+    return database, writer
+
+def test_failed_flush_with_spill_loses_nothing(tmp_path):
+    database, writer = fail_first_flush(tmp_path, 'spill')
+    stats = writer.get_stats()
+    assert stats['dropped'] == 0
+    assert stats['spilled'] == 4
+    assert sorted(sample['energy'] for sample in database.saved) == [float(i) for i in range(8)]
+    assert not os.path.exists(writer.spill_path)
+
+def test_failed_flush_with_drop_oldest_drops_from_the_left(tmp_path):
+    database, writer = fail_first_flush(tmp_path, 'drop_oldest')
+    assert writer.get_stats()['dropped'] == 4
+    assert [sample['energy'] for sample in database.saved] == [4.0, 5.0, 6.0, 7.0]
+
+@pytest.mark.parametrize('overflow', ['spill', 'drop_oldest'])
+def test_put_over_max_queue_applies_policy(tmp_path, overflow):
+    database = FailingDatabase(str(tmp_path / 'pzem_data.db'))
+    writer = MeasurementWriter(database, max_queue=2, batch_size=10, flush_interval=60, overflow=overflow)
+    assert writer.put_many([make_sample(i) for i in range(3)]) == 3
+    stats = writer.get_stats()
+    assert stats['queue_depth'] == 2
+    assert (stats['spilled'], stats['dropped']) == ((1, 0) if overflow == 'spill' else (0, 1))
+
+def test_flush_without_timeout_commits_the_cycle_promptly(tmp_path):
+    database = RecordingDatabase(str(tmp_path / 'pzem_data.db'))
+    writer = MeasurementWriter(database, batch_size=100, flush_interval=60)
+    writer.start()
+    try:
+        writer.put_many([make_sample(i) for i in range(3)])
+        started = time.monotonic()
+        writer.flush(timeout=0)
+        assert time.monotonic() - started < 0.5
+        wait_until(lambda: database.batches)
+        assert [len(batch) for batch in database.batches] == [3]
+    finally:
+        writer.stop(5)
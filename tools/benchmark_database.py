@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Database benchmark tool for PZEM-004T data logging
+Measures insert throughput of PZEMDatabase on a throw-away database file
+"""
+
+import sys
+import os
+import argparse
+import re
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+# Add src directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+from database import PZEMDatabase
+
+def make_samples(count, sensors):
+    """
+    Build synthetic measurements spread round-robin over several ports
+
+    Args:
+        count: Number of samples to generate
+        sensors: Number of distinct sensor ports
+    """
+    start = datetime.now() - timedelta(seconds=count)
+    return [
+        {
+            'port': f"/dev/ttyUSB{i % sensors}",
+            'voltage': 220.0 + (i % 10) * 0.1,
+            'current': 1.5,
+            'power': 330.0,
+            'energy': 1000.0 + i,
+            'frequency': 50.0,
+            'power_factor': 0.95,
+            'alarm': False,
+            'timestamp': start + timedelta(seconds=i)
+        }
+        for i in range(count)
+    ]
+
+def bench_inserts(label, samples, **db_kwargs):
+    """
+    Insert samples one by one with save_measurement and report inserts/second
+
+    Args:
+        label: Name printed next to the result
+        samples: Measurements to insert
+        db_kwargs: Keyword arguments passed to PZEMDatabase
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = PZEMDatabase(os.path.join(tmp_dir, 'bench', 'pzem_data.db'), **db_kwargs)
+        try:
+            started = time.perf_counter()
+            for sample in samples:
+                db.save_measurement(sample)
+            elapsed = time.perf_counter() - started
+        finally:
+            db.close()
+
+    rate = len(samples) / elapsed if elapsed > 0 else float('inf')
+    print(f"{label:<28} {len(samples):>8,} rows  {elapsed:8.2f} s  {rate:10,.0f} inserts/s")
+    return rate
+
+def bench_batches(label, samples, batch_size, **db_kwargs):
+    """
+    Insert samples with save_measurements_batch and report inserts/second
+
+    Args:
+        label: Name printed next to the result
+        samples: Measurements to insert
+        batch_size: Number of samples per transaction (one polling cycle)
+        db_kwargs: Keyword arguments passed to PZEMDatabase
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = PZEMDatabase(os.path.join(tmp_dir, 'bench', 'pzem_data.db'), **db_kwargs)
+        try:
+            started = time.perf_counter()
+            for i in range(0, len(samples), batch_size):
+                db.save_measurements_batch(samples[i:i + batch_size])
+            elapsed = time.perf_counter() - started
+        finally:
+            db.close()
+
+    rate = len(samples) / elapsed if elapsed > 0 else float('inf')
+    print(f"{label:<28} {len(samples):>8,} rows  {elapsed:8.2f} s  {rate:10,.0f} inserts/s")
+    return rate
+
+# Query plan regression checks: (label, query, index the plan must use, sort step allowed)
+PLAN_CHECKS = [
+    ("latest N for one sensor",
+     lambda db, now: db.get_measurements_by_port('/dev/ttyUSB0', 100),
+     'idx_measurements_sensor_time', False),
+    ("time range for one sensor",
+     lambda db, now: db.get_measurements_by_port('/dev/ttyUSB0', 100, since=now - timedelta(hours=1)),
+     'idx_measurements_sensor_time', False),
+    ("latest N for all sensors",
+     lambda db, now: db.get_latest_measurements(100),
+     'idx_measurements_timestamp_ms', False),
+    ("date range for one sensor",
+     lambda db, now: db.get_measurements_range(now - timedelta(days=1), now, port='/dev/ttyUSB0'),
+     'idx_measurements_sensor_time', False),
+    ("date range for all sensors",
+     lambda db, now: db.get_measurements_range(now - timedelta(days=1), now, columns=['timestamp_ms', 'power']),
+     'idx_measurements_timestamp_ms', False),
+    ("deep page (before cursor), all sensors",
+     lambda db, now: db.get_measurements_page(100, before=f"{int(now.timestamp() * 1000) - 3600000}:1"),
+     'idx_measurements_timestamp_ms', False),
+    ("deep page (before cursor), one sensor",
+     lambda db, now: db.get_measurements_page(100, before=f"{int(now.timestamp() * 1000) - 3600000}:1",
+                                              port='/dev/ttyUSB0'),
+     'idx_measurements_sensor_time', False),
+    ("new rows (after cursor), all sensors",
+     lambda db, now: db.get_measurements_page(100, after=f"{int(now.timestamp() * 1000) - 3600000}:1"),
+     'idx_measurements_timestamp_ms', False),
+    ("new rows since id, one sensor",
+     lambda db, now: db.get_measurements_since(since_id=1, port='/dev/ttyUSB0'),
+     'INTEGER PRIMARY KEY (rowid>?)', False),
+    ("new rows since time, all sensors",
+     lambda db, now: db.get_measurements_since(since_ts=now - timedelta(minutes=5)),
+     'idx_measurements_timestamp_ms', False),
+    ("1h rollups for one sensor",
+     lambda db, now: db.get_rollups('1h', now - timedelta(days=30), now, port='/dev/ttyUSB0'),
+     'PRIMARY KEY (resolution=? AND sensor_id=?', False),
+    ("1m rollups for all sensors",
+     lambda db, now: db.get_rollups('1m', now - timedelta(days=1), now),
+     'idx_rollups_time', False),
+    ("recent stats for one sensor",
+     lambda db, now: db.get_recent_stats('/dev/ttyUSB0', 1000),
+     'idx_measurements_sensor_time', False),
+    # Window functions sort the selected buckets/rows, never the whole table
+    ("5m aggregates from 1m rollups",
+     lambda db, now: db.get_aggregates(300000, now - timedelta(days=7), now),
+     'idx_rollups_time', True),
+    ("30s aggregates from raw rows, one sensor",
+     lambda db, now: db.get_aggregates(30000, now - timedelta(hours=6), now, port='/dev/ttyUSB0'),
+     'idx_measurements_sensor_time', True),
+    # Counters are read from sensor_counters, one row per sensor; sorting is
+    # over the (small) sensors table only
+    ("sensor summary",
+     lambda db, now: db.get_sensor_summary(),
+     'SEARCH c USING INTEGER PRIMARY KEY', True),
+    ("database stats",
+     lambda db, now: db.get_database_stats(),
+     'SCAN sensor_counters', False),
+    ("latest measurement per sensor",
+     lambda db, now: db.get_latest_per_sensor(),
+     'SEARCH m USING INTEGER PRIMARY KEY (rowid=?)', False),
+]
+
+# Negative controls: full scans the checker itself must flag, so a broken
+# filter cannot silently pass every query
+FULL_SCAN_CONTROLS = [
+    ("count all measurements",
+     lambda db, now: db._get_thread_connection().execute('SELECT COUNT(*) FROM measurements').fetchone()),
+    ("count all rollup rows",
+     lambda db, now: db._get_thread_connection().execute('SELECT COUNT(*) FROM measurement_rollups').fetchone()),
+    ("unindexed filter on measurements",
+     lambda db, now: db._get_thread_connection().execute(
+         'SELECT m.id FROM measurements m WHERE m.power > 0 LIMIT 1').fetchone()),
+]
+
+# Tables that grow without bound: any SCAN of them is a regression, with or
+# without a (covering) index
+UNBOUNDED_TABLES = ('measurements', 'measurement_rollups')
+TABLE_ALIAS_RE = re.compile(
+    r'\b(?:FROM|JOIN)\s+(' + '|'.join(UNBOUNDED_TABLES) + r')\b'
+    r'(?:\s+(?:AS\s+)?(?!(?:WHERE|JOIN|ON|LEFT|INNER|CROSS|GROUP|ORDER|LIMIT|WINDOW)\b)(\w+))?',
+    re.IGNORECASE
+)
+
+def explain_statements(db, query, now):
+    """
+    Run a PZEMDatabase query and return the EXPLAIN QUERY PLAN details of
+    every SELECT it executed, and the names (tables and aliases) under which
+    those statements read the unbounded tables
+
+    Args:
+        db: Persistent-mode database instance
+        query: Callable taking (db, now) that runs the query
+        now: Reference time for relative ranges
+    """
+    conn = db._get_thread_connection()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    try:
+        query(db, now)
+    finally:
+        conn.set_trace_callback(None)
+
+    details = []
+    names = set(UNBOUNDED_TABLES)
+    for sql in statements:
+        if sql.lstrip().upper().startswith('SELECT'):
+            details.extend(row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql))
+            names.update(alias for _, alias in TABLE_ALIAS_RE.findall(sql) if alias)
+    return details, names
+
+def plan_problems(details, names, sort_allowed=False):
+    """
+    Regressions in a query plan: full scans of measurements/rollups (by
+    table name or alias) and, unless allowed, temporary sort B-trees
+    """
+    problems = []
+    for detail in details:
+        if detail.startswith('SCAN ') and detail.split()[1] in names:
+            problems.append(f"full scan: {detail}")
+        elif 'TEMP B-TREE' in detail and not sort_allowed:
+            problems.append(f"sort: {detail}")
+    return problems
+
+def check_query_plans(samples):
+    """
+    Verify that the measurement queries are served by the expected indexes,
+    never by a full scan of measurements/rollups or a temporary sort B-tree,
+    and that the known full scans of FULL_SCAN_CONTROLS are flagged
+
+    Args:
+        samples: Measurements loaded into the throw-away database
+
+    Returns:
+        True if every plan is acceptable
+    """
+    ok = True
+    now = datetime.now()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = PZEMDatabase(os.path.join(tmp_dir, 'bench', 'pzem_data.db'), persistent=True)
+        try:
+            db.save_measurements_batch(samples)
+            for phase in ("without statistics", "after ANALYZE"):
+                if phase == "after ANALYZE":
+                    with db._connection() as conn:
+                        conn.execute('ANALYZE')
+                print(f"🔍 Query plans ({phase}):")
+                for label, query, index, sort_allowed in PLAN_CHECKS:
+                    details, names = explain_statements(db, query, now)
+                    problems = plan_problems(details, names, sort_allowed)
+                    if not any(index in d for d in details):
+                        problems.append(f"expected index {index} not used")
+                    status = "✅" if not problems else "❌"
+                    print(f"   {status} {label}: {' | '.join(details)}")
+                    for problem in problems:
+                        print(f"      ⚠️  {problem}")
+                    ok = ok and not problems
+            print("🔍 Full scan detection (must be flagged):")
+            for label, query in FULL_SCAN_CONTROLS:
+                details, names = explain_statements(db, query, now)
+                flagged = bool(plan_problems(details, names))
+                status = "✅" if flagged else "❌"
+                print(f"   {status} {label}: {' | '.join(details)}")
+                if not flagged:
+                    print("      ⚠️  full scan not detected")
+                ok = ok and flagged
+        finally:
+            db.close()
+    return ok
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(
+        description="Benchmark PZEMDatabase insert throughput",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Compare per-call connections, persistent WAL connections and
+  # one batch (transaction) per polling cycle of 4 sensors
+  python benchmark_database.py --rows 2000 --sensors 4
+
+  # Query plan regression check (exit code 1 if an index is not used)
+  python benchmark_database.py --check-plans
+        """
+    )
+    parser.add_argument('--rows', type=int, default=2000, metavar='N',
+                       help='Number of measurements to insert (default: 2000)')
+    parser.add_argument('--sensors', type=int, default=4, metavar='N',
+                       help='Number of simulated sensor ports (default: 4)')
+    parser.add_argument('--check-plans', action='store_true',
+                       help='Check EXPLAIN QUERY PLAN of the measurement queries and exit (non-zero on regression)')
+
+    args = parser.parse_args()
+    samples = make_samples(args.rows, args.sensors)
+
+    if args.check_plans:
+        sys.exit(0 if check_query_plans(samples) else 1)
+
+    print("📈 PZEMDatabase insert benchmark")
+    print("=" * 72)
+    before = bench_inserts("per-call connections", samples)
+    after = bench_inserts("persistent WAL connection", samples, persistent=True)
+    batched = bench_batches(f"batches of {args.sensors} (one cycle)", samples, args.sensors, persistent=True)
+    print("-" * 72)
+    print(f"Speed-up (persistent): {after / before:.1f}x")
+    print(f"Speed-up (persistent + batched): {batched / before:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Protocol microbenchmark for the PZEM-004T driver
+Measures the CPU cost of the Modbus-RTU work done per poll (CRC16, request
+frame, response validation and parsing), without a serial device
+"""
+
+import sys
+import os
+import argparse
+import struct
+import timeit
+
+# Add src directory to path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+import pzem
+from pzem import PZEM004T
+
+def crc16_bitwise(data):
+    """Original bit-by-bit CRC16 (eight shift/xor steps per byte), kept as the baseline"""
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            if crc & 0x0001:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+    return crc
+
+def sample_response(address=0xF8):
+    """Read-input-registers response as sent by a meter: 3-byte header, 10 registers, CRC"""
+    registers = (2301, 1520, 0, 3300, 0, 12345, 0, 500, 95, 0)
+    frame = struct.pack('>BBB10H', address, PZEM004T.READ_INPUT_REGISTERS, 20, *registers)
+    return frame + struct.pack('<H', crc16_bitwise(frame))
+
+def poll_before(address, response):
+    """Per-poll protocol work of the previous implementation"""
+    packet = struct.pack('>BBHH', address, PZEM004T.READ_INPUT_REGISTERS, PZEM004T.REG_VOLTAGE, 10)
+    packet += struct.pack('<H', crc16_bitwise(packet))
+    valid = struct.pack('<H', crc16_bitwise(response[:-2])) == response[-2:]
+    return packet, valid, struct.unpack('>HHHHHHHHHH', response[3:23])
+
+def poll_after(address, response):
+    """Per-poll protocol work of the current implementation"""
+    packet = pzem._request_frame(address, PZEM004T.READ_INPUT_REGISTERS, PZEM004T.REG_VOLTAGE, 10)
+    valid = pzem.crc16_modbus(response) == 0
+    return packet, valid, pzem._MEASUREMENT_REGISTERS.unpack_from(response, 3)
+
+def bench(label, func, number, baseline=None):
+    """
+    Time func and print microseconds per call
+
+    Args:
+        label: Name printed next to the result
+        func: Callable without arguments
+        number: Calls per measurement (best of 5 is reported)
+        baseline: Microseconds per call to compare against
+    """
+    per_call = min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+    speedup = f"{baseline / per_call:6.1f}x" if baseline else ""
+    print(f"{label:<40} {per_call:8.2f} µs/call  {speedup}")
+    return per_call
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(
+        description="Microbenchmark the PZEM-004T Modbus-RTU CRC, framing and parsing",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Default run
+  python benchmark_protocol.py
+
+  # CPU time per polling cycle for 40 meters on a bus
+  python benchmark_protocol.py --meters 40
+        """
+    )
+    parser.add_argument('--number', type=int, default=20000, metavar='N',
+                       help='Calls per measurement (default: 20000)')
+    parser.add_argument('--meters', type=int, default=1, metavar='N',
+                       help='Meters polled per cycle, for the per-cycle estimate (default: 1)')
+
+    args = parser.parse_args()
+    response = sample_response()
+    request = response[:6]
+
+    # Every implementation must agree before timing anything
+    for data in (request, response[:-2], bytes(range(256))):
+        expected = crc16_bitwise(data)
+        assert pzem._crc16_table(data) == expected, "table CRC mismatch"
+        assert pzem.crc16_modbus(data) == expected, "crc16_modbus mismatch"
+    assert poll_before(0xF8, response) == poll_after(0xF8, response), "poll results differ"
+
+    backend = "crcmod C extension" if pzem._crc16_ext is not None else "lookup table"
+    print(f"📈 PZEM-004T protocol microbenchmark (crc16_modbus uses the {backend})")
+    print("=" * 72)
+    bitwise = bench("CRC16 bit-by-bit (25-byte response)", lambda: crc16_bitwise(response), args.number)
+    bench("CRC16 lookup table", lambda: pzem._crc16_table(response), args.number, bitwise)
+    if pzem._crc16_ext is not None:
+        bench("CRC16 crcmod C extension", lambda: pzem._crc16_ext(response), args.number, bitwise)
+    print("-" * 72)
+    before = bench("poll before (pack + 2 CRC + unpack)", lambda: poll_before(0xF8, response), args.number)
+    after = bench("poll after (cached frame + unpack_from)", lambda: poll_after(0xF8, response), args.number, before)
+    print("-" * 72)
+    print(f"CPU per cycle of {args.meters} meter(s): {before * args.meters:.1f} µs -> {after * args.meters:.1f} µs")
+
+if __name__ == "__main__":
+    main()
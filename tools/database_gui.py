@@ -87,9 +87,7 @@ class DatabaseGUI:
                 print(f"📅 Newest Measurement: {stats['newest_measurement']}")
                 
                 # Calculate data span
-                oldest = datetime.strptime(stats['oldest_measurement'], '%Y-%m-%d %H:%M:%S')
-                newest = datetime.strptime(stats['newest_measurement'], '%Y-%m-%d %H:%M:%S')
-                span = newest - oldest
+                span = timedelta(milliseconds=stats['newest_measurement_ms'] - stats['oldest_measurement_ms'])
                 print(f"⏱️  Data Span: {span.days} days, {span.seconds // 3600} hours")
             
         except Exception as e:
@@ -497,14 +495,8 @@ class DatabaseGUI:
             
             print(f"\n🔄 Querying data from {start_date} to {end_date}...")
             
-            # Get all data and filter by date
-            data = self.db.get_latest_measurements(10000)  # Get large number
-            
-            filtered_data = []
-            for record in data:
-                record_dt = datetime.strptime(record['timestamp'], '%Y-%m-%d %H:%M:%S')
-                if start_dt <= record_dt <= end_dt:
-                    filtered_data.append(record)
+            # Filter by date range in SQL (end date included)
+            filtered_data = self.db.get_measurements_range(start_dt, end_dt + timedelta(days=1))
             
             if not filtered_data:
                 print(f"❌ No data found for the specified date range")
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Load test for the PZEM-004T web API
+Measures /api/health latency (p50/p95/p99) while large exports are running,
+to check that slow requests do not stall the event loop
+"""
+
+import os
+import sys
+import argparse
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+def login(base_url, token):
+    """
+    Log in with the API token and return a URL opener holding the session cookie
+    
+    Args:
+        base_url: Server URL, e.g. http://localhost:8000
+        token: API_TOKEN of the server
+    """
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+    body = urllib.parse.urlencode({'password': token}).encode()
+    with opener.open(f"{base_url}/login", data=body, timeout=10) as response:
+        response.read()
+    return opener
+
+def percentile(values, pct):
+    """Return the pct-th percentile (nearest rank) of a list of numbers"""
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    rank = max(int(round(pct / 100 * len(ordered))) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+def sample_health(opener, base_url, duration, interval):
+    """
+    Request /api/health repeatedly and return the latencies in milliseconds
+    
+    Args:
+        opener: Logged-in URL opener
+        base_url: Server URL
+        duration: Seconds to sample for
+        interval: Pause between requests in seconds
+    """
+    latencies = []
+    errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            with opener.open(f"{base_url}/api/health", timeout=30) as response:
+                response.read()
+            latencies.append((time.perf_counter() - started) * 1000)
+        except Exception:
+            errors += 1
+        time.sleep(interval)
+    return latencies, errors
+
+def export_worker(opener, base_url, export_path, stop, counters):
+    """Download exports in a loop until stop is set"""
+    while not stop.is_set():
+        try:
+            with opener.open(f"{base_url}{export_path}", timeout=300) as response:
+                while response.read(65536):
+                    pass
+            counters['exports'] += 1
+        except Exception:
+            counters['export_errors'] += 1
+
+def print_latencies(label, latencies, errors):
+    """Print a one-line latency summary"""
+    print(f"{label:<26} n={len(latencies):<5} "
+          f"p50={percentile(latencies, 50):8.1f} ms  "
+          f"p95={percentile(latencies, 95):8.1f} ms  "
+          f"p99={percentile(latencies, 99):8.1f} ms  "
+          f"max={max(latencies, default=float('nan')):8.1f} ms  errors={errors}")
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(
+        description="Measure /api/health latency while large exports are running",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  # Against a local server (API_TOKEN read from the environment)
+  python load_test_api.py --url http://localhost:8000
+  
+  # 4 concurrent 100k-row CSV exports, fail if p99 exceeds 250 ms
+  python load_test_api.py --exports 4 --export-limit 100000 --max-p99 250
+        """
+    )
+    parser.add_argument('--url', default='http://localhost:8000',
+                       help='Server URL (default: http://localhost:8000)')
+    parser.add_argument('--token', default=os.environ.get('API_TOKEN'),
+                       help='API token used to log in (default: $API_TOKEN)')
+    parser.add_argument('--duration', type=float, default=10.0, metavar='SECONDS',
+                       help='Seconds to sample each phase (default: 10)')
+    parser.add_argument('--interval', type=float, default=0.05, metavar='SECONDS',
+                       help='Pause between health requests (default: 0.05)')
+    parser.add_argument('--exports', type=int, default=2, metavar='N',
+                       help='Concurrent export downloads during the load phase (default: 2)')
+    parser.add_argument('--export-limit', type=int, default=100000, metavar='N',
+                       help='Rows per export request (default: 100000)')
+    parser.add_argument('--format', choices=['csv', 'json'], default='csv',
+                       help='Export format (default: csv)')
+    parser.add_argument('--max-p99', type=float, metavar='MS',
+                       help='Exit with code 1 if p99 under load exceeds this many milliseconds')
+    
+    args = parser.parse_args()
+    if not args.token:
+        parser.error("--token or API_TOKEN is required")
+    
+    base_url = args.url.rstrip('/')
+    opener = login(base_url, args.token)
+    export_path = f"/api/export/{args.format}?limit={args.export_limit}"
+    
+    print("📈 /api/health latency")
+    print("=" * 100)
+    baseline, baseline_errors = sample_health(opener, base_url, args.duration, args.interval)
+    print_latencies("idle", baseline, baseline_errors)
+    
+    stop = threading.Event()
+    counters = {'exports': 0, 'export_errors': 0}
+    workers = [
+        threading.Thread(target=export_worker, args=(opener, base_url, export_path, stop, counters), daemon=True)
+        for _ in range(args.exports)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        loaded, loaded_errors = sample_health(opener, base_url, args.duration, args.interval)
+    finally:
+        stop.set()
+    
+    print_latencies(f"during {args.exports} x {args.format} export", loaded, loaded_errors)
+    print("-" * 100)
+    print(f"Exports completed: {counters['exports']}  failed: {counters['export_errors']}")
+    
+    if args.max_p99 is not None:
+        p99 = percentile(loaded, 99)
+        if not loaded or p99 > args.max_p99:
+            print(f"❌ p99 {p99:.1f} ms exceeds {args.max_p99:.1f} ms")
+            sys.exit(1)
+        print(f"✅ p99 {p99:.1f} ms within {args.max_p99:.1f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,7 @@ import json
 # Add src directory to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 from database import PZEMDatabase
+from columnar import write_columnar, COLUMNAR_FIELDS
 
 def export_to_csv(db, output_file=None, port=None, days=None, limit=None, separate_by_port=False, overwrite=True):
     """
@@ -50,26 +51,18 @@ def export_to_csv(db, output_file=None, port=None, days=None, limit=None, separa
                     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
                     filename = f"{csv_dir}/pzem_{port_clean}_{timestamp}.csv"
                 
-                # Get data for this port
-                data = db.get_measurements_by_port(port_name, limit or 1000)
+                # Get data for this port (filtered by days in SQL if specified)
+                since = datetime.now() - timedelta(days=days) if days else None
+                data = db.get_measurements_by_port(port_name, limit or 1000, since=since)
                 
                 if not data:
                     print(f"⚠️  No data found for port {port_name}")
                     continue
                 
-                # Filter by days if specified
-                if days:
-                    cutoff_date = datetime.now() - timedelta(days=days)
-                    data = [row for row in data if datetime.strptime(row['timestamp'], '%Y-%m-%d %H:%M:%S') >= cutoff_date]
-                
-                if not data:
-                    print(f"⚠️  No data in date range for port {port_name}")
-                    continue
-                
                 # Write to CSV
                 with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
                     fieldnames = ['timestamp', 'port', 'voltage', 'current', 'power', 'energy', 'frequency', 'power_factor', 'alarm_status']
-                    writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+                    writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction='ignore')
                     writer.writeheader()
                     writer.writerows(data)
                 
@@ -88,24 +81,21 @@ def export_to_csv(db, output_file=None, port=None, days=None, limit=None, separa
                     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
                     output_file = f"{csv_dir}/export_{timestamp}.csv"
             
+            # Filter by days in SQL if specified
+            since = datetime.now() - timedelta(days=days) if days else None
             if port:
-                data = db.get_measurements_by_port(port, limit or 1000)
+                data = db.get_measurements_by_port(port, limit or 1000, since=since)
             else:
-                data = db.get_latest_measurements(limit or 1000)
+                data = db.get_latest_measurements(limit or 1000, since=since)
             
             if not data:
                 print("❌ No data found for export")
                 return False
             
-            # Filter by days if specified
-            if days:
-                cutoff_date = datetime.now() - timedelta(days=days)
-                data = [row for row in data if datetime.strptime(row['timestamp'], '%Y-%m-%d %H:%M:%S') >= cutoff_date]
-            
             # Write to CSV
             with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
                 fieldnames = ['timestamp', 'port', 'voltage', 'current', 'power', 'energy', 'frequency', 'power_factor', 'alarm_status']
-                writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+                writer = csv.DictWriter(csvfile, fieldnames=fieldnames, extrasaction='ignore')
                 writer.writeheader()
                 writer.writerows(data)
             
@@ -151,22 +141,14 @@ def export_to_json(db, output_file=None, port=None, days=None, limit=None, separ
                     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
                     filename = f"{json_dir}/pzem_{port_clean}_{timestamp}.json"
                 
-                # Get data for this port
-                data = db.get_measurements_by_port(port_name, limit or 1000)
+                # Get data for this port (filtered by days in SQL if specified)
+                since = datetime.now() - timedelta(days=days) if days else None
+                data = db.get_measurements_by_port(port_name, limit or 1000, since=since)
                 
                 if not data:
                     print(f"⚠️  No data found for port {port_name}")
                     continue
                 
-                # Filter by days if specified
-                if days:
-                    cutoff_date = datetime.now() - timedelta(days=days)
-                    data = [row for row in data if datetime.strptime(row['timestamp'], '%Y-%m-%d %H:%M:%S') >= cutoff_date]
-                
-                if not data:
-                    print(f"⚠️  No data in date range for port {port_name}")
-                    continue
-                
                 # Write to JSON
                 with open(filename, 'w', encoding='utf-8') as jsonfile:
                     json.dump(data, jsonfile, indent=2, ensure_ascii=False)
@@ -186,20 +168,17 @@ def export_to_json(db, output_file=None, port=None, days=None, limit=None, separ
                     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
                     output_file = f"{json_dir}/export_{timestamp}.json"
             
+            # Filter by days in SQL if specified
+            since = datetime.now() - timedelta(days=days) if days else None
             if port:
-                data = db.get_measurements_by_port(port, limit or 1000)
+                data = db.get_measurements_by_port(port, limit or 1000, since=since)
             else:
-                data = db.get_latest_measurements(limit or 1000)
+                data = db.get_latest_measurements(limit or 1000, since=since)
             
             if not data:
                 print("❌ No data found for export")
                 return False
             
-            # Filter by days if specified
-            if days:
-                cutoff_date = datetime.now() - timedelta(days=days)
-                data = [row for row in data if datetime.strptime(row['timestamp'], '%Y-%m-%d %H:%M:%S') >= cutoff_date]
-            
             # Write to JSON
             with open(output_file, 'w', encoding='utf-8') as jsonfile:
                 json.dump(data, jsonfile, indent=2, ensure_ascii=False)
@@ -211,6 +190,43 @@ def export_to_json(db, output_file=None, port=None, days=None, limit=None, separ
         print(f"❌ Error exporting to JSON: {e}")
         return False
 
+def export_to_columnar(db, output_file, fmt='parquet', port=None, days=None, limit=None):
+    """
+    Export data to a compressed Parquet or Arrow IPC (Feather) file
+    
+    Rows are streamed from SQLite and written one row group at a time, so
+    the whole database can be archived with flat memory use.
+    
+    Args:
+        db: Database instance
+        output_file: Output file path
+        fmt: 'parquet' or 'arrow'
+        port: Filter by specific port
+        days: Number of days to look back
+        limit: Maximum number of records (default: all)
+    """
+    try:
+        directory = os.path.dirname(output_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        
+        since = datetime.now() - timedelta(days=days) if days else None
+        rows = db.iter_measurements_range(since, None, port=port, columns=COLUMNAR_FIELDS, limit=limit)
+        count = write_columnar(rows, output_file, fmt)
+        
+        if not count:
+            os.remove(output_file)
+            print("❌ No data found for export")
+            return False
+        
+        size_kb = os.path.getsize(output_file) / 1024
+        print(f"✅ Exported {count} records to {output_file} ({size_kb:,.1f} KB)")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Error exporting to {fmt}: {e}")
+        return False
+
 def show_sensor_summary(db):
     """Display sensor summary"""
     try:
@@ -246,15 +262,14 @@ def show_database_stats(db):
         print(f"📁 Database Size: {stats['database_size_mb']} MB")
         print(f"📊 Total Measurements: {stats['total_measurements']:,}")
         print(f"🔌 Total Sensors: {stats['total_sensors']}")
+        print(f"📦 Rollup Backlog: {stats['rollup_pending']:,} measurements")
         
         if stats['oldest_measurement'] and stats['newest_measurement']:
             print(f"📅 Oldest Measurement: {stats['oldest_measurement']}")
             print(f"📅 Newest Measurement: {stats['newest_measurement']}")
             
             # Calculate data span
-            oldest = datetime.strptime(stats['oldest_measurement'], '%Y-%m-%d %H:%M:%S')
-            newest = datetime.strptime(stats['newest_measurement'], '%Y-%m-%d %H:%M:%S')
-            span = newest - oldest
+            span = timedelta(milliseconds=stats['newest_measurement_ms'] - stats['oldest_measurement_ms'])
             print(f"⏱️  Data Span: {span.days} days, {span.seconds // 3600} hours")
             
     except Exception as e:
@@ -294,6 +309,29 @@ def cleanup_database(db, days_to_keep):
     except Exception as e:
         print(f"❌ Error cleaning up database: {e}")
 
+def rebuild_rollups(db):
+    """Recompute the 1m/1h/1d rollup tables from the raw measurements"""
+    try:
+        started = datetime.now()
+        aggregated = db.rebuild_rollups()
+        elapsed = (datetime.now() - started).total_seconds()
+        print(f"📦 Rebuilt rollups from {aggregated:,} measurement ids in {elapsed:.1f} s")
+        
+    except Exception as e:
+        print(f"❌ Error rebuilding rollups: {e}")
+
+def rebuild_counters(db):
+    """Recount the per-sensor measurement counters and latest values from the raw measurements"""
+    try:
+        started = datetime.now()
+        total = db.rebuild_sensor_counters()
+        sensors = db.rebuild_sensor_latest()
+        elapsed = (datetime.now() - started).total_seconds()
+        print(f"🔢 Recounted {total:,} measurements, latest values of {sensors} sensors in {elapsed:.1f} s")
+        
+    except Exception as e:
+        print(f"❌ Error rebuilding counters: {e}")
+
 def main():
     """Main function"""
     parser = argparse.ArgumentParser(
@@ -322,11 +360,23 @@ Examples:
   # Export each port to separate JSON files
   python query_database.py --export-json-separate --days 30
   
+  # Archive everything to a compressed Parquet file (pandas.read_parquet)
+  python query_database.py --export-parquet data/archive/pzem.parquet
+  
+  # Last 30 days as an Arrow/Feather file (pandas.read_feather)
+  python query_database.py --export-arrow pzem.arrow --days 30
+  
   # Do not overwrite existing files, create new ones with timestamp
   python query_database.py --export-csv-separate --no-overwrite --days 7
   
   # Clean up data older than 30 days
   python query_database.py --cleanup 30
+  
+  # Backfill the 1m/1h/1d rollup tables from existing measurements
+  python query_database.py --rebuild-rollups
+  
+  # Recount the per-sensor counters and latest values
+  python query_database.py --rebuild-counters
         """
     )
     
@@ -344,6 +394,10 @@ Examples:
                        help='Export each port to separate CSV files in data/csv_log/')
     parser.add_argument('--export-json-separate', action='store_true',
                        help='Export each port to separate JSON files in data/json_log/')
+    parser.add_argument('--export-parquet', metavar='FILE',
+                       help='Export data to a compressed Parquet file (all records unless --limit)')
+    parser.add_argument('--export-arrow', metavar='FILE',
+                       help='Export data to a compressed Arrow IPC/Feather file (all records unless --limit)')
     parser.add_argument('--port', metavar='PORT',
                        help='Filter by specific port (e.g., /dev/ttyUSB0)')
     parser.add_argument('--days', type=int, metavar='N',
@@ -352,6 +406,10 @@ Examples:
                        help='Limit number of records to export')
     parser.add_argument('--cleanup', type=int, metavar='DAYS',
                        help='Clean up data older than N days')
+    parser.add_argument('--rebuild-rollups', action='store_true',
+                       help='Recompute the 1m/1h/1d rollup tables from raw measurements')
+    parser.add_argument('--rebuild-counters', action='store_true',
+                       help='Recount the per-sensor counters and latest values from raw measurements')
     parser.add_argument('--no-overwrite', action='store_true',
                        help='Do not overwrite existing files, create new ones with timestamp instead')
     parser.add_argument('--db-path', metavar='PATH',
@@ -362,7 +420,9 @@ Examples:
     
     # Check if any action is specified
     if not any([args.stats, args.sensors, args.latest, args.export_csv, 
-                args.export_json, args.export_csv_separate, args.export_json_separate, args.cleanup]):
+                args.export_json, args.export_csv_separate, args.export_json_separate,
+                args.export_parquet, args.export_arrow, args.cleanup, args.rebuild_rollups,
+                args.rebuild_counters]):
         parser.print_help()
         return
     
@@ -396,8 +456,20 @@ Examples:
     if args.export_json_separate:
         export_to_json(db, None, args.port, args.days, args.limit, separate_by_port=True, overwrite=not args.no_overwrite)
     
+    if args.export_parquet:
+        export_to_columnar(db, args.export_parquet, 'parquet', args.port, args.days, args.limit)
+    
+    if args.export_arrow:
+        export_to_columnar(db, args.export_arrow, 'arrow', args.port, args.days, args.limit)
+    
     if args.cleanup:
         cleanup_database(db, args.cleanup)
+    
+    if args.rebuild_rollups:
+        rebuild_rollups(db)
+    
+    if args.rebuild_counters:
+        rebuild_counters(db)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -12,8 +12,9 @@ import sys
 
 # Import the PZEM-004T library and database module
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
-from pzem import PZEM004T
-from database import PZEMDatabase
+from pzem import PZEMSessionManager
+from database import PZEMDatabase, MeasurementWriter
+from notify import MeasurementNotifier, notify_socket_path
 
 def find_pzem_ports():
     """
@@ -38,19 +39,16 @@ def find_pzem_ports():
             
     return pzem_ports
 
-def read_pzem_data(port, db):
+def read_pzem_data(sessions, port):
     """
-    Connects to a PZEM sensor on a given port using the PZEM004T library,
-    reads its data, saves to database, and returns it as a dictionary.
+    Reads the PZEM sensor on a given port through its long-lived session
+    (the serial port stays open between cycles and is reopened after errors)
+    and returns the data as a dictionary.
     Returns None if failed.
     """
-    pzem = None
     try:
-        # Instantiate the PZEM sensor from our library
-        pzem = PZEM004T(port=port, timeout=2.0)
-
-        # Read all measurements from the sensor at once using the API
-        measurements = pzem.get_all_measurements()
+        # Read all measurements from the sensor at once (never stale cached values)
+        measurements = sessions.read_measurements(port)
         
         if measurements:
             # Convert energy from kWh to Wh for consistency
@@ -67,26 +65,16 @@ def read_pzem_data(port, db):
                 'alarm': measurements['alarm_status'],
                 'timestamp': datetime.now()
             }
-            
-            # Save to database
-            if db.save_measurement(sensor_data):
-                return sensor_data
-            else:
-                print(f"Failed to save data to database for {port}")
-                return None
+            return sensor_data
         else:
-            print(f"Could not read from {port}: Failed to get measurements.")
+            error = sessions.get(port).last_error or "Failed to get measurements"
+            print(f"Could not read from {port}: {error}.")
             return None
 
     except Exception as e:
         print(f"Could not read from {port}: {e}")
         return None
 
-    finally:
-        # Ensure the connection is always closed
-        if pzem:
-            pzem.close()
-
 def display_sensors_table(sensor_data_list):
     """
     Display sensor data in a formatted table
@@ -163,6 +151,27 @@ def display_database_stats(db):
     except Exception as e:
         print(f"Error getting database stats: {e}")
 
+def display_writer_stats(writer):
+    """
+    Display write-behind queue statistics
+    """
+    stats = writer.get_stats()
+    latency = stats['last_flush_latency_ms']
+    print(f"📝 Write queue: {stats['queue_depth']}/{stats['max_queue']} | "
+          f"Written: {stats['written']:,} | "
+          f"Last flush: {f'{latency:.1f} ms' if latency is not None else 'N/A'} | "
+          f"Dropped: {stats['dropped']} | Spilled: {stats['spilled']}")
+
+def display_session_stats(sessions):
+    """
+    Display serial session health (reconnects and failing ports)
+    """
+    stats = sessions.get_stats().values()
+    down = [s['port'] for s in stats if not s['healthy']]
+    print(f"🔗 Serial sessions: {sum(1 for s in stats if s['connected'])}/{len(stats)} open | "
+          f"Reconnects: {sum(max(s['connects'] - 1, 0) for s in stats)} | "
+          f"Unhealthy: {', '.join(down) if down else 'none'}")
+
 def cleanup_old_data(db, days_to_keep=30):
     """
     Clean up old data to manage database size
@@ -181,8 +190,8 @@ def main():
     print("🔌 PZEM-004T Power Monitoring with Database Storage")
     print("="*60)
     
-    # Initialize database
-    db = PZEMDatabase()
+    # Initialize database (long-lived WAL connections, see PZEMDatabase.DEFAULT_PRAGMAS)
+    db = PZEMDatabase(persistent=True)
     print(f"💾 Database initialized: {db.db_path}")
     
     # Find PZEM ports
@@ -205,6 +214,18 @@ def main():
     # Clean up old data (keep last 30 days)
     cleanup_old_data(db, days_to_keep=30)
     
+    # Tell the web server about every committed batch (no-op when it is not running)
+    notifier = MeasurementNotifier(notify_socket_path(db.db_path))
+    
+    # Background writer: every polling cycle is flushed as one batch; batch_size
+    # only groups a backlog (e.g. after a stall). Spills to disk if SQLite stalls
+    writer = MeasurementWriter(db, batch_size=max(len(pzem_ports), 1) * 4, flush_interval=5.0, overflow='spill',
+                               on_flush=notifier.notify)
+    writer.start()
+    
+    # One long-lived serial session per port, reused across polling cycles
+    sessions = PZEMSessionManager(timeout=2.0)
+    
     print(f"\n🚀 Starting monitoring... Press Ctrl+C to stop")
     print("-" * 60)
     
@@ -217,7 +238,7 @@ def main():
             # Create threads for each sensor
             for port in pzem_ports:
                 thread = threading.Thread(
-                    target=lambda p=port: sensor_data_list.append(read_pzem_data(p, db))
+                    target=lambda p=port: sensor_data_list.append(read_pzem_data(sessions, p))
                 )
                 threads.append(thread)
                 thread.start()
@@ -226,18 +247,34 @@ def main():
             for thread in threads:
                 thread.join()
             
+            # Hand the polling cycle to the background writer (never blocks on SQLite)
+            readings = [data for data in sensor_data_list if data is not None]
+            if readings and writer.put_many(readings) != len(readings):
+                print(f"Write queue full, dropped some of {len(readings)} measurements")
+            # Commit the cycle now (one transaction for all ports) instead of
+            # waiting for batch_size/flush_interval; timeout=0 does not wait
+            writer.flush(timeout=0)
+            
             # Display results
             display_sensors_table(sensor_data_list)
+            display_writer_stats(writer)
+            display_session_stats(sessions)
             
             # Wait before next reading
             time.sleep(5)
             
     except KeyboardInterrupt:
         print(f"\n\n🛑 Monitoring stopped by user")
+        writer.stop()
         print(f"💾 Final database statistics:")
         display_database_stats(db)
         print(f"\n📁 Database file: {db.db_path}")
         print(f"📊 You can query the database using SQLite tools or the provided API")
+    finally:
+        sessions.close_all()
+        writer.stop()
+        notifier.close()
+        db.close()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
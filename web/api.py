@@ -7,28 +7,37 @@ Provides REST API endpoints and web dashboard for data visualization
 import sys
 import os
 import asyncio
-import sqlite3
+import functools
+import hashlib
 import time
 from datetime import datetime, timedelta
-from typing import Optional, List, Dict, Any, Tuple
+from typing import Optional, List, Dict, Any, Tuple, Iterator, AsyncIterator, Callable, Awaitable
 import json
 import csv
-import tempfile
+import io
 from pathlib import Path
 from dotenv import load_dotenv
 
 # FastAPI imports
 from fastapi import FastAPI, HTTPException, Query, WebSocket, WebSocketDisconnect, Request, Depends, Form
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, StreamingResponse, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 import uvicorn
 from itsdangerous import URLSafeSerializer, BadSignature
 from collections import deque
+from itertools import islice, chain
+from concurrent.futures import ThreadPoolExecutor
 
 # Add src directory to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
-from database import PZEMDatabase
+from database import PZEMDatabase, to_epoch_ms, bucket_to_ms
+from downsample import downsample_records, load_chart_rows, DOWNSAMPLE_METHODS
+from notify import ChangeListener
+from cache import TTLCache
+from columnar import (iter_columnar, require_pyarrow, COLUMNAR_FIELDS, COLUMNAR_EXTENSIONS,
+                      COLUMNAR_MEDIA_TYPES, ROW_GROUP_SIZE)
  
 # Serial and device control imports
 try:
@@ -42,6 +51,12 @@ try:
 except Exception:
     PZEM004T = None  # Will check at runtime
 
+# Optional: without it (e.g. no asyncio fd readers) probes use PZEM004T in the device thread pool
+try:
+    from pzem_async import AsyncPZEM004T  # type: ignore
+except Exception:
+    AsyncPZEM004T = None
+
 # Initialize FastAPI app
 DISABLE_DOCS = os.environ.get("DISABLE_DOCS", "true").lower() in ("1", "true", "yes")
 
@@ -71,7 +86,25 @@ templates = Jinja2Templates(directory=str(templates_dir))
 
 # Initialize database
 db_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'pzem_data.db')
-database = PZEMDatabase(db_path)
+database = PZEMDatabase(db_path, persistent=True)
+
+# Bounded thread pools for blocking work: SQLite queries and serial port I/O
+# never run on the event loop, so one slow request cannot stall other clients
+# or the WebSockets. Each DB worker thread keeps its own persistent connection.
+DB_WORKERS = int(os.environ.get("DB_WORKERS", "4"))
+DEVICE_WORKERS = int(os.environ.get("DEVICE_WORKERS", "2"))
+db_executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="pzem-db")
+device_executor = ThreadPoolExecutor(max_workers=DEVICE_WORKERS, thread_name_prefix="pzem-device")
+
+async def run_db(func, *args, **kwargs):
+    """Run a blocking database call in the DB thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(db_executor, functools.partial(func, *args, **kwargs))
+
+async def run_device(func, *args, **kwargs):
+    """Run a blocking serial/device call in the device thread pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(device_executor, functools.partial(func, *args, **kwargs))
 
 # ===== Auth & security config =====
 API_TOKEN = os.environ.get("API_TOKEN")
@@ -103,19 +136,19 @@ async def session_auth_middleware(request: Request, call_next):
         path = request.url.path
         if path.startswith("/static/"):
             return await call_next(request)
-
+        
         # Login page and POST login are open
         if path in ("/login", "/logout") or path == "/":
             # Allow GET / to redirect if not logged-in; data API still protected below
             pass
-
+        
         # Protect all /api/* endpoints with session cookie
         if path.startswith("/api/"):
             session_cookie = request.cookies.get(SESSION_COOKIE_NAME)
             session = verify_session_token(session_cookie) if session_cookie else None
             if not session:
                 return JSONResponse(status_code=401, content={"success": False, "detail": "Unauthorized"})
-
+            
             # Basic anti-CSRF for state-changing methods: require custom header
             if request.method in ("POST", "PUT", "PATCH", "DELETE"):
                 if request.headers.get("X-Requested-With") != "XMLHttpRequest":
@@ -140,33 +173,99 @@ async def session_auth_middleware(request: Request, call_next):
         return JSONResponse(status_code=500, content={"success": False, "detail": str(e)})
 
 # WebSocket manager for real-time updates
+# Messages wait in a bounded queue per client and are sent by that client's own
+# task, so one slow or stalled client never delays the others. When a queue is
+# full its oldest message is dropped; the client is then sent a
+# "messages_dropped" notice before the next message, so a measurements
+# subscriber knows rows are missing and can fetch them from
+# /api/measurements/since instead of silently showing a gap.
+WS_SEND_QUEUE_SIZE = int(os.environ.get("WS_SEND_QUEUE_SIZE", "32"))
+
+class WebSocketSubscriber:
+    """One connected WebSocket with its send queue and sender task"""
+    
+    def __init__(self, websocket: WebSocket, channels: set):
+        self.websocket = websocket
+        self.channels = channels
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=WS_SEND_QUEUE_SIZE)
+        self.dropped = 0
+        # Drops not yet reported to the client
+        self.unreported_drops = 0
+        self.task: Optional[asyncio.Task] = None
+
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
-
-    async def connect(self, websocket: WebSocket):
+        self.active_connections: Dict[WebSocket, WebSocketSubscriber] = {}
+    
+    async def connect(self, websocket: WebSocket, channels: Tuple[str, ...] = ()):
+        """Accept a WebSocket; channels selects optional broadcasts it receives (e.g. measurements)"""
         await websocket.accept()
-        self.active_connections.append(websocket)
-
+        subscriber = WebSocketSubscriber(websocket, set(channels))
+        subscriber.task = asyncio.create_task(self._sender(subscriber))
+        self.active_connections[websocket] = subscriber
+    
     def disconnect(self, websocket: WebSocket):
-        self.active_connections.remove(websocket)
-
+        subscriber = self.active_connections.pop(websocket, None)
+        if subscriber and subscriber.task:
+            subscriber.task.cancel()
+    
+    def subscriber_count(self, channel: Optional[str] = None) -> int:
+        """Number of connected clients (subscribed to channel, if given)"""
+        if channel is None:
+            return len(self.active_connections)
+        return sum(1 for s in self.active_connections.values() if channel in s.channels)
+    
+    async def _sender(self, subscriber: WebSocketSubscriber):
+        """Send one client's queued messages in order"""
+        try:
+            while True:
+                message = await subscriber.queue.get()
+                if subscriber.unreported_drops:
+                    notice = json.dumps({"type": "messages_dropped", "count": subscriber.unreported_drops})
+                    subscriber.unreported_drops = 0
+                    await subscriber.websocket.send_text(notice)
+                await subscriber.websocket.send_text(message)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Client went away; forget it without touching the others
+            self.active_connections.pop(subscriber.websocket, None)
+    
+    @staticmethod
+    def _enqueue(subscriber: WebSocketSubscriber, message: str):
+        if subscriber.queue.full():
+            subscriber.queue.get_nowait()
+            subscriber.dropped += 1
+            subscriber.unreported_drops += 1
+        subscriber.queue.put_nowait(message)
+    
     async def send_personal_message(self, message: str, websocket: WebSocket):
-        await websocket.send_text(message)
-
-    async def broadcast(self, message: str):
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except:
-                # Remove disconnected connections
-                self.active_connections.remove(connection)
+        subscriber = self.active_connections.get(websocket)
+        if subscriber:
+            self._enqueue(subscriber, message)
+    
+    async def broadcast(self, message: str, channel: Optional[str] = None):
+        """Queue a message for every client (or only those subscribed to channel); never waits on a client"""
+        # Iterate over a snapshot: clients may disconnect meanwhile
+        for subscriber in list(self.active_connections.values()):
+            if channel is None or channel in subscriber.channels:
+                self._enqueue(subscriber, message)
+    
+    async def close_all(self):
+        """Stop every sender task (app shutdown)"""
+        subscribers = list(self.active_connections.values())
+        self.active_connections.clear()
+        for subscriber in subscribers:
+            if subscriber.task:
+                subscriber.task.cancel()
+        await asyncio.gather(*(s.task for s in subscribers if s.task), return_exceptions=True)
 
 manager = ConnectionManager()
 
 # Global variable to store last known USB port status
 _last_usb_status = {}
 _monitoring_task = None
+_realtime_task = None
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
@@ -177,13 +276,15 @@ async def websocket_endpoint(websocket: WebSocket):
     if not session:
         await websocket.close(code=1008)
         return
-
+    
     await manager.connect(websocket)
     try:
         while True:
             # Keep connection alive
             await websocket.receive_text()
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket)
 
 # ===== WEB DASHBOARD ROUTES =====
@@ -233,7 +334,7 @@ async def login_submit(request: Request, password: str = Form(...)):
     if len(q) >= LOGIN_MAX_ATTEMPTS:
         return JSONResponse(status_code=429, content={"success": False, "detail": "Too many attempts. Try later."})
     q.append(now)
-
+    
     if password != API_TOKEN:
         return JSONResponse(status_code=401, content={"success": False, "detail": "Invalid password"})
     token = create_session_token("admin")
@@ -257,15 +358,86 @@ async def logout_submit():
 
 # ===== API ROUTES =====
 
+# ===== RESPONSE CACHE =====
+
+# Computed results (stats, sensor summary, dashboard payloads) shared by
+# concurrent requests. realtime_producer clears it as soon as new measurements
+# are committed, so the TTL only bounds staleness for other writers.
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", "5"))
+response_cache = TTLCache(default_ttl=RESPONSE_CACHE_TTL)
+
+async def cached_db(key: Tuple, func, *args):
+    """Cached result of a blocking database call; concurrent callers share one query"""
+    return await response_cache.get(key, functools.partial(run_db, func, *args))
+
+async def cached_database_stats() -> Dict[str, Any]:
+    return await cached_db(("stats",), database.get_database_stats)
+
+async def cached_sensor_summary() -> List[Dict]:
+    return await cached_db(("sensors",), database.get_sensor_summary)
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    """Response cache hit/miss counters"""
+    return {
+        "success": True,
+        "data": response_cache.stats()
+    }
+
+# ===== CONDITIONAL GET (ETag) =====
+
+def _make_etag(version: str, *parts: Any) -> str:
+    """Strong ETag for a response derived from the database data version"""
+    digest = hashlib.sha1("|".join([version, *map(str, parts)]).encode()).hexdigest()
+    return f'"{digest[:24]}"'
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match lists etag (or is *)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+async def _conditional_json(request: Request, build: Callable[[], Awaitable[Any]], *etag_parts: Any) -> Response:
+    """
+    Return build()'s payload with an ETag, or 304 Not Modified if the client
+    already has it
+    
+    The ETag comes from PZEMDatabase.get_data_version, which changes with every
+    new measurement, cleanup or sensors update. The version is read before
+    build() runs: a change in between only makes the next poll fetch again,
+    never hides new data. The encoded body and its version are kept in
+    response_cache, so concurrent dashboards share one build and a cache hit
+    costs no query at all.
+    """
+    key = (request.url.path, request.url.query, *etag_parts)
+    
+    async def render() -> Tuple[str, bytes]:
+        version = await run_db(database.get_data_version)
+        payload = await build()
+        body = json.dumps(jsonable_encoder(payload), ensure_ascii=False, separators=(",", ":"))
+        return version, body.encode("utf-8")
+    
+    version, body = await response_cache.get(key, render)
+    etag = _make_etag(version, *key)
+    # no-cache: browsers may store the response but must revalidate it every time
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @app.get("/api/stats")
-async def get_database_stats():
-    """Get database statistics"""
+async def get_database_stats(request: Request):
+    """Get database statistics (supports If-None-Match)"""
     try:
-        stats = database.get_database_stats()
-        return {
-            "success": True,
-            "data": stats
-        }
+        async def build():
+            return {
+                "success": True,
+                "data": await cached_database_stats()
+            }
+        
+        return await _conditional_json(request, build)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -327,11 +499,11 @@ def _reset_pzem_isolated(port: str, target_address: Optional[int], verify_reset:
             if target_address is not None
             else PZEM004T(port=port, timeout=1.0)
         )
-
+        
         before = device.get_all_measurements()
         energy_before = before.get("energy", 0.0) if before else 0.0
         result["energy_before"] = energy_before
-
+        
         success = False
         for _ in range(3):
             try:
@@ -342,22 +514,22 @@ def _reset_pzem_isolated(port: str, target_address: Optional[int], verify_reset:
             except Exception as exc:  # noqa: BLE001
                 result["error"] = str(exc)
                 time.sleep(0.3)
-
+        
         if not success:
             result["success"] = False
             return result
-
+        
         # Allow device time to process
         time.sleep(1.0)
-
+        
         after = device.get_all_measurements()
         energy_after = after.get("energy", 0.0) if after else 0.0
         result["energy_after"] = energy_after
-
+        
         if not verify_reset:
             result["success"] = True
             return result
-
+        
         result["success"] = (energy_after < energy_before) or (energy_after == 0.0)
         if not result["success"] and result["error"] is None:
             result["error"] = "Không xác minh được reset (năng lượng không giảm)"
@@ -377,7 +549,7 @@ def _reset_all_pzems_sequential(verify_reset: bool) -> Dict[str, Any]:
     detected = _find_pzem_ports()
     if not detected:
         raise HTTPException(status_code=404, detail="Không phát hiện thiết bị PZEM nào")
-
+    
     devices_info: List[Dict[str, Any]] = []
     for p in detected:
         addr, eng, ok, err = _get_pzem_info(p)
@@ -385,14 +557,14 @@ def _reset_all_pzems_sequential(verify_reset: bool) -> Dict[str, Any]:
             devices_info.append({"port": p, "address": addr, "energy": eng})
         else:
             devices_info.append({"port": p, "address": None, "energy": 0.0, "error": err, "skipped": True})
-
+    
     valid = [d for d in devices_info if not d.get("skipped")]
     if not valid:
         raise HTTPException(status_code=404, detail="Không có thiết bị PZEM hợp lệ")
-
+    
     addresses = [d["address"] for d in valid if d.get("address") is not None]
     duplicate_addresses = [a for a in set(addresses) if addresses.count(a) > 1]
-
+    
     results: List[Dict[str, Any]] = []
     for dev in valid:
         res = _reset_pzem_isolated(dev["port"], dev.get("address"), verify_reset)
@@ -402,7 +574,7 @@ def _reset_all_pzems_sequential(verify_reset: bool) -> Dict[str, Any]:
             time.sleep(2.0)
         else:
             time.sleep(1.0)
-
+    
     total = len(results)
     success_count = sum(1 for r in results if r.get("success"))
     fail_count = total - success_count
@@ -421,7 +593,7 @@ def _reset_all_pzems_sequential(verify_reset: bool) -> Dict[str, Any]:
 async def get_database_stats_detailed():
     """Get detailed database statistics (alternative endpoint)"""
     try:
-        stats = database.get_database_stats()
+        stats = await cached_database_stats()
         return {
             "success": True,
             "data": stats
@@ -430,14 +602,30 @@ async def get_database_stats_detailed():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/sensors")
-async def get_sensors():
-    """Get sensor summary"""
+async def get_sensors(request: Request):
+    """Get sensor summary (supports If-None-Match)"""
     try:
-        sensors = database.get_sensor_summary()
-        return {
-            "success": True,
-            "data": sensors
-        }
+        async def build():
+            return {
+                "success": True,
+                "data": await cached_sensor_summary()
+            }
+        
+        return await _conditional_json(request, build)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/latest")
+async def get_latest_per_sensor(request: Request):
+    """Get the newest measurement of every sensor (supports If-None-Match)"""
+    try:
+        async def build():
+            return {
+                "success": True,
+                "data": await run_db(database.get_latest_per_sensor)
+            }
+        
+        return await _conditional_json(request, build)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -446,28 +634,60 @@ async def get_measurements(
     limit: int = Query(100, description="Number of measurements to return"),
     port: Optional[str] = Query(None, description="Filter by sensor port"),
     days: Optional[int] = Query(None, description="Filter by last N days"),
-    sensor_id: Optional[int] = Query(None, description="Filter by sensor ID")
+    sensor_id: Optional[int] = Query(None, description="Filter by sensor ID"),
+    before: Optional[str] = Query(None, description="Cursor: return measurements older than this (next page)"),
+    after: Optional[str] = Query(None, description="Cursor: return measurements newer than this"),
+    since_id: Optional[int] = Query(None, description="Only measurements added after this id (last_id of a previous response)"),
+    since_ts: Optional[str] = Query(None, description="Only measurements newer than this time (epoch ms or ISO)")
 ):
-    """Get measurements with optional filtering"""
+    """Get measurements with optional filtering
+    
+    Keyset pagination: pass `next_cursor` from the previous response as `before`
+    to get the next (older) page, or as `after` when paging towards newer data.
+    
+    Polling: pass `last_id` from the previous response as `since_id` to get
+    only the rows added since then; `has_more` means another call is needed.
+    """
     try:
-        if port:
-            data = database.get_measurements_by_port(port, limit)
-        else:
-            data = database.get_latest_measurements(limit)
+        if since_id is not None or since_ts is not None:
+            try:
+                delta = await run_db(database.get_measurements_since, since_id, since_ts,
+                                     port=port, limit=limit)
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            
+            return {
+                "success": True,
+                "data": delta['data'],
+                "count": len(delta['data']),
+                "last_id": delta['last_id'],
+                "has_more": delta['has_more']
+            }
+        
+        # Filter by date in SQL if specified
+        since = datetime.now() - timedelta(days=days) if days else None
         
-        # Filter by date if specified
-        if days:
-            cutoff_date = datetime.now() - timedelta(days=days)
-            data = [
-                record for record in data 
-                if datetime.strptime(record['timestamp'], '%Y-%m-%d %H:%M:%S') >= cutoff_date
-            ]
+        def load_page():
+            # Read last_id first: rows added meanwhile are returned again by
+            # the next since_id call rather than missed
+            last_id = database.get_last_measurement_id()
+            return database.get_measurements_page(limit, before=before, after=after,
+                                                  port=port, since=since), last_id
+        
+        try:
+            page, last_id = await run_db(load_page)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         return {
             "success": True,
-            "data": data,
-            "count": len(data)
+            "data": page['data'],
+            "count": len(page['data']),
+            "next_cursor": page['next_cursor'],
+            "last_id": last_id
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -479,13 +699,13 @@ def reset_energy(
     verify: bool = Query(True, description="Xác minh sau reset bằng cách đọc lại năng lượng"),
 ):
     """Reset bộ đếm năng lượng trên thiết bị PZEM-004T.
-
+    
     - Nếu cung cấp `port`: reset thiết bị trên cổng đó.
     - Nếu không: reset tất cả thiết bị tìm thấy tuần tự.
     """
     try:
         _ensure_device_libs_available()
-
+        
         if port:
             # Optional: quick validation that port exists
             available_ports = [p.device for p in serial.tools.list_ports.comports()]
@@ -494,11 +714,11 @@ def reset_energy(
                 note = "Cổng không nằm trong danh sách phát hiện. Vẫn thử reset."
             else:
                 note = None
-
+            
             addr, energy, ok, err = _get_pzem_info(port)
             if not ok:
                 raise HTTPException(status_code=404, detail=f"Không thể kết nối tới {port}: {err}")
-
+            
             res = _reset_pzem_isolated(port, addr, verify)
             return {
                 "success": res.get("success", False),
@@ -507,7 +727,7 @@ def reset_energy(
                 "data": res,
                 "timestamp": datetime.now().isoformat(),
             }
-
+        
         # Reset all devices
         batch = _reset_all_pzems_sequential(verify)
         return {
@@ -525,9 +745,17 @@ def reset_energy(
 async def get_measurements_by_date_range(
     start_date: str = Query(..., description="Start date (YYYY-MM-DD)"),
     end_date: str = Query(..., description="End date (YYYY-MM-DD)"),
-    port: Optional[str] = Query(None, description="Filter by sensor port")
+    port: Optional[str] = Query(None, description="Filter by sensor port"),
+    max_points: Optional[int] = Query(None, ge=10, description="Downsample to at most N points per sensor (for charts)"),
+    downsample: str = Query("lttb", description="Downsampling method: lttb or minmax")
 ):
-    """Get measurements within a date range"""
+    """Get measurements within a date range
+    
+    With max_points the result is chart data (CHART_COLUMNS, see
+    load_chart_rows): long ranges come from the rollup tables as bucket
+    averages instead of loading every measurement. Without it every
+    measurement of the range is returned.
+    """
     try:
         # Validate dates
         try:
@@ -536,23 +764,28 @@ async def get_measurements_by_date_range(
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
         
-        # Get data
-        if port:
-            data = database.get_measurements_by_port(port, 10000)  # Large limit
-        else:
-            data = database.get_latest_measurements(10000)
+        if downsample not in DOWNSAMPLE_METHODS:
+            raise HTTPException(status_code=400, detail=f"downsample must be one of: {', '.join(DOWNSAMPLE_METHODS)}")
+        
+        def load_range():
+            # last_id before the query, see get_measurements
+            last_id = database.get_last_measurement_id()
+            if max_points:
+                rows, total = load_chart_rows(database, start_dt, end_dt, port, max_points, downsample)
+            else:
+                # Filter by date range in SQL (no row limit, so long ranges are complete)
+                rows = database.get_measurements_range(start_dt, end_dt, port=port)
+                total = len(rows)
+            return rows, total, last_id
         
-        # Filter by date range
-        filtered_data = []
-        for record in data:
-            record_dt = datetime.strptime(record['timestamp'], '%Y-%m-%d %H:%M:%S')
-            if start_dt <= record_dt <= end_dt:
-                filtered_data.append(record)
+        filtered_data, total_count, last_id = await run_db(load_range)
         
         return {
             "success": True,
             "data": filtered_data,
             "count": len(filtered_data),
+            "total_count": total_count,
+            "last_id": last_id,
             "date_range": {
                 "start": start_date,
                 "end": end_date
@@ -563,99 +796,174 @@ async def get_measurements_by_date_range(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/api/dashboard")
-async def get_dashboard_data(
-    port: Optional[str] = Query(None, description="Filter by sensor port"),
-    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
-    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)")
+# Upper bound on buckets per series for /api/aggregate
+MAX_AGGREGATE_BUCKETS = 10000
+
+@app.get("/api/aggregate")
+async def get_aggregate(
+    port: Optional[str] = Query(None, description="Filter by sensor port (default: one series per sensor)"),
+    start: Optional[str] = Query(None, description="Start, ISO date/time or epoch ms (default: end - 24h)"),
+    end: Optional[str] = Query(None, description="End (exclusive), ISO date/time or epoch ms (default: now)"),
+    bucket: str = Query("1h", description="Bucket size, e.g. 5m, 1h, 1d"),
+    metrics: Optional[str] = Query(None, description="Comma separated: voltage,current,power,frequency,power_factor,energy")
 ):
-    """Get comprehensive dashboard data, optionally filtered by sensor"""
+    """Get bucketed min/max/avg statistics computed in SQL
+    
+    Buckets that are multiples of 1m/1h/1d are served from the rollup tables.
+    Each series is returned as parallel arrays (timestamps, count,
+    <metric>_min/_max/_avg, energy_first/_last/_delta), not row dicts.
+    """
     try:
-        # Get all dashboard data in one call
-        stats = database.get_database_stats()
-        sensors = database.get_sensor_summary()
+        try:
+            bucket_ms = bucket_to_ms(bucket)
+            end_ms = to_epoch_ms(end) if end else int(time.time() * 1000)
+            start_ms = to_epoch_ms(start) if start else end_ms - 24 * 3600 * 1000
+            metric_list = [m.strip() for m in metrics.split(',') if m.strip()] if metrics else None
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        # Get measurements - filtered by port if specified
-        if port:
-            latest_measurements = database.get_measurements_by_port(port, 50)
-            # Filter sensors to only include the selected one
-            selected_sensors = [s for s in sensors if s['port'] == port]
-        else:
-            latest_measurements = database.get_latest_measurements(50)
-            selected_sensors = sensors
+        if start_ms >= end_ms:
+            raise HTTPException(status_code=400, detail="start must be before end")
+        if (end_ms - start_ms) // bucket_ms > MAX_AGGREGATE_BUCKETS:
+            raise HTTPException(status_code=400,
+                                detail=f"Too many buckets (max {MAX_AGGREGATE_BUCKETS}); use a larger bucket")
         
-        # Calculate summary statistics for selected data
-        if latest_measurements:
-            if port:
-                # Single sensor - latest_measurements already filtered by port from database
-                # Take the most recent measurement (first item, already sorted by timestamp DESC)
-                latest = latest_measurements[0]
-                total_power = latest['power'] if latest['power'] is not None else 0.0
-                total_energy = latest['energy'] if latest['energy'] is not None else 0.0
-                avg_voltage = latest['voltage'] if latest['voltage'] is not None else 0.0
-                sensor_count = 1
-            else:
-                # All sensors - aggregate data from all sensors
-                # Group by port to get latest measurement per sensor for power calculation
-                sensor_latest = {}
-                for m in latest_measurements:
-                    if m['port'] not in sensor_latest:
-                        sensor_latest[m['port']] = m
-                
-                total_power = sum(m['power'] for m in sensor_latest.values() if m['power'])
-                total_energy = sum(m['energy'] for m in sensor_latest.values() if m['energy'])
-                avg_voltage = sum(m['voltage'] for m in sensor_latest.values() if m['voltage']) / len(sensor_latest) if sensor_latest else 0
-                sensor_count = len(selected_sensors)
-        else:
-            total_power = 0
-            total_energy = 0
-            avg_voltage = 0
-            sensor_count = len(selected_sensors)
+        try:
+            result = await run_db(database.get_aggregates, bucket_ms, start_ms, end_ms,
+                                  port=port, metrics=metric_list)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        # Build chart data
-        chart_data: List[Dict]
-        if start_date and end_date:
-            # If date range is provided, return full data for that range
-            try:
-                start_dt = datetime.strptime(start_date, '%Y-%m-%d')
-                end_dt = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
-            except ValueError:
-                raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
-
-            # Pull a large window then filter by date range
-            if port:
-                range_source = database.get_measurements_by_port(port, 100000)
-            else:
-                range_source = database.get_latest_measurements(100000)
+        return {
+            "success": True,
+            "bucket": bucket,
+            "bucket_ms": bucket_ms,
+            "start_ms": start_ms,
+            "end_ms": end_ms,
+            "source": result['source'],
+            "series": result['series']
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-            chart_data = [
-                r for r in range_source
-                if start_dt <= datetime.strptime(r['timestamp'], '%Y-%m-%d %H:%M:%S') <= end_dt
-            ]
+def _build_dashboard_data(port: Optional[str], start_date: Optional[str], end_date: Optional[str],
+                          max_points: int, downsample: str, stats: Dict[str, Any],
+                          sensors: List[Dict]) -> Dict[str, Any]:
+    """
+    Collect the /api/dashboard payload (blocking; runs in the DB thread pool)
+    
+    stats and sensors come from the response cache, shared with /api/stats
+    and /api/sensors.
+    """
+    # Newest measurement of every sensor, however long ago it last reported
+    latest_per_sensor = database.get_latest_per_sensor()
+    
+    # Get measurements - filtered by port if specified
+    if port:
+        latest_measurements = database.get_measurements_by_port(port, 50)
+        # Filter sensors to only include the selected one
+        selected_sensors = [s for s in sensors if s['port'] == port]
+        latest_per_sensor = [m for m in latest_per_sensor if m['port'] == port]
+    else:
+        latest_measurements = database.get_latest_measurements(50)
+        selected_sensors = sensors
+    
+    # Calculate summary statistics for selected data
+    if latest_per_sensor:
+        if port:
+            # Single sensor - its latest measurement
+            latest = latest_per_sensor[0]
+            total_power = latest['power'] if latest['power'] is not None else 0.0
+            total_energy = latest['energy'] if latest['energy'] is not None else 0.0
+            avg_voltage = latest['voltage'] if latest['voltage'] is not None else 0.0
+            sensor_count = 1
         else:
-            # Default: last 24 hours from the available latest measurements
-            cutoff_time = datetime.now() - timedelta(hours=24)
-            chart_data = [
-                record for record in latest_measurements 
-                if datetime.strptime(record['timestamp'], '%Y-%m-%d %H:%M:%S') >= cutoff_time
-            ]
+            # All sensors - aggregate the latest measurement of each sensor
+            total_power = sum(m['power'] for m in latest_per_sensor if m['power'])
+            total_energy = sum(m['energy'] for m in latest_per_sensor if m['energy'])
+            avg_voltage = sum(m['voltage'] for m in latest_per_sensor if m['voltage']) / len(latest_per_sensor)
+            sensor_count = len(selected_sensors)
+    else:
+        total_power = 0
+        total_energy = 0
+        avg_voltage = 0
+        sensor_count = len(selected_sensors)
+    
+    # Build chart data
+    chart_data: List[Dict]
+    if start_date and end_date:
+        # If date range is provided, return full data for that range
+        try:
+            start_dt = datetime.strptime(start_date, '%Y-%m-%d')
+            end_dt = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
         
-        return {
-            "success": True,
-            "data": {
-                "stats": stats,
-                "sensors": sensors,
-                "latest_measurements": latest_measurements,
-                "summary": {
-                    "total_power": total_power,
-                    "total_energy": total_energy,
-                    "avg_voltage": avg_voltage,
-                    "sensor_count": sensor_count,
-                    "selected_port": port
-                },
-                "chart_data": chart_data
-            }
+        chart_data, chart_points_total = load_chart_rows(database, start_dt, end_dt, port, max_points, downsample)
+    else:
+        # Default: last 24 hours from the available latest measurements
+        cutoff_ms = to_epoch_ms(datetime.now() - timedelta(hours=24))
+        chart_data = [
+            record for record in latest_measurements 
+            if record['timestamp_ms'] >= cutoff_ms
+        ]
+        chart_points_total = len(chart_data)
+        chart_data = downsample_records(chart_data, max_points, method=downsample)
+    
+    return {
+        "success": True,
+        "data": {
+            "stats": stats,
+            "sensors": sensors,
+            "latest_measurements": latest_measurements,
+            "latest_per_sensor": latest_per_sensor,
+            "summary": {
+                "total_power": total_power,
+                "total_energy": total_energy,
+                "avg_voltage": avg_voltage,
+                "sensor_count": sensor_count,
+                "selected_port": port
+            },
+            "chart_data": chart_data,
+            "chart_points_total": chart_points_total
         }
+    }
+
+@app.get("/api/dashboard")
+async def get_dashboard_data(
+    request: Request,
+    port: Optional[str] = Query(None, description="Filter by sensor port"),
+    start_date: Optional[str] = Query(None, description="Start date (YYYY-MM-DD)"),
+    end_date: Optional[str] = Query(None, description="End date (YYYY-MM-DD)"),
+    max_points: int = Query(1000, ge=10, le=20000, description="Maximum chart points per sensor"),
+    downsample: str = Query("lttb", description="Downsampling method: lttb or minmax")
+):
+    """Get comprehensive dashboard data, optionally filtered by sensor
+    
+    chart_data is downsampled server-side to at most max_points per sensor
+    (Largest-Triangle-Three-Buckets on power, or min/max per bucket), so the
+    payload stays bounded whatever the date range; very long date ranges are
+    downsampled from the rollup tables (see load_chart_rows).
+    
+    Supports If-None-Match. Without a date range the chart covers the last
+    24 hours, which moves with the clock, so that ETag also changes every minute.
+    """
+    try:
+        if downsample not in DOWNSAMPLE_METHODS:
+            raise HTTPException(status_code=400, detail=f"downsample must be one of: {', '.join(DOWNSAMPLE_METHODS)}")
+        
+        clock = None if (start_date and end_date) else int(time.time() // 60)
+        async def build():
+            stats = await cached_database_stats()
+            sensors = await cached_sensor_summary()
+            return await run_db(_build_dashboard_data, port, start_date, end_date,
+                                max_points, downsample, stats, sensors)
+        
+        return await _conditional_json(request, build, clock)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -664,16 +972,16 @@ async def get_sensor_stats(sensor_id: int):
     """Get statistics for a specific sensor"""
     try:
         # Get sensor info
-        sensors = database.get_sensor_summary()
+        sensors = await cached_sensor_summary()
         sensor = next((s for s in sensors if s.get('id') == sensor_id), None)
         
         if not sensor:
             raise HTTPException(status_code=404, detail="Sensor not found")
         
-        # Get recent measurements for this sensor
-        measurements = database.get_measurements_by_port(sensor['port'], 1000)
+        # Statistics over the latest 1000 measurements, computed in SQL
+        stats = await run_db(database.get_recent_stats, sensor['port'], 1000)
         
-        if not measurements:
+        if not stats['measurement_count']:
             return {
                 "success": True,
                 "data": {
@@ -683,38 +991,12 @@ async def get_sensor_stats(sensor_id: int):
                 }
             }
         
-        # Calculate statistics
-        voltages = [m['voltage'] for m in measurements if m['voltage']]
-        currents = [m['current'] for m in measurements if m['current']]
-        powers = [m['power'] for m in measurements if m['power']]
-        energies = [m['energy'] for m in measurements if m['energy']]
-        
-        stats = {
-            "voltage": {
-                "min": min(voltages) if voltages else 0,
-                "max": max(voltages) if voltages else 0,
-                "avg": sum(voltages) / len(voltages) if voltages else 0
-            },
-            "current": {
-                "min": min(currents) if currents else 0,
-                "max": max(currents) if currents else 0,
-                "avg": sum(currents) / len(currents) if currents else 0
-            },
-            "power": {
-                "min": min(powers) if powers else 0,
-                "max": max(powers) if powers else 0,
-                "avg": sum(powers) / len(powers) if powers else 0
-            },
-            "total_energy": sum(energies) if energies else 0,
-            "measurement_count": len(measurements)
-        }
-        
         return {
             "success": True,
             "data": {
                 "sensor": sensor,
                 "stats": stats,
-                "recent_data": measurements[:20]  # Last 20 measurements
+                "recent_data": await run_db(database.get_measurements_by_port, sensor['port'], 20)
             }
         }
     except HTTPException:
@@ -750,46 +1032,75 @@ def generate_export_filename(format_ext: str, port: Optional[str] = None, days:
     
     return filename
 
+# Rows fetched from SQLite and rendered per streamed chunk
+EXPORT_CHUNK_SIZE = 1000
+
+def _open_export(port: Optional[str], days: Optional[int], limit: Optional[int],
+                 columns: Optional[List[str]] = None) -> Tuple[Iterator[Dict], List[Dict]]:
+    """Start an export query and read its first chunk (blocking; runs in the DB thread pool)"""
+    since = datetime.now() - timedelta(days=days) if days else None
+    rows = database.iter_measurements_range(since, None, port=port, columns=columns, limit=limit,
+                                            chunk_size=EXPORT_CHUNK_SIZE)
+    return rows, list(islice(rows, EXPORT_CHUNK_SIZE))
+
+async def _stream_export(rows: Iterator[Dict], first_chunk: List[Dict],
+                         render: Callable[[List[Dict], bool], str]) -> AsyncIterator[Tuple[int, str]]:
+    """Yield (row count, text) per chunk; chunks are fetched and rendered in the DB thread pool"""
+    def next_chunk() -> Tuple[int, str]:
+        chunk = list(islice(rows, EXPORT_CHUNK_SIZE))
+        return len(chunk), render(chunk, False) if chunk else ''
+    
+    try:
+        yield len(first_chunk), await run_db(render, first_chunk, True)
+        while True:
+            count, text = await run_db(next_chunk)
+            if not count:
+                break
+            yield count, text
+    finally:
+        # Closes the export's SQLite connection, also when the client disconnects
+        rows.close()
+
+def _export_response(content: AsyncIterator[str], media_type: str, filename: str) -> StreamingResponse:
+    """Stream an export as a file download"""
+    return StreamingResponse(
+        content,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
 @app.get("/api/export/csv")
 async def export_csv(
     port: Optional[str] = Query(None, description="Filter by sensor port"),
     days: Optional[int] = Query(None, description="Filter by last N days"),
-    limit: Optional[int] = Query(None, description="Limit number of records")
+    limit: Optional[int] = Query(None, description="Limit number of records (default: all)")
 ):
-    """Export data to CSV file"""
+    """Export data to CSV, streamed straight from the database cursor"""
     try:
-        # Get data
-        if port:
-            data = database.get_measurements_by_port(port, limit or 10000)
-        else:
-            data = database.get_latest_measurements(limit or 10000)
-        
-        # Filter by date if specified
-        if days:
-            cutoff_date = datetime.now() - timedelta(days=days)
-            data = [
-                record for record in data 
-                if datetime.strptime(record['timestamp'], '%Y-%m-%d %H:%M:%S') >= cutoff_date
-            ]
+        rows, first_chunk = await run_db(_open_export, port, days, limit)
         
-        if not data:
+        if not first_chunk:
+            rows.close()
             raise HTTPException(status_code=404, detail="No data found")
         
-        # Create temporary CSV file
-        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.csv', newline='') as temp_file:
-            writer = csv.DictWriter(temp_file, fieldnames=data[0].keys())
-            writer.writeheader()
-            writer.writerows(data)
-            temp_filename = temp_file.name
+        fieldnames = list(first_chunk[0].keys())
+        
+        def render(chunk: List[Dict], first: bool) -> str:
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=fieldnames)
+            if first:
+                writer.writeheader()
+            writer.writerows(chunk)
+            return buffer.getvalue()
+        
+        async def content():
+            async for _, text in _stream_export(rows, first_chunk, render):
+                yield text
         
         # Generate descriptive filename
         filename = generate_export_filename("csv", port, days)
         
-        return FileResponse(
-            temp_filename,
-            media_type='text/csv',
-            filename=filename
-        )
+        return _export_response(content(), 'text/csv', filename)
     except HTTPException:
         raise
     except Exception as e:
@@ -799,44 +1110,91 @@ async def export_csv(
 async def export_json(
     port: Optional[str] = Query(None, description="Filter by sensor port"),
     days: Optional[int] = Query(None, description="Filter by last N days"),
-    limit: Optional[int] = Query(None, description="Limit number of records")
+    limit: Optional[int] = Query(None, description="Limit number of records (default: all)")
 ):
-    """Export data to JSON file"""
+    """Export data to JSON, streamed straight from the database cursor
+    
+    total_records comes after the data array, since it is only known at the end.
+    """
     try:
-        # Get data
-        if port:
-            data = database.get_measurements_by_port(port, limit or 10000)
-        else:
-            data = database.get_latest_measurements(limit or 10000)
-        
-        # Filter by date if specified
-        if days:
-            cutoff_date = datetime.now() - timedelta(days=days)
-            data = [
-                record for record in data 
-                if datetime.strptime(record['timestamp'], '%Y-%m-%d %H:%M:%S') >= cutoff_date
-            ]
+        rows, first_chunk = await run_db(_open_export, port, days, limit)
         
-        if not data:
+        if not first_chunk:
+            rows.close()
             raise HTTPException(status_code=404, detail="No data found")
         
-        # Create temporary JSON file
-        with tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json') as temp_file:
-            json.dump({
-                "export_timestamp": datetime.now().isoformat(),
-                "total_records": len(data),
-                "data": data
-            }, temp_file, indent=2)
-            temp_filename = temp_file.name
+        def render(chunk: List[Dict], first: bool) -> str:
+            text = ',\n'.join('    ' + json.dumps(record) for record in chunk)
+            return text if first else ',\n' + text
+        
+        async def content():
+            yield f'{{\n  "export_timestamp": {json.dumps(datetime.now().isoformat())},\n  "data": [\n'
+            total = 0
+            async for count, text in _stream_export(rows, first_chunk, render):
+                total += count
+                yield text
+            yield f'\n  ],\n  "total_records": {total}\n}}\n'
         
         # Generate descriptive filename
         filename = generate_export_filename("json", port, days)
         
-        return FileResponse(
-            temp_filename,
-            media_type='application/json',
-            filename=filename
-        )
+        return _export_response(content(), 'application/json', filename)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def _export_columnar(fmt: str, port: Optional[str], days: Optional[int],
+                           limit: Optional[int]) -> StreamingResponse:
+    """Stream a Parquet or Arrow export, one compressed row group at a time"""
+    require_pyarrow()  # RuntimeError -> 500 with the install hint
+    
+    rows, first_chunk = await run_db(_open_export, port, days, limit, COLUMNAR_FIELDS)
+    
+    if not first_chunk:
+        rows.close()
+        raise HTTPException(status_code=404, detail="No data found")
+    
+    pieces = iter_columnar(chain(first_chunk, rows), fmt, row_group_size=ROW_GROUP_SIZE)
+    
+    async def content():
+        try:
+            while True:
+                # Reading a row group from SQLite and encoding it both block
+                piece = await run_db(next, pieces, None)
+                if piece is None:
+                    break
+                yield piece
+        finally:
+            pieces.close()
+            rows.close()
+    
+    filename = generate_export_filename(COLUMNAR_EXTENSIONS[fmt], port, days)
+    return _export_response(content(), COLUMNAR_MEDIA_TYPES[fmt], filename)
+
+@app.get("/api/export/parquet")
+async def export_parquet(
+    port: Optional[str] = Query(None, description="Filter by sensor port"),
+    days: Optional[int] = Query(None, description="Filter by last N days"),
+    limit: Optional[int] = Query(None, description="Limit number of records (default: all)")
+):
+    """Export data to a zstd-compressed Parquet file (pandas.read_parquet)"""
+    try:
+        return await _export_columnar('parquet', port, days, limit)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/export/arrow")
+async def export_arrow(
+    port: Optional[str] = Query(None, description="Filter by sensor port"),
+    days: Optional[int] = Query(None, description="Filter by last N days"),
+    limit: Optional[int] = Query(None, description="Limit number of records (default: all)")
+):
+    """Export data to a compressed Arrow IPC / Feather v2 file (pandas.read_feather)"""
+    try:
+        return await _export_columnar('arrow', port, days, limit)
     except HTTPException:
         raise
     except Exception as e:
@@ -851,10 +1209,11 @@ async def cleanup_old_data(
         if days_to_keep <= 0:
             raise HTTPException(status_code=400, detail="days_to_keep must be positive")
         
-        deleted_count = database.cleanup_old_data(days_to_keep)
+        deleted_count = await run_db(database.cleanup_old_data, days_to_keep)
+        response_cache.invalidate()
         
         # Get updated stats
-        new_stats = database.get_database_stats()
+        new_stats = await run_db(database.get_database_stats)
         
         return {
             "success": True,
@@ -871,8 +1230,89 @@ async def cleanup_old_data(
 
 # ===== WEBSOCKET FOR REAL-TIME UPDATES =====
 
+# Broadcast channel of /ws/realtime: new measurements, detected by one
+# producer task for all clients instead of one DB query per client
+REALTIME_CHANNEL = "measurements"
+# The logger notifies over a Unix socket right after each commit; this is only
+# how often PRAGMA data_version is checked for writers that do not notify
+REALTIME_POLL_SECONDS = float(os.environ.get("REALTIME_POLL_SECONDS", "1"))
+change_listener = ChangeListener(db_path)
+
+# Rows read per producer wake-up; a larger backlog (e.g. a re-ingested spill
+# file) is skipped and replaced by the newest row of every sensor
+REALTIME_MAX_ROWS = int(os.environ.get("REALTIME_MAX_ROWS", "500"))
+# Highest measurement id already pushed to /ws/realtime clients (None: nobody listening)
+_realtime_last_id: Optional[int] = None
+
+def _measurement_update(rows: List[Dict]) -> str:
+    """
+    One message per commit: 'rows' holds every new measurement (all sensors
+    of the batch), 'data' the newest of them for single-row clients
+    """
+    return json.dumps({
+        "type": "measurement_update",
+        "data": max(rows, key=lambda row: row['timestamp_ms'] or 0),
+        "rows": rows,
+        "timestamp": datetime.now().isoformat()
+    })
+
+def _realtime_snapshot() -> Tuple[int, List[Dict]]:
+    """
+    Newest measurement id, then the newest row of every sensor (blocking)
+    
+    Rows committed between the two reads are pushed again by the producer:
+    a client may see a row twice, never miss one.
+    """
+    return database.get_last_measurement_id(), database.get_latest_per_sensor()
+
+def _realtime_fetch(since_id: int) -> Tuple[int, List[Dict]]:
+    """
+    Every measurement committed after since_id, oldest first (blocking)
+    
+    Returns:
+        (new since_id, rows)
+    """
+    page = database.get_measurements_since(since_id=since_id, limit=REALTIME_MAX_ROWS)
+    rows = page['data'][::-1]
+    if page['has_more']:
+        # Too far behind to replay: continue from the current state
+        return _realtime_snapshot()
+    if not rows and database.get_last_measurement_id() < since_id:
+        # Database reset: ids start over
+        return database.get_last_measurement_id(), []
+    return page['last_id'], rows
+
+async def realtime_producer():
+    """Background task: fan new measurements out to /ws/realtime clients as soon as they are committed"""
+    global _realtime_last_id
+    while True:
+        try:
+            notified = await change_listener.wait(REALTIME_POLL_SECONDS)
+            
+            # Always refresh data_version, so a notified commit is not seen twice
+            changed = await run_db(change_listener.data_version_changed)
+            if not (notified or changed):
+                continue
+            response_cache.invalidate()
+            
+            # No measurement query while nobody is listening; the next client
+            # starts from its own snapshot instead of a backlog
+            if not manager.subscriber_count(REALTIME_CHANNEL):
+                _realtime_last_id = None
+                continue
+            if _realtime_last_id is None:
+                continue
+            
+            # Every row of the batch (all sensors), not only the newest one
+            _realtime_last_id, rows = await run_db(_realtime_fetch, _realtime_last_id)
+            if rows:
+                await manager.broadcast(_measurement_update(rows), REALTIME_CHANNEL)
+        except Exception as e:
+            print(f"Error in realtime producer: {e}")
+            await asyncio.sleep(REALTIME_POLL_SECONDS)
+
 @app.websocket("/ws/realtime")
-async def websocket_endpoint(websocket: WebSocket):
+async def websocket_realtime(websocket: WebSocket):
     """WebSocket endpoint for real-time data updates"""
     # Optional API token check for WebSocket connections
     if API_TOKEN:
@@ -880,25 +1320,23 @@ async def websocket_endpoint(websocket: WebSocket):
         if provided != API_TOKEN:
             await websocket.close(code=1008)
             return
-    await manager.connect(websocket)
+    await manager.connect(websocket, channels=(REALTIME_CHANNEL,))
     try:
+        # Current value of every sensor right away; later ones come from realtime_producer
+        global _realtime_last_id
+        last_id, latest = await run_db(_realtime_snapshot)
+        if _realtime_last_id is None:
+            _realtime_last_id = last_id
+        if latest:
+            await manager.send_personal_message(_measurement_update(latest), websocket)
+        
         while True:
-            # Get latest measurement
-            latest = database.get_latest_measurements(1)
-            if latest:
-                await manager.send_personal_message(
-                    json.dumps({
-                        "type": "measurement_update",
-                        "data": latest[0],
-                        "timestamp": datetime.now().isoformat()
-                    }),
-                    websocket
-                )
-            
-            # Wait for 5 seconds before next update
-            await asyncio.sleep(5)
+            # Only to notice the disconnect; sending happens in the manager
+            await websocket.receive_text()
             
     except WebSocketDisconnect:
+        pass
+    finally:
         manager.disconnect(websocket)
 
 # ===== HEALTH CHECK =====
@@ -908,7 +1346,7 @@ async def health_check():
     """Health check endpoint"""
     try:
         # Check database connection
-        stats = database.get_database_stats()
+        stats = await run_db(database.get_database_stats)
         return {
             "status": "healthy",
             "timestamp": datetime.now().isoformat(),
@@ -925,24 +1363,70 @@ async def health_check():
             }
         )
 
+# ===== DEVICE I/O HELPERS (blocking ones run in the device thread pool) =====
+
+def _list_serial_ports(usb_only: bool = False) -> List[str]:
+    """List serial port device names"""
+    ports = [port.device for port in serial.tools.list_ports.comports()]
+    if usb_only:
+        ports = [port for port in ports if 'USB' in port]
+    return ports
+
+def _probe_sensor_sync(port: str, device_address: int, timeout: float) -> Tuple[bool, Optional[str]]:
+    """Blocking _probe_sensor on the sync driver (fallback when pzem_async is unavailable)"""
+    try:
+        pzem = PZEM004T(port, device_address, timeout=timeout)
+        try:
+            if pzem.poll_measurements() is None:
+                return False, "No valid response"
+            return True, None
+        finally:
+            pzem.close()
+    except Exception as e:
+        return False, str(e)
+
+async def _probe_sensor(port: str, device_address: int, timeout: float) -> Tuple[bool, Optional[str]]:
+    """Try to read one set of measurements; returns (can_communicate, error)"""
+    if AsyncPZEM004T is None:
+        return await run_device(_probe_sensor_sync, port, device_address, timeout)
+    
+    pzem = AsyncPZEM004T(port, device_address, timeout=timeout)
+    try:
+        if await pzem.read_measurements() is None:
+            return False, "No valid response"
+        return True, None
+    except Exception as e:
+        return False, str(e)
+    finally:
+        pzem.close()
+
+async def _probe_sensors(sensors: List[Dict], available_ports: List[str],
+                         timeout: float) -> Dict[str, Tuple[bool, Optional[str]]]:
+    """Probe every physically connected sensor concurrently on the event loop (non-blocking serial I/O)
+    
+    Without pzem_async the probes run concurrently in the device thread pool.
+    """
+    ports = [sensor['port'] for sensor in sensors if sensor['port'] in available_ports]
+    results = await asyncio.gather(*(
+        _probe_sensor(sensor['port'], sensor['device_address'], timeout)
+        for sensor in sensors if sensor['port'] in available_ports
+    ))
+    return dict(zip(ports, results))
+
 @app.get("/api/sensors/connectivity")
 async def check_sensors_connectivity():
     """Check real-time connectivity of all known sensors"""
     try:
-        import serial
-        from serial.tools import list_ports
-        import sys
-        import os
-        
-        # Add src directory to path to import PZEM004T
-        sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
-        from pzem import PZEM004T
+        _ensure_device_libs_available()
         
         # Get all known sensors from database
-        sensors = database.get_sensor_summary()
+        sensors = await cached_sensor_summary()
         
         # Get list of available serial ports
-        available_ports = [port.device for port in list_ports.comports()]
+        available_ports = await run_device(_list_serial_ports)
+        
+        # Try to connect and read data from every physically available port
+        probes = await _probe_sensors(sensors, available_ports, timeout=2.0)
         
         connectivity_status = []
         
@@ -957,27 +1441,15 @@ async def check_sensors_connectivity():
                 'error': None
             }
             
-            # Only test communication if port is physically available
+            # Only tested if port is physically available
             if status['physically_connected']:
-                try:
-                    # Try to connect and read data
-                    pzem = PZEM004T(port, sensor['device_address'], timeout=2.0)
-                    measurements = pzem.read_measurements()
-                    if measurements:
-                        status['can_communicate'] = True
-                    pzem.close()
-                except Exception as e:
-                    status['error'] = str(e)
-                    status['can_communicate'] = False
+                status['can_communicate'], status['error'] = probes[port]
             
             # Determine overall online status
             time_threshold = 60000  # 1 minute in milliseconds
-            last_measurement_time = None
-            if sensor['last_measurement']:
+            if sensor['last_measurement_ms']:
                 try:
-                    from datetime import datetime
-                    last_measurement_time = datetime.fromisoformat(sensor['last_measurement'].replace('Z', '+00:00'))
-                    time_since_last = (datetime.now() - last_measurement_time).total_seconds() * 1000
+                    time_since_last = time.time() * 1000 - sensor['last_measurement_ms']
                     recent_data = time_since_last < time_threshold
                 except:
                     recent_data = False
@@ -995,6 +1467,8 @@ async def check_sensors_connectivity():
             "available_ports": available_ports,
             "timestamp": datetime.now().isoformat()
         }
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -1004,16 +1478,11 @@ async def monitor_usb_ports():
     
     while True:
         try:
-            import serial
-            from serial.tools import list_ports
-            import sys
-            import os
-            
             # Get current USB ports
-            current_ports = [port.device for port in list_ports.comports() if 'USB' in port.device]
+            current_ports = await run_device(_list_serial_ports, usb_only=True)
             
             # Get known sensors from database
-            sensors = database.get_sensor_summary()
+            sensors = await cached_sensor_summary()
             known_ports = [sensor['port'] for sensor in sensors]
             
             # Check for changes
@@ -1043,6 +1512,9 @@ async def monitor_usb_ports():
             if changes_detected:
                 # Also broadcast full connectivity status
                 try:
+                    # Test communication of physically connected sensors
+                    probes = await _probe_sensors(sensors, current_ports, timeout=1.0)
+                    
                     connectivity_status = []
                     for sensor in sensors:
                         port = sensor['port']
@@ -1055,20 +1527,8 @@ async def monitor_usb_ports():
                             'error': None
                         }
                         
-                        # Test communication if physically connected
                         if status['physically_connected']:
-                            try:
-                                sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
-                                from pzem import PZEM004T
-                                
-                                pzem = PZEM004T(port, sensor['device_address'], timeout=1.0)
-                                measurements = pzem.read_measurements()
-                                if measurements:
-                                    status['can_communicate'] = True
-                                pzem.close()
-                            except Exception as e:
-                                status['error'] = str(e)
-                                status['can_communicate'] = False
+                            status['can_communicate'], status['error'] = probes[port]
                         
                         status['is_online'] = status['physically_connected'] and status['can_communicate']
                         connectivity_status.append(status)
@@ -1090,32 +1550,101 @@ async def monitor_usb_ports():
         # Check every 2 seconds
         await asyncio.sleep(2)
 
+def _delete_all_measurements() -> Dict[str, Any]:
+    """Delete all measurements (blocking; runs in the DB thread pool)"""
+    with database._connection() as conn:
+        cursor = conn.cursor()
+        
+        # Count measurements before deletion
+        cursor.execute('SELECT COUNT(*) FROM measurements')
+        count_before = cursor.fetchone()[0]
+        
+        # Delete all measurements and their rollups
+        cursor.execute('DELETE FROM measurements')
+        cursor.execute('DELETE FROM measurement_rollups')
+        
+        # Reset total_readings in sensors table
+        cursor.execute('UPDATE sensors SET total_readings = 0')
+        
+        conn.commit()
+        
+    return {
+        "success": True,
+        "message": f"Đã xóa {count_before} measurements",
+        "deleted_count": count_before
+    }
+
 @app.delete("/api/measurements")
 async def delete_all_measurements():
     """Delete all measurements but keep sensor records"""
     try:
-        with sqlite3.connect(database.db_path) as conn:
+        result = await run_db(_delete_all_measurements)
+        response_cache.invalidate()
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Lỗi khi xóa measurements: {str(e)}")
+
+def _reset_database(deep: bool) -> Dict[str, Any]:
+    """Delete all data, or recreate the whole schema if deep (blocking; runs in the DB thread pool)"""
+    if deep:
+        # Deep reset: drop and recreate the whole schema in place. The file is
+        # not deleted: the logger's persistent connections would keep writing
+        # to the unlinked inode and every new sample would be lost.
+        
+        # Count data before deletion
+        with database._connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COUNT(*) FROM measurements')
+            measurement_count = cursor.fetchone()[0]
+            cursor.execute('SELECT COUNT(*) FROM sensors')
+            sensor_count = cursor.fetchone()[0]
+        
+        database.recreate_schema()
+        
+        return {
+            "success": True,
+            "message": f"Đã reset sâu toàn bộ database: {measurement_count} measurements và {sensor_count} sensors. Schema đã được tạo lại.",
+            "deleted_measurements": measurement_count,
+            "deleted_sensors": sensor_count,
+            "reset_type": "deep"
+        }
+    else:
+        # Normal reset: Just delete data
+        with database._connection() as conn:
             cursor = conn.cursor()
             
-            # Count measurements before deletion
+            # Count data before deletion
             cursor.execute('SELECT COUNT(*) FROM measurements')
-            count_before = cursor.fetchone()[0]
+            measurement_count = cursor.fetchone()[0]
             
-            # Delete all measurements
+            cursor.execute('SELECT COUNT(*) FROM sensors')
+            sensor_count = cursor.fetchone()[0]
+            
+            # Delete all data
             cursor.execute('DELETE FROM measurements')
+            cursor.execute('DELETE FROM sensors')
+            cursor.execute('DELETE FROM measurement_rollups')
+            # Measurement ids restart at 1, so the rollup watermark must too
+            cursor.execute('DELETE FROM rollup_state')
+            
+            # Reset autoincrement counters
+            cursor.execute('DELETE FROM sqlite_sequence WHERE name IN ("measurements", "sensors")')
             
-            # Reset total_readings in sensors table
-            cursor.execute('UPDATE sensors SET total_readings = 0')
+            conn.commit()
+            database.invalidate_sensor_cache()
+            
+            # VACUUM to shrink database file size
+            cursor.execute('VACUUM')
             
             conn.commit()
             
         return {
             "success": True,
-            "message": f"Đã xóa {count_before} measurements",
-            "deleted_count": count_before
+            "message": f"Đã xóa toàn bộ database: {measurement_count} measurements và {sensor_count} sensors (Schema được giữ lại)",
+            "deleted_measurements": measurement_count,
+            "deleted_sensors": sensor_count,
+            "reset_type": "normal"
         }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Lỗi khi xóa measurements: {str(e)}")
 
 @app.delete("/api/database/reset")
 async def reset_database(
@@ -1123,84 +1652,38 @@ async def reset_database(
 ):
     """Reset entire database - delete all data"""
     try:
-        if deep:
-            # Deep reset: Delete and recreate entire database file
-            import os
-            
-            # Count data before deletion
-            with sqlite3.connect(database.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute('SELECT COUNT(*) FROM measurements')
-                measurement_count = cursor.fetchone()[0]
-                cursor.execute('SELECT COUNT(*) FROM sensors')
-                sensor_count = cursor.fetchone()[0]
-            
-            # Delete the database file completely
-            if os.path.exists(database.db_path):
-                os.remove(database.db_path)
-            
-            # Recreate database with schema
-            database._create_tables()
-            
-            return {
-                "success": True,
-                "message": f"Đã reset sâu toàn bộ database: {measurement_count} measurements và {sensor_count} sensors. File database đã được tạo mới.",
-                "deleted_measurements": measurement_count,
-                "deleted_sensors": sensor_count,
-                "reset_type": "deep"
-            }
-        else:
-            # Normal reset: Just delete data
-            with sqlite3.connect(database.db_path) as conn:
-                cursor = conn.cursor()
-                
-                # Count data before deletion
-                cursor.execute('SELECT COUNT(*) FROM measurements')
-                measurement_count = cursor.fetchone()[0]
-                
-                cursor.execute('SELECT COUNT(*) FROM sensors')
-                sensor_count = cursor.fetchone()[0]
-                
-                # Delete all data
-                cursor.execute('DELETE FROM measurements')
-                cursor.execute('DELETE FROM sensors')
-                
-                # Reset autoincrement counters
-                cursor.execute('DELETE FROM sqlite_sequence WHERE name IN ("measurements", "sensors")')
-                
-                conn.commit()
-                
-                # VACUUM to shrink database file size
-                cursor.execute('VACUUM')
-                
-                conn.commit()
-                
-            return {
-                "success": True,
-                "message": f"Đã xóa toàn bộ database: {measurement_count} measurements và {sensor_count} sensors (Schema được giữ lại)",
-                "deleted_measurements": measurement_count,
-                "deleted_sensors": sensor_count,
-                "reset_type": "normal"
-            }
+        result = await run_db(_reset_database, deep)
+        response_cache.invalidate()
+        return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi khi reset database: {str(e)}")
 
 @app.on_event("startup")
 async def startup_event():
     """Start background tasks when the app starts"""
-    global _monitoring_task
+    global _monitoring_task, _realtime_task
     _monitoring_task = asyncio.create_task(monitor_usb_ports())
+    if not change_listener.start():
+        print(f"Logger notifications unavailable, polling PRAGMA data_version every {REALTIME_POLL_SECONDS}s")
+    _realtime_task = asyncio.create_task(realtime_producer())
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Clean up background tasks when the app shuts down"""
-    global _monitoring_task
-    if _monitoring_task:
-        _monitoring_task.cancel()
-        try:
-            await _monitoring_task
-        except asyncio.CancelledError:
-            pass
+    for task in (_monitoring_task, _realtime_task):
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+    
+    await manager.close_all()
+    change_listener.close()
+    
+    # Let running queries finish, then release the worker threads
+    db_executor.shutdown(wait=True)
+    device_executor.shutdown(wait=True)
 
 if __name__ == "__main__":
     import asyncio